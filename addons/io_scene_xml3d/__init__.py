@@ -86,6 +86,85 @@ class ExportXML3D(bpy.types.Operator, ExportHelper):
         default='css-matrix',
     )
 
+    scene_progressive_loading = BoolProperty(
+        name="Progressive loading",
+        description="Load the asset files nearest to the camera first. Needs the html or preview template.",
+        default=False,
+    )
+
+    scene_external_graph = BoolProperty(
+        name="External scene graph",
+        description="Write the scene graph to a file of its own that is loaded by the page. Needs the html or preview template.",
+        default=False,
+    )
+
+    scene_preload_assets = IntProperty(
+        name="Preload assets",
+        description="Number of asset files, nearest to the camera first, the page hints the browser to load early, along with xml3d.js and the common files needed first. 0 writes no hints.",
+        default=4,
+        min=0,
+    )
+
+    texture_png_filter = EnumProperty(
+        name="PNG Filter",
+        items=(('NONE', "None", "Write the rows of converted textures unfiltered."),
+               ('ADAPTIVE', "Adaptive", "Choose the filter of every row for smaller files. Needs numpy.")
+               ),
+        default='ADAPTIVE',
+    )
+
+    texture_png_compression = IntProperty(
+        name="PNG Compression",
+        description="zlib compression level of converted textures from 0 (none) to 9 (smallest).",
+        default=6,
+        min=0,
+        max=9,
+    )
+
+    texture_png_strategy = EnumProperty(
+        name="PNG Strategy",
+        items=(('DEFAULT', "Default", "Default zlib strategy."),
+               ('FILTERED', "Filtered", "zlib strategy for filtered image data."),
+               ('RLE', "Run-length", "Run-length encoding only, fast and good for flat images."),
+               ('SMALLEST', "Smallest", "Try all strategies and keep the smallest file. Slower.")
+               ),
+        default='DEFAULT',
+    )
+
+    texture_max_size = IntProperty(
+        name="Maximum Size",
+        description="Scale textures down to this size in pixels on their larger side. Resized textures are written as PNG. 0 keeps their size.",
+        default=0,
+        min=0,
+    )
+
+    texture_power_of_two = BoolProperty(
+        name="Power of Two",
+        description="Resample textures down to the next power of two on each side, so WebGL can use mipmaps and repeat them.",
+        default=False,
+    )
+
+    texture_resample_filter = EnumProperty(
+        name="Resampling",
+        items=(('BOX', "Box", "Average of the covered pixels, fast."),
+               ('LANCZOS', "Lanczos", "Lanczos filter with three lobes, sharper.")
+               ),
+        default='LANCZOS',
+    )
+
+    texture_mipmaps = BoolProperty(
+        name="Mip Levels",
+        description="Write pre-filtered mip levels of every texture next to it as <name>.mip<level>.png.",
+        default=False,
+    )
+
+    texture_encoding_threads = IntProperty(
+        name="Encoding Threads",
+        description="Threads encoding converted textures while the export continues. 0 uses one per core, 1 encodes every texture right away.",
+        default=0,
+        min=0,
+    )
+
     xml3d_minimized = BoolProperty(
         name="Minimized",
         description="Uses minimized version of xml3d.js",
@@ -97,6 +176,8 @@ class ExportXML3D(bpy.types.Operator, ExportHelper):
         items=(('none', "None", "Do not cluster assets."),
                ('layers', "Layer", "Cluster assets per layer."),
                ('bins', "Fixed", "Distribute assets over fixed number of files."),
+               ('size', "Size", "Distribute assets over files of balanced size."),
+               ('spatial', "Spatial", "Cluster assets that are close to each other in the scene."),
                ),
         default='bins',
     )
@@ -108,6 +189,13 @@ class ExportXML3D(bpy.types.Operator, ExportHelper):
         soft_min=1,
     )
 
+    asset_cluster_target_size = IntProperty(
+        name="Target Size (KB)",
+        description="Estimated size of each asset file. Uses the bin limit if 0.",
+        default=0,
+        min=0,
+    )
+
     asset_material_selection = EnumProperty(
         name="Materials",
         items=(('include', "Include all", "Store all materials within asset."),
@@ -118,6 +206,45 @@ class ExportXML3D(bpy.types.Operator, ExportHelper):
         default='external',
     )
 
+    asset_instancing = BoolProperty(
+        name="Share mesh data",
+        description="Objects with the same mesh data, modifiers and armature reference a single asset.",
+        default=True,
+    )
+
+    asset_incremental_export = BoolProperty(
+        name="Incremental export",
+        description="Keep a cache of converted data and skip assets, libraries and textures that did not change since the last export.",
+        default=False,
+    )
+
+    asset_cache_directory = StringProperty(
+        name="Cache directory",
+        description="Directory of the incremental export cache, outside of the exported files. The user's cache directory if empty.",
+        default="",
+        subtype='DIR_PATH',
+    )
+
+    asset_content_hashed_names = BoolProperty(
+        name="Content hashed file names",
+        description="Name asset and binary files after a hash of their content, so they can be served with immutable caching.",
+        default=False,
+    )
+
+    asset_collections = StringProperty(
+        name="Asset collections",
+        description="JSON list of the asset collections to convert and write, all if empty. Set by distributed exports.",
+        default="",
+        options={'HIDDEN'},
+    )
+
+    asset_file_names = StringProperty(
+        name="Asset file names",
+        description="JSON object of the file names of asset collections written by other processes. Set by distributed exports.",
+        default="",
+        options={'HIDDEN'},
+    )
+
     asset_export_armature = BoolProperty(
         name="Export armatures",
         description="Export armatures including animations. Exports static mesh otherwise.",
@@ -130,6 +257,47 @@ class ExportXML3D(bpy.types.Operator, ExportHelper):
         default=False
     )
 
+    mesh_vertex_cache_optimization = EnumProperty(
+        name="Triangle Order",
+        items=(('none', "Unchanged", "Keep the face order of Blender."),
+               ('vertex-cache', "Vertex Cache", "Reorder triangles for the vertex cache of the GPU."),
+               ('overdraw', "Vertex Cache & Overdraw", "Reorder triangles for the vertex cache and to reduce overdraw."),
+               ),
+        default='none',
+    )
+
+    mesh_split_16bit_indices = BoolProperty(
+        name="16-bit Indices",
+        description="Split meshes with more than 65535 vertices into parts that can be drawn with 16-bit indices.",
+        default=False,
+    )
+
+    mesh_quantization = BoolProperty(
+        name="Quantize Vertices",
+        description="Store positions, normals, texture coordinates and bone weights as integers that are decoded by a dataflow.",
+        default=False,
+    )
+
+    mesh_binary_buffers = BoolProperty(
+        name="Binary Buffers",
+        description="Store large vertex and index arrays in binary files next to the asset files.",
+        default=False,
+    )
+
+    mesh_float_precision = IntProperty(
+        name="Float Precision",
+        description="Significant digits of exported vertex and animation data. 0 writes the shortest text that restores the exact value.",
+        default=0,
+        min=0,
+        max=9,
+    )
+
+    profile_export = BoolProperty(
+        name="Profile export",
+        description="Write profiling data of the export to info/export.pstats for the Python 'pstats' module.",
+        default=False,
+    )
+
     def draw(self, context):
         layout = self.layout
 
@@ -155,19 +323,50 @@ class ExportXML3D(bpy.types.Operator, ExportHelper):
         if self.asset_cluster_strategy == "bins":
             row = asset_box.row()
             row.prop(self, "asset_cluster_bins_limit")
+        elif self.asset_cluster_strategy in {"size", "spatial"}:
+            row = asset_box.row()
+            row.prop(self, "asset_cluster_target_size")
+            if self.asset_cluster_target_size == 0:
+                row.prop(self, "asset_cluster_bins_limit")
 
         asset_box.separator()
 
         asset_box.prop(self, "asset_material_selection")
         asset_box.prop(self, "asset_export_armature")
+        asset_box.prop(self, "asset_instancing")
+        asset_box.prop(self, "asset_incremental_export")
+        if self.asset_incremental_export:
+            asset_box.prop(self, "asset_cache_directory")
+        asset_box.prop(self, "asset_content_hashed_names")
 
         scene_box = layout.box()
         scene_box.label("Scene Options:", icon="SCENE_DATA")
         scene_box.prop(self, "transform_representation")
+        scene_box.prop(self, "scene_progressive_loading")
+        scene_box.prop(self, "scene_external_graph")
+        scene_box.prop(self, "scene_preload_assets")
 
         mesh_box = layout.box()
         mesh_box.label("Mesh Options:", icon="OUTLINER_DATA_MESH")
         mesh_box.prop(self, "mesh_export_barycentric_coordinates")
+        mesh_box.prop(self, "mesh_vertex_cache_optimization")
+        mesh_box.prop(self, "mesh_split_16bit_indices")
+        mesh_box.prop(self, "mesh_quantization")
+        mesh_box.prop(self, "mesh_binary_buffers")
+        mesh_box.prop(self, "mesh_float_precision")
+
+        texture_box = layout.box()
+        texture_box.label("Texture Options:", icon="TEXTURE")
+        texture_box.prop(self, "texture_max_size")
+        texture_box.prop(self, "texture_power_of_two")
+        texture_box.prop(self, "texture_resample_filter")
+        texture_box.prop(self, "texture_mipmaps")
+        texture_box.prop(self, "texture_png_filter")
+        texture_box.prop(self, "texture_png_compression")
+        texture_box.prop(self, "texture_png_strategy")
+        texture_box.prop(self, "texture_encoding_threads")
+
+        layout.prop(self, "profile_export")
 
     def execute(self, context):
         from . import export_xml3d
@@ -0,0 +1,418 @@
+"""Fingerprints of Blender data used to share and reuse exported data.
+
+Fingerprints of Blender data identify objects that share an asset within
+one export. The ExportCache keeps results of previous exports to an output
+directory in the user's cache directory, keyed by fingerprints of the
+content they were created from, so unchanged meshes, armatures, textures
+and files are not converted or written again.
+
+Keys are digests of an explicit encoding of fingerprints and exported data:
+values that are not known to stay the same across sessions make the data
+uncacheable instead of giving a new key on every export.
+"""
+import hashlib
+import json
+import os
+import pickle
+import sys
+from array import array
+from enum import Enum
+import bpy
+import mathutils
+
+# Properties that do not change the generated geometry
+IGNORED_PROPERTIES = {"rna_type", "name", "show_viewport", "show_in_editmode", "show_on_cage", "show_expanded"}
+
+# Export options that change converted data or written asset files
+KEY_OPTIONS = (
+    "asset_export_armature",
+    "asset_material_selection",
+    "asset_content_hashed_names",
+    "mesh_export_barycentric_coordinates",
+    "mesh_vertex_cache_optimization",
+    "mesh_split_16bit_indices",
+    "mesh_quantization",
+    "mesh_binary_buffers",
+    "mesh_float_precision",
+    "texture_png_filter",
+    "texture_png_compression",
+    "texture_png_strategy",
+    "texture_max_size",
+    "texture_power_of_two",
+    "texture_resample_filter",
+    "texture_mipmaps",
+)
+
+
+class StructPointer(int):
+    """Address of a struct that is only valid within one session"""
+
+
+def mesh_fingerprint(obj):
+    """Returns a hashable fingerprint of everything the exported asset of
+    `obj` depends on besides its own transformation: the data block, the
+    modifier stack, vertex groups, material slots and the transformation
+    relative to its parent. Returns None for objects that must not be shared.
+    """
+    fingerprint = _data_fingerprint(obj)
+    if fingerprint is None:
+        return None
+
+    try:
+        return fingerprint + (_freeze_matrix(obj.matrix_basis.inverted() * obj.matrix_world),)
+    except ValueError:
+        # Singular matrices can not be inverted
+        return None
+
+
+def _data_fingerprint(obj):
+    """Fingerprint of the data block, modifier stack, vertex groups and
+    material slots of `obj`, which do not depend on where it is placed
+    """
+    if obj.data is None or obj.dupli_type != 'NONE':
+        return None
+
+    try:
+        return (
+            obj.type,
+            _freeze_id(obj.data),
+            tuple(_freeze_struct(modifier, obj) for modifier in obj.modifiers),
+            tuple(group.name for group in obj.vertex_groups),
+            tuple((slot.link, _freeze_id(slot.material)) for slot in obj.material_slots)
+        )
+    except ValueError:
+        return None
+
+
+def _freeze_id(value):
+    if value is None:
+        return None
+    # Names are unique per type and library and, unlike pointers, stay the same across sessions
+    library = value.library.filepath if value.library else None
+    return type(value).__name__, value.name, library
+
+
+def _freeze_matrix(matrix):
+    return tuple(tuple(row) for row in matrix)
+
+
+def _property_names(struct):
+    rna = getattr(struct, "bl_rna", None)
+    if rna is not None:
+        return [p.identifier for p in rna.properties if p.identifier not in IGNORED_PROPERTIES]
+    return sorted(k for k in vars(struct) if not k.startswith("_") and k not in IGNORED_PROPERTIES)
+
+
+def _freeze_struct(struct, owner):
+    return tuple((name, _freeze_value(getattr(struct, name, None), owner)) for name in _property_names(struct))
+
+
+def _freeze_value(value, owner):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, bpy.types.Object):
+        # Modifiers referencing other objects depend on their relative placement
+        return _freeze_id(value), _freeze_id(value.data), _freeze_matrix(owner.matrix_world.inverted() * value.matrix_world)
+    if isinstance(value, bpy.types.ID):
+        return _freeze_id(value)
+    if isinstance(value, mathutils.Matrix):
+        return _freeze_matrix(value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(value))
+    try:
+        return tuple(_freeze_value(v, owner) for v in value)
+    except TypeError:
+        pass
+    # Any other struct is unique to its owner
+    pointer = getattr(value, "as_pointer", None)
+    return StructPointer(pointer() if pointer else id(value))
+
+
+def geometry_fingerprint(obj, armature_object=None):
+    """Returns a fingerprint of everything the exported geometry of `obj`
+    depends on, including the content of its mesh and of meshes referenced
+    by modifiers, but not its placement or that of its parents. Returns None
+    if the geometry can not be cached.
+    """
+    fingerprint = _data_fingerprint(obj)
+    if fingerprint is None or obj.type != 'MESH':
+        return None
+
+    referenced = []
+    for modifier in obj.modifiers:
+        for name in _property_names(modifier):
+            value = getattr(modifier, name, None)
+            if isinstance(value, bpy.types.Object):
+                if value.type == 'MESH':
+                    referenced.append(mesh_digest(value.data, value))
+                elif value.type == 'ARMATURE':
+                    referenced.append(tuple(_freeze_matrix(bone.matrix) for bone in value.pose.bones))
+                elif value.data is not None:
+                    return None
+            elif isinstance(value, bpy.types.ID):
+                # The content of textures, curves etc. is not fingerprinted
+                return None
+
+    bones = tuple(bone.name for bone in armature_object.pose.bones) if armature_object else None
+    return fingerprint, mesh_digest(obj.data, obj), tuple(referenced), bones, obj.show_only_shape_key
+
+
+def mesh_digest(mesh, obj):
+    """Digest of the vertices, faces, UVs, face textures, shape keys and
+    vertex weights of `mesh` used by `obj`.
+    """
+    digest = hashlib.sha1()
+    _update_items(digest, mesh.vertices, "co", 'f', 3)
+    _update_items(digest, mesh.edges, "vertices", 'i', 2)
+    _update_items(digest, mesh.edges, "crease", 'f')
+    _update_items(digest, mesh.edges, "use_edge_sharp", 'i')
+    _update_items(digest, mesh.loops, "vertex_index", 'i')
+    for attribute in ("loop_start", "loop_total", "material_index", "use_smooth"):
+        _update_items(digest, mesh.polygons, attribute, 'i')
+    for layer in mesh.uv_layers:
+        _update_items(digest, layer.data, "uv", 'f', 2)
+
+    face_textures = [(layer.name, _freeze_id(layer.data[0].image) if len(layer.data) else None) for layer in mesh.uv_textures]
+    digest.update(repr((mesh.use_auto_smooth, mesh.auto_smooth_angle, face_textures)).encode("utf-8"))
+
+    if mesh.shape_keys:
+        for block in mesh.shape_keys.key_blocks:
+            digest.update(repr((block.name, block.value, block.mute, block.relative_key.name)).encode("utf-8"))
+            _update_items(digest, block.data, "co", 'f', 3)
+
+    if len(obj.vertex_groups):
+        groups = array('i')
+        weights = array('f')
+        for vertex in mesh.vertices:
+            for element in vertex.groups:
+                groups.extend((vertex.index, element.group))
+                weights.append(element.weight)
+        digest.update(groups)
+        digest.update(weights)
+
+    return digest.hexdigest()
+
+
+def _update_items(digest, collection, attribute, typecode, width=1):
+    values = array(typecode, [0]) * (len(collection) * width)
+    collection.foreach_get(attribute, values)
+    digest.update(values)
+
+
+def armature_fingerprint(armature_object):
+    """Fingerprint of the bones and the action of `armature_object`"""
+    bones = tuple((bone.name, bone.parent.name if bone.parent else None, _freeze_matrix(bone.matrix_local))
+                  for bone in armature_object.data.bones)
+    pose = tuple(bone.name for bone in armature_object.pose.bones)
+    animation_data = armature_object.animation_data
+    action = animation_data.action if animation_data else None
+    return _freeze_id(armature_object.data), bones, pose, action_fingerprint(action)
+
+
+def action_fingerprint(action):
+    if action is None:
+        return None
+    fcurves = tuple((fcurve.data_path, fcurve.array_index, fcurve.extrapolation,
+                     tuple((tuple(k.co), tuple(k.handle_left), tuple(k.handle_right), k.interpolation)
+                           for k in fcurve.keyframe_points))
+                    for fcurve in action.fcurves)
+    return _freeze_id(action), tuple(action.frame_range), fcurves
+
+
+def image_fingerprint(image):
+    """Fingerprint of the pixels of `image`: the packed data, the pixels of
+    an image modified in Blender or the size and modification time of its file.
+    Returns None if the file does not exist.
+    """
+    header = _freeze_id(image), tuple(image.size), image.file_format
+    if image.packed_file:
+        return header, hashlib.sha1(image.packed_file.data).hexdigest()
+    if image.is_dirty:
+        return header, hashlib.sha1(array('f', image.pixels[:])).hexdigest()
+
+    path = bpy.path.abspath(image.filepath, library=image.library)
+    try:
+        status = os.stat(path)
+    except OSError:
+        return None
+    return header, path, status.st_size, status.st_mtime
+
+
+def file_digest(path):
+    """Digest of the content of the file at `path` or None if it does not exist"""
+    digest = hashlib.sha1()
+    try:
+        with open(path, "rb") as content_file:
+            for chunk in iter(lambda: content_file.read(2 ** 20), b""):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def content_digest(*values):
+    """Digest of exported data: assets, materials, armatures and data
+    entries. Returns None if a value can not be encoded.
+    """
+    digest = hashlib.sha1()
+    try:
+        for value in values:
+            _update_digest(digest, value)
+    except TypeError:
+        return None
+    return digest.hexdigest()
+
+
+def _update_digest(digest, value):
+    """Adds an encoding of `value` to `digest`. Objects are encoded by the
+    attributes their class lists in `content_fields`. Raises TypeError for
+    values without a defined encoding.
+    """
+    if isinstance(value, StructPointer):
+        raise TypeError("struct pointers change across sessions")
+    if value is None or isinstance(value, (bool, int, float, str)):
+        digest.update(repr(value).encode("utf-8"))
+        digest.update(b",")
+    elif isinstance(value, array):
+        digest.update(value.typecode.encode("ascii"))
+        digest.update(value)
+    elif hasattr(value, "dtype"):
+        digest.update(str(value.dtype).encode("ascii"))
+        digest.update(value.tobytes())
+    elif isinstance(value, dict):
+        # The order of keys may differ between sessions
+        digest.update(b"{")
+        for key, item in sorted(value.items(), key=lambda item: repr(item[0])):
+            _update_digest(digest, key)
+            _update_digest(digest, item)
+        digest.update(b"}")
+    elif isinstance(value, (list, tuple)):
+        digest.update(b"[")
+        for item in value:
+            _update_digest(digest, item)
+        digest.update(b"]")
+    elif isinstance(value, (set, frozenset)):
+        _update_digest(digest, sorted(value, key=repr))
+    elif isinstance(value, mathutils.Matrix):
+        _update_digest(digest, _freeze_matrix(value))
+    elif isinstance(value, mathutils.Vector):
+        _update_digest(digest, tuple(value))
+    elif isinstance(value, Enum):
+        _update_digest(digest, value.value)
+    elif hasattr(type(value), "content_fields"):
+        digest.update(type(value).__name__.encode("utf-8"))
+        _update_digest(digest, [getattr(value, name) for name in value.content_fields])
+    else:
+        raise TypeError("no digest encoding for %s" % type(value).__name__)
+
+
+def user_cache_directory():
+    """Directory of the exporter in the cache directory of the user"""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "xml3d-blender-exporter")
+
+
+class ExportCache:
+    """Results of previous exports to the same directory.
+
+    Converted data is stored in one pickle file per key. An index holds a
+    record of each written file with the key of the content it was written
+    from, its paths and its stats. Data and records not used by an export
+    are dropped when the cache is saved.
+
+    The cache is kept outside of the exported directory, which is deployed
+    and shared, in a directory per export directory below `directory` or
+    the user's cache directory.
+    """
+    INDEX = "index.json"
+    # Increase whenever cached data or the output for the same content changes
+    VERSION = 4
+
+    def __init__(self, base_dir, options, directory=None):
+        self._base_dir = base_dir
+        export_dir = hashlib.sha1(os.path.abspath(base_dir).encode("utf-8")).hexdigest()[:16]
+        self._dir = os.path.join(bpy.path.abspath(directory) if directory else user_cache_directory(), export_dir)
+        self._options = tuple((name, getattr(options, name)) for name in KEY_OPTIONS)
+        self._previous = self._load_index()
+        self._records = {}
+        self._used = set()
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(self._dir, self.INDEX), "r") as index_file:
+                index = json.load(index_file)
+        except (OSError, ValueError):
+            return {}
+        if index.get("version") != self.VERSION:
+            return {}
+        return index.get("records", {})
+
+    def key(self, fingerprint):
+        """Returns a key for `fingerprint` and the export options or None if
+        there is no fingerprint or it can not be encoded
+        """
+        if fingerprint is None:
+            return None
+        digest = hashlib.sha1()
+        try:
+            _update_digest(digest, (self.VERSION, self._options, fingerprint))
+        except TypeError:
+            return None
+        return digest.hexdigest()
+
+    def _data_path(self, key):
+        return os.path.join(self._dir, key + ".pickle")
+
+    def load(self, key):
+        """Returns the data stored for `key` by a previous export or None"""
+        try:
+            with open(self._data_path(key), "rb") as data_file:
+                value = pickle.load(data_file)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return None
+        self._used.add(key)
+        return value
+
+    def store(self, key, value):
+        os.makedirs(self._dir, exist_ok=True)
+        with open(self._data_path(key), "wb") as data_file:
+            pickle.dump(value, data_file, pickle.HIGHEST_PROTOCOL)
+        self._used.add(key)
+
+    def _name(self, path):
+        return os.path.relpath(path, self._base_dir).replace(os.sep, "/")
+
+    def reuse(self, path, key):
+        """Returns the stats of the file at `path` if a previous export wrote
+        it, and all files written along with it, from content with the same
+        key. Returns None if the file needs to be written.
+        """
+        name = self._name(path)
+        record = self._previous.get(name)
+        if key is None or record is None or record["key"] != key:
+            return None
+        if not all(os.path.exists(os.path.join(self._base_dir, p)) for p in record["paths"]):
+            return None
+        self._records[name] = record
+        return record["stats"]
+
+    def record(self, path, key, paths, stats):
+        """Records that `path` and `paths` were written from content with `key`"""
+        if key is None:
+            return
+        self._records[self._name(path)] = {"key": key, "paths": [self._name(p) for p in paths], "stats": stats}
+
+    def save(self):
+        os.makedirs(self._dir, exist_ok=True)
+        with open(os.path.join(self._dir, self.INDEX), "w") as index_file:
+            json.dump({"version": self.VERSION, "records": self._records}, index_file, indent=1, sort_keys=True)
+
+        for file_name in os.listdir(self._dir):
+            key, extension = os.path.splitext(file_name)
+            if extension == ".pickle" and key not in self._used:
+                os.remove(os.path.join(self._dir, file_name))
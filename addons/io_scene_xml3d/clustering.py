@@ -0,0 +1,191 @@
+"""Assignment of objects to asset collections, i.e. asset files.
+
+Strategies that need to know all objects up front compute the collection
+of every object of the scene when the first one is requested.
+"""
+import math
+import random
+import zlib
+from array import array
+import mathutils
+from .cache import mesh_fingerprint
+from .data import DataType
+from .export_buffer import TYPECODES
+
+GEOMETRY_TYPES = {'MESH', 'CURVE', 'SURFACE', 'FONT'}
+
+# Approximate bytes per value written as text by the serializer
+TEXT_FLOAT_SIZE = 10
+TEXT_INDEX_SIZE = 6
+TEXT_SIZES = {
+    DataType.float: TEXT_FLOAT_SIZE,
+    DataType.int4: 2,
+    DataType.byte: 4,
+    DataType.ubyte: 4,
+}
+# Assumed size of objects that need to be converted to a mesh to know it
+DEFAULT_OBJECT_SIZE = 64 * 1024
+
+# Iterations of k-means after which the clusters are taken as they are
+KMEANS_ITERATIONS = 32
+
+
+def stable_bin(obj, count):
+    """Bin of `obj` by a hash of its name and library. The bin does not
+    depend on other objects, so adding or removing objects does not move
+    any other object to another file.
+    """
+    identity = obj.name + "\0" + (obj.library.filepath if obj.library else "")
+    return zlib.crc32(identity.encode("utf-8")) % count
+
+
+def geometry_objects(scene, options):
+    """Returns the objects of `scene` that get an asset of their own"""
+    result = []
+    shared = set()
+    for obj in scene.objects:
+        if obj.type not in GEOMETRY_TYPES:
+            continue
+        fingerprint = mesh_fingerprint(obj) if options.asset_instancing else None
+        if fingerprint is not None:
+            # Objects sharing mesh data reference the asset of the first one
+            if fingerprint in shared:
+                continue
+            shared.add(fingerprint)
+        result.append(obj)
+    return result
+
+
+def estimate_size(obj, options):
+    """Estimates the bytes written for the geometry of `obj` from the vertex
+    count and the layout of the vertex attributes, without converting it.
+    """
+    if obj.type != 'MESH':
+        return DEFAULT_OBJECT_SIZE
+
+    mesh = obj.data
+    vertices = len(mesh.vertices)
+    triangles = len(mesh.loops) - 2 * len(mesh.polygons)
+    skinned = options.asset_export_armature and any(m.type == 'ARMATURE' for m in obj.modifiers)
+
+    # Value type and values per vertex of position, normal, texcoord and
+    # bone weights as written by meshtools
+    if options.mesh_quantization:
+        attributes = [(DataType.ubyte, 6), (DataType.byte, 2)]
+        texcoord, weight = (DataType.ubyte, 4), (DataType.ubyte, 4)
+    else:
+        attributes = [(DataType.float, 3), (DataType.float, 3)]
+        texcoord, weight = (DataType.float, 2), (DataType.float, 4)
+    if len(mesh.uv_layers):
+        attributes.append(texcoord)
+    if options.mesh_export_barycentric_coordinates:
+        # Triangles do not share vertices
+        attributes.append((DataType.float, 3))
+        vertices = 3 * triangles
+    if skinned:
+        attributes += [(DataType.int4, 4), weight]
+
+    if options.mesh_binary_buffers:
+        sizes = {data_type: array(TYPECODES[data_type]).itemsize for data_type, _ in attributes}
+        index_size = array(TYPECODES[DataType.int]).itemsize
+    else:
+        sizes = TEXT_SIZES
+        index_size = min(TEXT_INDEX_SIZE, len(str(vertices)) + 1)
+
+    vertex_size = sum(sizes[data_type] * count for data_type, count in attributes)
+    return vertices * vertex_size + 3 * triangles * index_size
+
+
+def bin_count(sizes, options):
+    """Number of bins for objects of the estimated `sizes`: enough to stay
+    below the target size per file or, without one, the bin limit.
+    """
+    target = options.asset_cluster_target_size * 1024
+    count = math.ceil(sum(sizes) / target) if target > 0 else options.asset_cluster_bins_limit
+    return max(1, min(count, len(sizes)))
+
+
+def pack_by_size(objects, options):
+    """Packs `objects` into bins of balanced estimated size. Returns a dict
+    from object to bin name.
+    """
+    sizes = {obj: estimate_size(obj, options) for obj in objects}
+    count = bin_count(list(sizes.values()), options)
+
+    # Largest first into the smallest bin, which is within 4/3 of the optimum
+    loads = [0] * count
+    result = {}
+    for obj in sorted(objects, key=lambda o: (-sizes[o], o.name)):
+        index = loads.index(min(loads))
+        loads[index] += sizes[obj]
+        result[obj] = "assets-%d" % index
+    return result
+
+
+def world_bounds(obj):
+    """Returns the minimum and maximum corner of the world space bounding box of `obj`"""
+    matrix = obj.matrix_world
+    corners = [matrix * mathutils.Vector(corner) for corner in obj.bound_box]
+    return [min(c[i] for c in corners) for i in range(3)], [max(c[i] for c in corners) for i in range(3)]
+
+
+def union_bounds(bounds, other):
+    if bounds is None:
+        return [list(other[0]), list(other[1])]
+    return [[min(a, b) for a, b in zip(bounds[0], other[0])], [max(a, b) for a, b in zip(bounds[1], other[1])]]
+
+
+def cluster_by_location(objects, options):
+    """Groups `objects` by k-means over the centers of their bounding boxes,
+    so that each bin covers a compact region of the scene. Returns a dict
+    from object to bin name.
+    """
+    objects = sorted(objects, key=lambda o: o.name)
+    if not objects:
+        return {}
+    centers = []
+    for obj in objects:
+        lo, hi = world_bounds(obj)
+        centers.append([(a + b) / 2.0 for a, b in zip(lo, hi)])
+    count = bin_count([estimate_size(obj, options) for obj in objects], options)
+    labels = kmeans(centers, count)
+    return {obj: "assets-%d" % label for obj, label in zip(objects, labels)}
+
+
+def _distance(a, b):
+    return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2
+
+
+def kmeans(points, count, iterations=KMEANS_ITERATIONS):
+    """Returns the index of the cluster of each point. Clusters are seeded
+    with k-means++ from a fixed seed, so the result only depends on the
+    points and their order. Empty clusters are dropped and the rest numbered
+    in order of their first point.
+    """
+    rng = random.Random(0)
+    means = [points[rng.randrange(len(points))]]
+    while len(means) < count:
+        distances = [min(_distance(p, m) for m in means) for p in points]
+        total = sum(distances)
+        if total == 0.0:
+            break
+        threshold = rng.random() * total
+        for point, distance in zip(points, distances):
+            threshold -= distance
+            if threshold <= 0.0 and distance > 0.0:
+                break
+        means.append(point)
+
+    labels = None
+    for _ in range(iterations):
+        new_labels = [min(range(len(means)), key=lambda k: _distance(p, means[k])) for p in points]
+        if new_labels == labels:
+            break
+        labels = new_labels
+        for k in range(len(means)):
+            members = [p for p, label in zip(points, labels) if label == k]
+            if members:
+                means[k] = [sum(p[i] for p in members) / len(members) for i in range(3)]
+
+    numbers = {}
+    return [numbers.setdefault(label, len(numbers)) for label in labels]
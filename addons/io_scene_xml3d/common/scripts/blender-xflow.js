@@ -102,3 +102,80 @@ Xflow.registerOperator("xflow.blenderMaterial", {
         transparency[0] = Math.max(0, 1 - alpha[0]);
     }
 });
+
+// Quantized positions and texture coordinates are uint16 values split into
+// a low and a high byte
+Xflow.registerOperator("xflow.blenderDecodePosition", {
+    outputs: [  {type: 'float3', name: 'result', customAlloc: true}],
+    params:  [  {type: 'ubyte', source: 'value', array: true},
+                {type: 'float3', source: 'offset', array: true},
+                {type: 'float3', source: 'scale', array: true}],
+    alloc: function(sizes, value) {
+        sizes['result'] = value.length / 6;
+    },
+    evaluate: function(result, value, offset, scale) {
+        for(var i = 0, j = 0; i < result.length; i += 3, j += 6) {
+            result[i] = (value[j] | value[j+1] << 8) * scale[0] + offset[0];
+            result[i+1] = (value[j+2] | value[j+3] << 8) * scale[1] + offset[1];
+            result[i+2] = (value[j+4] | value[j+5] << 8) * scale[2] + offset[2];
+        }
+    }
+});
+
+Xflow.registerOperator("xflow.blenderDecodeTexcoord", {
+    outputs: [  {type: 'float2', name: 'result', customAlloc: true}],
+    params:  [  {type: 'ubyte', source: 'value', array: true},
+                {type: 'float2', source: 'offset', array: true},
+                {type: 'float2', source: 'scale', array: true}],
+    alloc: function(sizes, value) {
+        sizes['result'] = value.length / 4;
+    },
+    evaluate: function(result, value, offset, scale) {
+        for(var i = 0, j = 0; i < result.length; i += 2, j += 4) {
+            result[i] = (value[j] | value[j+1] << 8) * scale[0] + offset[0];
+            result[i+1] = (value[j+2] | value[j+3] << 8) * scale[1] + offset[1];
+        }
+    }
+});
+
+Xflow.registerOperator("xflow.blenderDecodeNormal", {
+    outputs: [  {type: 'float3', name: 'result', customAlloc: true}],
+    params:  [  {type: 'byte', source: 'value', array: true}],
+    alloc: function(sizes, value) {
+        sizes['result'] = value.length / 2;
+    },
+    evaluate: function(result, value) {
+        // Unfold the octahedral encoding
+        for(var i = 0, j = 0; i < result.length; i += 3, j += 2) {
+            var x = value[j] / 127, y = value[j+1] / 127;
+            var z = 1 - Math.abs(x) - Math.abs(y);
+            if (z < 0) {
+                var fx = (1 - Math.abs(y)) * (x >= 0 ? 1 : -1);
+                y = (1 - Math.abs(x)) * (y >= 0 ? 1 : -1);
+                x = fx;
+            }
+            var length = Math.sqrt(x * x + y * y + z * z) || 1;
+            result[i] = x / length;
+            result[i+1] = y / length;
+            result[i+2] = z / length;
+        }
+    }
+});
+
+Xflow.registerOperator("xflow.blenderDecodeWeight", {
+    outputs: [  {type: 'float4', name: 'result', customAlloc: true}],
+    params:  [  {type: 'ubyte', source: 'value', array: true}],
+    alloc: function(sizes, value) {
+        sizes['result'] = value.length / 4;
+    },
+    evaluate: function(result, value) {
+        for(var i = 0; i < result.length; i += 4) {
+            var sum = value[i] + value[i+1] + value[i+2] + value[i+3];
+            var scale = sum > 0 ? 1 / sum : 0;
+            result[i] = value[i] * scale;
+            result[i+1] = value[i+1] * scale;
+            result[i+2] = value[i+2] * scale;
+            result[i+3] = value[i+3] * scale;
+        }
+    }
+});
@@ -0,0 +1,131 @@
+/*
+ * Loads the asset files of an exported scene in the order of the load
+ * manifest written by the exporter (info/load-manifest.json), nearest to
+ * the camera first, and reports the progress in bytes.
+ *
+ * Models exported with progressive loading reference their asset with
+ * data-src. Their src is set once their asset file is due, with a few
+ * files loading at the same time. Models with src are loaded by xml3d.js
+ * as usual and only counted for the progress.
+ *
+ * Progress is dispatched as "assetprogress" event on the xml3d element
+ * with the loaded and total bytes in its detail.
+ *
+ * An external scene graph is waited for until it is inserted.
+ */
+(function () {
+    "use strict";
+
+    var MANIFEST_URL = "./info/load-manifest.json";
+    var CONCURRENT_FILES = 4;
+
+    function fileOf(url) {
+        return url.split("#")[0];
+    }
+
+    function load(xml3d, manifest) {
+        var models = {};
+        Array.prototype.forEach.call(xml3d.querySelectorAll("model"), function (model) {
+            var url = model.getAttribute("data-src") || model.getAttribute("src");
+            if (url) {
+                (models[fileOf(url)] = models[fileOf(url)] || []).push(model);
+            }
+        });
+
+        // The manifest lists the files nearest to the camera first
+        var assets = manifest.assets.filter(function (asset) {
+            return models[asset.url];
+        });
+
+        var total = assets.reduce(function (sum, asset) { return sum + asset.size; }, 0);
+        var loaded = 0;
+        var pending = assets.filter(function (asset) {
+            return models[asset.url].some(function (model) { return model.hasAttribute("data-src"); });
+        });
+
+        function progress() {
+            var event = document.createEvent("CustomEvent");
+            event.initCustomEvent("assetprogress", false, false, { loaded: loaded, total: total });
+            xml3d.dispatchEvent(event);
+        }
+
+        function start(asset, deferred) {
+            var done = false;
+            function finished() {
+                if (done) {
+                    return;
+                }
+                done = true;
+                loaded += asset.size;
+                progress();
+                if (deferred && pending.length) {
+                    start(pending.shift(), true);
+                }
+            }
+            models[asset.url].forEach(function (model) {
+                // Any model of a file is loaded when its document is
+                model.addEventListener("load", finished);
+                model.addEventListener("error", finished);
+                if (model.hasAttribute("data-src")) {
+                    model.setAttribute("src", model.getAttribute("data-src"));
+                    model.removeAttribute("data-src");
+                }
+            });
+            // Models with src may have been loaded before the manifest
+            if (!deferred && models[asset.url].some(function (model) { return model.complete; })) {
+                finished();
+            }
+        }
+
+        progress();
+        assets.forEach(function (asset) {
+            if (pending.indexOf(asset) < 0) {
+                start(asset, false);
+            }
+        });
+        pending.splice(0, CONCURRENT_FILES).forEach(function (asset) {
+            start(asset, true);
+        });
+    }
+
+    function loadManifest(callback) {
+        var request = new XMLHttpRequest();
+        request.open("GET", MANIFEST_URL);
+        request.onload = function () {
+            callback(request.status < 400 ? JSON.parse(request.responseText) : null);
+        };
+        request.onerror = function () {
+            callback(null);
+        };
+        request.send();
+    }
+
+    function init() {
+        var xml3d = document.querySelector("xml3d");
+        if (!xml3d) {
+            return;
+        }
+        if (xml3d.hasAttribute("data-src")) {
+            // Wait for the external scene graph, see scene-loading.js
+            xml3d.addEventListener("sceneload", init, false);
+            return;
+        }
+        loadManifest(function (manifest) {
+            if (manifest) {
+                load(xml3d, manifest);
+                return;
+            }
+            // Without a manifest, load everything at once
+            Array.prototype.forEach.call(xml3d.querySelectorAll("model[data-src]"), function (model) {
+                model.setAttribute("src", model.getAttribute("data-src"));
+                model.removeAttribute("data-src");
+            });
+        });
+    }
+
+    if (document.readyState === "loading") {
+        document.addEventListener("DOMContentLoaded", init, false);
+    } else {
+        init();
+    }
+})();
@@ -0,0 +1,57 @@
+/*
+ * Loads the scene graph exported to a file of its own into the xml3d
+ * element referencing it with data-src.
+ *
+ * The file holds the markup of the content of the xml3d element, which is
+ * parsed like the inline scene. Once inserted, a "sceneload" event is
+ * dispatched on the xml3d element. jQuery ready handlers are held back
+ * until then, so they find the scene as with an inline scene graph.
+ */
+(function () {
+    "use strict";
+
+    var jQuery = window.jQuery;
+    if (jQuery) {
+        jQuery.holdReady(true);
+    }
+
+    function loaded(xml3d) {
+        var event = document.createEvent("CustomEvent");
+        event.initCustomEvent("sceneload", false, false, null);
+        xml3d.dispatchEvent(event);
+        if (jQuery) {
+            jQuery.holdReady(false);
+        }
+    }
+
+    function init() {
+        var xml3d = document.querySelector("xml3d[data-src]");
+        if (!xml3d) {
+            loaded(document);
+            return;
+        }
+        var request = new XMLHttpRequest();
+        request.open("GET", xml3d.getAttribute("data-src"));
+        request.onload = function () {
+            if (request.status < 400) {
+                xml3d.insertAdjacentHTML("beforeend", request.responseText);
+            } else {
+                console.error("Could not load scene graph: " + request.status);
+            }
+            xml3d.removeAttribute("data-src");
+            loaded(xml3d);
+        };
+        request.onerror = function () {
+            console.error("Could not load scene graph");
+            xml3d.removeAttribute("data-src");
+            loaded(xml3d);
+        };
+        request.send();
+    }
+
+    if (document.readyState === "loading") {
+        document.addEventListener("DOMContentLoaded", init, false);
+    } else {
+        init();
+    }
+})();
@@ -2,7 +2,11 @@ import json
 import os
 from .export_material import MaterialLibrary
 from .export_armature import ArmatureLibrary
+from .export_image import TextureEncoder
 from .tools import safe_query_selector_id
+from .cache import ExportCache
+from .timing import Timer
+from . import clustering
 from bpy_extras.io_utils import path_reference_copy
 
 
@@ -34,7 +38,7 @@ class Context():
     copy_set = None
     materials = None
     scene = None
-    current_bin = 0
+    cache = None
 
     def __init__(self, base_url, scene, options):
         self.base_url = base_url
@@ -44,9 +48,29 @@ class Context():
         self.armatures = ArmatureLibrary(self, base_url + "/armatures.xml")
         # maps Blender Image objects to output path used as img tag src in the XML3D scene
         self.images = {}
+        # maps digests of image contents to the src of the texture written for them
+        self.image_digests = {}
+        # maps sizes of copied image files to their digest function, digest and src
+        self.image_files = {}
+        # converted textures that are being encoded
+        self.texture_encoder = TextureEncoder(self)
         self.copy_set = set()
-        self.stats = Stats(assets=[], lights=0, views=0, groups=0, materials=[], textures=[], meshes=[], armatures=[], animations=[], warnings=[], scene=None)
-        self.current_bin = 0
+        # paths and stats of the textures in copy_set, in scene order
+        self.copied_textures = []
+        # results of the previous export to the same directory
+        self.cache = ExportCache(base_url, self.options, self.options.asset_cache_directory) if self.options.asset_incremental_export else None
+        # names of the asset collections to convert and write, None for all
+        self.written_collections = set(json.loads(self.options.asset_collections)) if self.options.asset_collections else None
+        # Workers of a distributed export only refer to the armatures, which
+        # the runs that write no asset collections bake and write
+        self.write_armatures = not self.written_collections
+        # file names of the asset collections that other processes wrote
+        self.collection_file_names = json.loads(self.options.asset_file_names) if self.options.asset_file_names else {}
+        # nested phases with the time spent in them, written to the stats
+        self.timer = Timer()
+        self.stats = Stats(assets=[], lights=0, views=0, groups=0, materials=[], textures=[], meshes=[], armatures=[], animations=[], warnings=[], collections=[], texture_duplicates=[], scene=None, instances=0, timings=self.timer.phases)
+        # asset collections of all objects for strategies that need to know them up front
+        self.object_collections = None
 
     def warning(self, message, category=None, issue=None, obj=None):
         self.stats.warnings.append({"message": message, "issue": issue, "object": obj, "category": category})
@@ -60,9 +84,16 @@ class Context():
                 if obj.layers[i] is True:
                     return "layer-%s" % i
         if self.options.asset_cluster_strategy == "bins":
-            result = "assets-%s" % Context.current_bin
-            Context.current_bin = (Context.current_bin + 1) % self.options.asset_cluster_bins_limit
-            return result
+            return "assets-%s" % clustering.stable_bin(obj, self.options.asset_cluster_bins_limit)
+        if self.options.asset_cluster_strategy in {"size", "spatial"}:
+            if self.object_collections is None:
+                with self.timer.phase("clustering"):
+                    objects = clustering.geometry_objects(self.scene, self.options)
+                    if self.options.asset_cluster_strategy == "size":
+                        self.object_collections = clustering.pack_by_size(objects, self.options)
+                    else:
+                        self.object_collections = clustering.cluster_by_location(objects, self.options)
+            return self.object_collections.get(obj, "assets-0")
 
     def __copy_report(self, msg):
         self.warning(msg.capitalize(), "texture")
@@ -70,18 +101,23 @@ class Context():
     def finalize(self):
         self.armatures.save()
         self.materials.save()
+        with self.timer.phase("textures"):
+            self.texture_encoder.join()
         try:
             path_reference_copy(self.copy_set, self.__copy_report)
         except PermissionError:
             self.warning('ERROR: While copying textures: %s' % self.copy_set, "textures")
 
-        for key, value in self.copy_set:
+        for path, texture_stats in self.copied_textures:
             try:
-                size = os.path.getsize(value)
+                texture_stats["size"] = os.path.getsize(path)
             except FileNotFoundError:
-                size = 0
-            self.stats.textures.append({
-                "name": os.path.basename(value),
-                "size": size
+                pass
 
-            })
+        # Bytes saved by writing images with the same content once
+        sizes = {t["name"]: t["size"] + sum(m["size"] for m in t.get("mipmaps", [])) for t in self.stats.textures}
+        for duplicate in self.stats.texture_duplicates:
+            duplicate["size"] = sizes.get(duplicate["name"], 0)
+
+        if self.cache is not None:
+            self.cache.save()
@@ -1,5 +1,6 @@
 from enum import Enum
 from .tools import matrix_to_list
+from .serializer import is_buffer, write_values
 
 
 class DataType(Enum):
@@ -10,12 +11,21 @@ class DataType(Enum):
     float16 = "float4x4"
     int = "int"
     int4 = "int4"
+    byte = "byte"
+    ubyte = "ubyte"
     bool = "bool"
     texture = "texture"
     data = "data"
 
 
 class DataEntry:
+    """A named XML3D value element.
+
+    `value` is a scalar, a string, a list or a flat typed buffer (array.array
+    or numpy.ndarray). Buffers are kept as they are until written.
+    """
+    # attributes written to the element, see cache.content_digest
+    content_fields = ("name", "type", "value", "key", "class_name")
     name = ""
     type = None,
     key = None
@@ -41,6 +51,7 @@ class DataEntry:
 
 
 class TextureEntry(DataEntry):
+    content_fields = DataEntry.content_fields + ("src", "wrap_type")
     wrap_type = None
     src = ""
 
@@ -51,6 +62,7 @@ class TextureEntry(DataEntry):
 
 
 class DataReference(DataEntry):
+    content_fields = DataEntry.content_fields + ("src",)
     src = ""
 
     def __init__(self, src):
@@ -61,45 +73,39 @@ class DataReference(DataEntry):
         return self.type.name + ": " + self.src
 
 
-def write_generic_entry(doc, entry):
+def write_generic_entry(writer, entry, precision=None):
+    """Writes `entry` to a xml_writer.DocumentWriter. Buffers are streamed in
+    chunks, so no string of the whole value is created.
+    """
     entry_type = entry.type
-    entry_element = doc.createElement(entry_type.value)
+    element_name = entry_type.value
 
     if entry_type == DataType.data:
-        entry_element.setAttribute("src", entry.src)
-        return entry_element
+        writer.element(element_name, [("src", entry.src)])
+        return
 
-    entry_element.setAttribute("name", entry.name)
+    attributes = [("name", entry.name)]
     if entry.key:
-        entry_element.setAttribute("key", entry.key)
+        attributes.append(("key", entry.key))
 
     value = entry.value
-    value_str = None
-    if entry_type in {DataType.int, DataType.int4}:
-        value_str = ""
-        for t in value:
-            length = len(t) if isinstance(t, tuple) else 1
-            fs = length * "%.d "
-            value_str += fs % t
-    elif entry_type == DataType.texture:
-
+    if entry_type == DataType.texture:
         if entry.wrap_type is not None:
-            entry_element.setAttribute("wrapS", entry.wrap_type)
-            entry_element.setAttribute("wrapT", entry.wrap_type)
-
-        img_element = doc.createElement("img")
-        img_element.setAttribute("src", entry.src)
-        entry_element.appendChild(img_element)
+            attributes.append(("wrapS", entry.wrap_type))
+            attributes.append(("wrapT", entry.wrap_type))
+
+        writer.start_element(element_name, attributes)
+        writer.element("img", [("src", entry.src)])
+        writer.end_element()
+        return
+
+    writer.start_element(element_name, attributes)
+    if is_buffer(value):
+        integer = entry_type in {DataType.int, DataType.int4, DataType.byte, DataType.ubyte}
+        write_values(writer, value, integer, precision)
     else:
-        if not isinstance(value, list):
-            value_str = str(value)
-        else:
-            value_str = " ".join(str(v) for v in value)
-
-    if value_str:
-        text_node = doc.createTextNode(value_str)
-        entry_element.appendChild(text_node)
-    return entry_element
+        writer.characters(str(value))
+    writer.end_element()
 
 
 def write_generic_entry_html(writer, entry):
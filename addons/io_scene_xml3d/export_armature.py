@@ -1,12 +1,15 @@
 import os
 import mathutils
-from xml.dom.minidom import Document
+from .xml_writer import DocumentWriter
 from . import tools
 from .export_asset import ModelConfiguration
 from .data import DataType, DataEntry, DataReference, write_generic_entry
+from .cache import armature_fingerprint, content_digest
 
 
 class ArmatureAnimation:
+    # attributes written to the armature library, see cache.content_digest
+    content_fields = ("id", "data")
     id = ""
     context = None
     start_frame = 0.0
@@ -17,8 +20,14 @@ class ArmatureAnimation:
         self.data = []
         self.start_frame = 0.0
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("context", None)
+        return state
+
 
 class Armature:
+    content_fields = ("id", "data", "animations")
     context = None
     id = ""
     data = None
@@ -34,6 +43,11 @@ class Armature:
     def __eq__(self, other):
         return self.__dict__ == other.__dict__
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("context", None)
+        return state
+
     def get_config(self):
         if not len(self.animations):
             return None
@@ -71,6 +85,12 @@ class Armature:
         frame_min = animation.start_frame = action.frame_range[0]
         frame_max = action.frame_range[1]
 
+        armature.data.append(DataReference("#" + animation.id))
+        armature.animations.append(animation)
+        context.stats.animations.append({"name": tools.safe_query_selector_id(action.name), "minFrame": frame_min, "maxFrame": frame_max})
+        if not context.write_armatures:
+            return
+
         animation.data.append(DataEntry("minFrame", DataType.float, frame_min))
         animation.data.append(DataEntry("maxFrame", DataType.float, frame_max))
 
@@ -138,10 +158,6 @@ class Armature:
             animation.data.append(DataEntry("location", DataType.float3, sampled_locations, str(sample)))
             animation.data.append(DataEntry("scale", DataType.float3, sampled_scales, str(sample)))
 
-        armature.data.append(DataReference("#" + animation.id))
-        armature.animations.append(animation)
-        context.stats.animations.append({"name": tools.safe_query_selector_id(action.name), "minFrame": frame_min, "maxFrame": frame_max})
-
 
 def get_local_bone_matrix(bone):
     if not bone.parent:
@@ -186,40 +202,65 @@ class ArmatureLibrary:
         armature_id = tools.safe_query_selector_id(armature_object.data.name)
         armature = self.get_armature(armature_id)
         if not armature:
-            armature = Armature.create_from_blender(armature_object, armature_id, self.context)
+            with self.context.timer.phase("armatures"):
+                armature = self.load_armature(armature_object, armature_id)
             self.armatures.append(armature)
         return armature, "./" + self.url + "#" + armature_id
 
+    def load_armature(self, armature_object, armature_id):
+        """Creates the armature or takes it from a previous export if its bones and action did not change"""
+        # Armatures that are not baked must not be reused by other exports
+        cache = self.context.cache if self.context.write_armatures else None
+        key = cache.key((armature_id, armature_fingerprint(armature_object))) if cache else None
+        cached = cache.load(key) if key else None
+        if cached is not None:
+            armature, animation_stats = cached
+            armature.context = self.context
+            for animation in armature.animations:
+                animation.context = self.context
+            self.context.stats.animations += animation_stats
+            return armature
+
+        stats_count = len(self.context.stats.animations)
+        armature = Armature.create_from_blender(armature_object, armature_id, self.context)
+        if key:
+            cache.store(key, (armature, self.context.stats.animations[stats_count:]))
+        return armature
+
     def add_armature(self, armature):
         if armature not in self.armatures:
             self.armatures.append(armature)
         return "./" + self.url + "#" + armature.id
 
     def __save_xml(self, file):
-        doc = Document()
-        xml3d = doc.createElement("xml3d")
-        doc.appendChild(xml3d)
+        precision = self.context.options.mesh_float_precision
+        writer = DocumentWriter(file)
+        writer.start_document()
+        writer.start_element("xml3d")
 
         for armature in self.armatures:
-            armature_data = doc.createElement("data")
-            armature_data.setAttribute("id", armature.id)
+            writer.start_element("data", [("id", armature.id)])
             for entry in armature.data:
-                entry_element = write_generic_entry(doc, entry)
-                armature_data.appendChild(entry_element)
-            xml3d.appendChild(armature_data)
+                write_generic_entry(writer, entry, precision)
+            writer.end_element()
 
             for animation in armature.animations:
-                data = doc.createElement("data")
-                data.setAttribute("id", animation.id)
+                writer.start_element("data", [("id", animation.id)])
                 for entry in animation.data:
-                    entry_element = write_generic_entry(doc, entry)
-                    data.appendChild(entry_element)
-                xml3d.appendChild(data)
+                    write_generic_entry(writer, entry, precision)
+                writer.end_element()
 
-        doc.writexml(file, "", "  ", "\n", "UTF-8")
+        writer.end_element()
 
     def save(self):
-        if not len(self.armatures):
+        if not (len(self.armatures) and self.context.write_armatures):
+            return
+
+        cache = self.context.cache
+        key = cache.key(content_digest(self.armatures)) if cache else None
+        reused = cache.reuse(self.url, key) if cache else None
+        if reused is not None:
+            self.context.stats.armatures.extend(reused)
             return
 
         with open(self.url, "w") as armatureFile:
@@ -227,4 +268,7 @@ class ArmatureLibrary:
             armatureFile.close()
             size = os.path.getsize(self.url)
 
-        self.context.stats.armatures.append({"name": "armature.xml", "size": size})
+        armature_stats = {"name": "armature.xml", "size": size}
+        self.context.stats.armatures.append(armature_stats)
+        if cache is not None:
+            cache.record(self.url, key, [self.url], [armature_stats])
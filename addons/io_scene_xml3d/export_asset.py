@@ -1,13 +1,21 @@
+import io
 import os
-from xml.dom.minidom import Document
+import time
 from .export_material import Material, DefaultMaterial, MaterialLibrary, export_image
 from .data import DataEntry, DataType, DataReference, TextureEntry, write_generic_entry
 from bpy_extras.io_utils import create_derived_objects, free_derived_objects
 from . import tools
 from . import meshtools
+from .xml_writer import DocumentWriter
+from .export_buffer import BufferFiles, hashed_name
+from .cache import geometry_fingerprint, content_digest
+from .clustering import world_bounds, union_bounds
+from .serializer import format_values
 
 
 class Asset:
+    # attributes written to the asset file, see cache.content_digest
+    content_fields = ("id", "name", "matrix", "src", "meshes", "data", "sub_assets", "ref_assets")
     id = ""
     meshes = None
     data = None
@@ -38,14 +46,27 @@ class AssetCollection:
         self.context = context
         self._path = path
         self._dir = os.path.dirname(path)
+        # name of the written file, which differs from the path with content hashed names
+        self.file_name = os.path.basename(path)
         self._scene = scene
         self.assets = []
         self.materials = {}
+        self._buffers = None
+        # stats of the meshes in this collection, by asset and data block
+        self._mesh_stats = {}
+        self._mesh_stats_order = []
+        # Other collections are written by other processes of a distributed export
+        self.write = context.written_collections is None or name in context.written_collections
+        if not self.write:
+            self.file_name = context.collection_file_names.get(name, self.file_name)
+        self.stats = {"name": name, "objects": 0, "vertices": 0, "bounds": None, "groups": []}
+        context.stats.collections.append(self.stats)
 
     def add_material(self, material):
 
         if material:
-            converted = Material.from_blender_material(material, self.context, self._dir)
+            with self.context.timer.phase("materials"):
+                converted = Material.from_blender_material(material, self.context, self._dir)
         else:
             converted = DefaultMaterial
 
@@ -62,6 +83,7 @@ class AssetCollection:
         return "#" + converted.id
 
     def add_asset(self, obj):
+        stats_count = len(self.context.stats.meshes)
         model_configuration = None
         base_matrix = obj.matrix_basis.inverted()
         free, derived_objects = create_derived_objects(self._scene, obj)
@@ -69,6 +91,11 @@ class AssetCollection:
         if derived_objects is None:
             return None, None
 
+        self.stats["objects"] += 1
+        if obj.type == 'MESH':
+            self.stats["vertices"] += len(obj.data.vertices)
+        self.add_reference(obj)
+
         asset = Asset(id_=tools.safe_query_selector_id(obj.data.name))
 
         if len(derived_objects) == 1:
@@ -86,9 +113,18 @@ class AssetCollection:
         if free:
             free_derived_objects(obj)
 
+        for mesh_stats in self.context.stats.meshes[stats_count:]:
+            mesh_stats["object"] = obj.name
+            mesh_stats["collection"] = self.name
+
         self.assets.append(asset)
         return asset.id, model_configuration
 
+    def add_reference(self, obj):
+        """Records that the group of `obj` references an asset of this collection"""
+        self.stats["bounds"] = union_bounds(self.stats["bounds"], world_bounds(obj))
+        self.stats["groups"].append(tools.escape_html_id(obj.name))
+
     def add_asset_data(self, asset, derived_object):
         model_configuration = ModelConfiguration()
         armature_info = None
@@ -111,14 +147,33 @@ class AssetCollection:
             if armature_config:
                 model_configuration.children += armature_config
 
-        try:
-            apply_modifiers = armature_object is None
-            mesh = derived_object.to_mesh(self._scene, apply_modifiers, 'RENDER', True, False)
-        except:
-            mesh = None
-
-        if mesh:
-            self.add_mesh_data(asset, mesh, armature_info)
+        if not self.write:
+            return model_configuration
+
+        # The geometry does not depend on the transformation of the object, so
+        # unchanged geometry can be taken from a previous export
+        start = time.perf_counter()
+        cache = self.context.cache
+        key = cache.key(geometry_fingerprint(derived_object, armature_object)) if cache else None
+        geometry = cache.load(key) if key else None
+
+        mesh = None
+        if geometry is None:
+            try:
+                apply_modifiers = armature_object is None
+                with self.context.timer.phase("to_mesh"):
+                    mesh = derived_object.to_mesh(self._scene, apply_modifiers, 'RENDER', True, False)
+            except:
+                mesh = None
+
+            if mesh:
+                geometry = self.export_mesh_geometry(mesh, armature_info)
+            if geometry and key:
+                cache.store(key, geometry)
+
+        if geometry:
+            # Reused geometry takes its face textures from the object's own mesh
+            self.add_mesh_data(asset, geometry, armature_info, derived_object, mesh or derived_object.data, time.perf_counter() - start)
 
         return model_configuration
 
@@ -156,34 +211,94 @@ class AssetCollection:
         return bind_matrices
 
     def export_mesh_textures(self, mesh):
+        """Returns the UV layer of the face texture of each material of `mesh`"""
         textures = [None] * len(mesh.materials)
         for i, material in enumerate(mesh.materials):
-            if material and material.use_face_texture:
-                try:
-                    textures[i] = {"image": mesh.tessface_uv_textures[i].data[
-                        0].image, "alpha": material.use_face_texture_alpha}
-                except:
-                    textures[i] = None
+            if material and material.use_face_texture and i < len(mesh.tessface_uv_textures):
+                textures[i] = {"layer": i, "alpha": material.use_face_texture_alpha}
         return textures
 
-    def add_mesh_data(self, asset, mesh, armature_info):
+    def export_mesh_geometry(self, mesh, armature_info):
+        """Returns the vertex data and indices of the parts of `mesh` and the
+        slots of its materials and face textures. The result holds no Blender
+        data, so it can be cached across exports.
+        """
         meshName = tools.safe_query_selector_id(mesh.name)
-        materialCount = len(mesh.materials)
+
+        timer = self.context.timer
 
         # Export based on tess_faces:
-        vertices, indices = meshtools.export_tessfaces(mesh, armature_info, self.context)
+        with timer.phase("export_tessfaces"):
+            vertices, indices = meshtools.export_tessfaces(mesh, armature_info, self.context)
 
         if not (vertices and indices):
-            return
+            return None
 
-        content = meshtools.get_vertex_attributes(mesh, vertices)
+        triangles = sum(len(i) for i in indices) // 3
+        faces = len(mesh.tessfaces)
+        mesh_stats = {
+            "name": meshName,
+            "source_vertices": len(mesh.vertices),
+            # Each tessface is a triangle or a quad split into two triangles
+            "corners": 2 * faces + triangles,
+            "vertices": len(vertices),
+            "triangles": triangles,
+            "splits": 0
+        }
+
+        chunks = [(vertices, indices)]
+        if self.context.options.mesh_split_16bit_indices and len(vertices) > meshtools.MAX_16BIT_VERTICES:
+            with timer.phase("split_mesh"):
+                chunks = meshtools.split_mesh(mesh, vertices, indices)
+            mesh_stats["splits"] = len(chunks) - 1
+
+        optimization = self.context.options.mesh_vertex_cache_optimization
+        if optimization != "none":
+            mesh_stats["acmr_before"] = mesh_stats["acmr_after"] = 0.0
+
+        parts = []
+        for n, (vertices, indices) in enumerate(chunks):
+            partName = "%s-%d" % (meshName, n) if len(chunks) > 1 else meshName
+
+            if optimization != "none":
+                with timer.phase("optimize_vertex_cache"):
+                    vertices, indices, acmr_before, acmr_after = meshtools.optimize_vertex_cache(mesh, vertices, indices, optimization == "overdraw")
+                share = sum(len(i) for i in indices) / (3.0 * mesh_stats["triangles"])
+                mesh_stats["acmr_before"] += acmr_before * share
+                mesh_stats["acmr_after"] += acmr_after * share
+
+            with timer.phase("get_vertex_attributes"):
+                content = meshtools.get_vertex_attributes(mesh, vertices)
+
+            dataflow = None
+            if self.context.options.mesh_quantization:
+                with timer.phase("quantize_vertex_attributes"):
+                    content, dataflow = meshtools.quantize_vertex_attributes(content, armature_info is not None)
+
+            parts.append({"name": partName, "content": content, "indices": indices, "dataflow": dataflow})
+
+        if optimization != "none":
+            mesh_stats["acmr_before"] = round(mesh_stats["acmr_before"], 3)
+            mesh_stats["acmr_after"] = round(mesh_stats["acmr_after"], 3)
+
+        return {
+            "stats": mesh_stats,
+            "parts": parts,
+            # Slot index and library of each material, names are not unique with linked libraries
+            "materials": [(i, material.library.filepath if material.library else None) if material else None
+                          for i, material in enumerate(mesh.materials)],
+            "textures": self.export_mesh_textures(mesh)
+        }
+
+    def add_mesh_data(self, asset, geometry, armature_info, derived_object, mesh, convert_time=0.0):
+        mesh_stats = dict(geometry["stats"], instances=[], bytes={}, size=0, convert_time=convert_time, write_time=0.0)
+        self.context.stats.meshes.append(mesh_stats)
+        self._mesh_stats_order.append(mesh_stats)
 
         compute = None
         includes = None
 
         if armature_info:
-            content.append(DataEntry.create_from_matrix("global_inverse_matrix", armature_info["global_inverse_matrix"]))
-            content.append(DataEntry("offset_matrix", DataType.float16, armature_info["offset_matrix"]))
             armature_name = armature_info['name']
             # content.append()
             # asset.data[armature_name] = {"src": armature_info["src"], "includes": None, "compute": None}
@@ -191,113 +306,221 @@ class AssetCollection:
             compute = "dataflow['../common/xflow/data-flows.xml#blenderSkinning']"
             includes = armature_info['name']
 
-        asset.data[meshName] = {"content": content, "compute": compute, "includes": includes}
+        slots = object_materials(derived_object)
+        materials = [slots[slot[0]] if slot and slot[0] < len(slots) else None for slot in geometry["materials"]]
+        mesh_textures = geometry["textures"]
 
-        mesh_textures = self.export_mesh_textures(mesh)
+        for part in geometry["parts"]:
+            partName = part["name"]
+            indices = part["indices"]
+            content = list(part["content"])
 
-        for materialIndex, material in enumerate(mesh.materials if materialCount else [None]):
-            if len(indices[materialIndex]) == 0:
-                continue
+            part_compute = compute
+            if part["dataflow"]:
+                part_compute = "dataflow['../common/xflow/data-flows.xml#%s']" % part["dataflow"]
 
-            materialName = material.name if material else "defaultMaterial"
+            if armature_info:
+                content.append(DataEntry.create_from_matrix("global_inverse_matrix", armature_info["global_inverse_matrix"]))
+                content.append(DataEntry("offset_matrix", DataType.float16, armature_info["offset_matrix"]))
 
-            data = []
-            data.append(DataEntry("index", DataType.int, indices[materialIndex]))
+            asset.data[partName] = {"content": content, "compute": part_compute, "includes": includes}
+            self._mesh_stats[id(asset), partName] = mesh_stats
 
-            # Mesh Textures
-            if material and mesh_textures[materialIndex] and mesh_textures[materialIndex]["image"]:
-                image_src = export_image(mesh_textures[materialIndex]["image"], self.context)
-                if image_src:
-                    # TODO: Image Sampling parameters
-                    # FEATURE: Resize / convert / optimize texture
-                    data.append(TextureEntry("diffuseTexture", "../" + image_src))
-                if mesh_textures[materialIndex]["alpha"]:
-                    data.append(DataEntry("transparency", DataType.float, "0.002"))
+            for materialIndex, material in enumerate(materials or [None]):
+                if len(indices[materialIndex]) == 0:
+                    continue
 
-            submeshName = meshName + "_" + materialName
+                materialName = material.name if material else "defaultMaterial"
 
-            material_url = self.add_material(material)
+                data = []
+                data.append(DataEntry("index", DataType.int, indices[materialIndex]))
 
-            asset.meshes.append(
-                {"name": submeshName, "includes": meshName, "data": data, "shader": material_url})
+                # Mesh Textures
+                image = face_texture_image(mesh, mesh_textures[materialIndex]["layer"]) if material and mesh_textures[materialIndex] else None
+                if image:
+                    image_src = export_image(image, self.context)
+                    if image_src:
+                        # TODO: Image Sampling parameters
+                        data.append(TextureEntry("diffuseTexture", "../" + image_src))
+                    if mesh_textures[materialIndex]["alpha"]:
+                        data.append(DataEntry("transparency", DataType.float, "0.002"))
 
-    def saveXML(self, f, stats):
-        doc = Document()
-        xml3d = doc.createElement("xml3d")
-        doc.appendChild(xml3d)
-        for material in self.materials.values():
-            MaterialLibrary.save_material_xml(material, xml3d)
+                submeshName = partName + "_" + materialName
 
-        for asset in self.assets:
-            self.asset_xml(asset, xml3d)
-        doc.writexml(f, "", "  ", "\n", "UTF-8")
+                material_url = self.add_material(material)
 
-    def asset_xml(self, asset, parent):
-        doc = parent.ownerDocument
+                asset.meshes.append(
+                    {"name": submeshName, "includes": partName, "data": data, "shader": material_url})
 
-        asset_element = doc.createElement("asset")
-        parent.appendChild(asset_element)
+    def saveXML(self, f, stats):
+        writer = DocumentWriter(f)
+        writer.start_document()
+        writer.start_element("xml3d", self.root_attributes())
+        for material in self.materials.values():
+            MaterialLibrary.save_material_xml(material, writer)
 
+        for asset in self.assets:
+            self.asset_xml(asset, writer)
+        writer.end_element()
+
+    def root_attributes(self):
+        bounds = self.stats["bounds"]
+        if self.context.options.asset_cluster_strategy != "spatial" or bounds is None:
+            return []
+        # World space bounds of all objects using this file, for loading nearby files first
+        return [("bbox", format_values(bounds[0] + bounds[1]))]
+
+    def asset_xml(self, asset, writer):
+        attributes = []
         if asset.id:
-            asset_element.setAttribute("id", asset.id)
+            attributes.append(("id", asset.id))
         if asset.name:
-            asset_element.setAttribute("name", asset.name)
+            attributes.append(("name", asset.name))
         if asset.matrix and not tools.is_identity(asset.matrix):
-            asset_element.setAttribute("style", "transform: %s;" % tools.matrix_to_ccs_matrix3d(asset.matrix))
+            attributes.append(("style", "transform: %s;" % tools.matrix_to_ccs_matrix3d(asset.matrix)))
         if asset.src:
-            asset_element.setAttribute("src", asset.src)
+            attributes.append(("src", asset.src))
+            writer.element("asset", attributes)
             return
 
+        writer.start_element("asset", attributes)
+        self.asset_content_xml(asset, writer)
+        writer.end_element()
+
+    def asset_content_xml(self, asset, writer):
         for name, value in asset.data.items():
-            asset_data = doc.createElement("assetdata")
-            asset_data.setAttribute("name", name)
+            attributes = [("name", name)]
 
             if 'src' in value:
-                asset_data.setAttribute("src", value["src"])
+                attributes.append(("src", value["src"]))
 
             if 'includes' in value and value["includes"]:
-                asset_data.setAttribute("includes", value["includes"])
+                attributes.append(("includes", value["includes"]))
 
             if 'compute' in value and value["compute"]:
-                asset_data.setAttribute("compute", value["compute"])
+                attributes.append(("compute", value["compute"]))
 
-            asset_element.appendChild(asset_data)
+            writer.start_element("assetdata", attributes)
             if 'content' not in value:
+                writer.end_element()
                 return
 
-            for entry in value["content"]:
-                entryElement = write_generic_entry(doc, entry)
-                asset_data.appendChild(entryElement)
+            self.write_entries(writer, value["content"], self._mesh_stats.get((id(asset), name)))
+            writer.end_element()
 
         for mesh in asset.meshes:
-            asset_mesh = doc.createElement("assetmesh")
-            asset_mesh.setAttribute("name", mesh["name"])
-            asset_mesh.setAttribute("includes", mesh["includes"])
+            attributes = [("name", mesh["name"]), ("includes", mesh["includes"])]
             if mesh['shader']:
-                asset_mesh.setAttribute("shader", mesh["shader"])
+                attributes.append(("shader", mesh["shader"]))
             if "transform" in mesh:
-                asset_mesh.setAttribute("style", "transform: %s;" % mesh["transform"])
+                attributes.append(("style", "transform: %s;" % mesh["transform"]))
 
-            asset_element.appendChild(asset_mesh)
-            for entry in mesh["data"]:
-                entryElement = write_generic_entry(doc, entry)
-                asset_mesh.appendChild(entryElement)
+            writer.start_element("assetmesh", attributes)
+            self.write_entries(writer, mesh["data"], self._mesh_stats.get((id(asset), mesh["includes"])))
+            writer.end_element()
 
         for sub_asset in asset.sub_assets.values():
-            self.asset_xml(sub_asset, asset_element)
+            self.asset_xml(sub_asset, writer)
 
         for ref_asset in asset.ref_assets:
-            self.asset_xml(ref_asset, asset_element)
+            self.asset_xml(ref_asset, writer)
+
+    def write_entries(self, writer, entries, mesh_stats=None):
+        """Writes the entries of a data block and adds the characters and
+        bytes written for each entry and the time taken to `mesh_stats`
+        """
+        precision = self.context.options.mesh_float_precision
+        if mesh_stats is None:
+            for entry in self.externalize(entries):
+                write_generic_entry(writer, entry, precision)
+            return
+
+        start_time = time.perf_counter()
+        sizes = mesh_stats["bytes"]
+        for entry in self.externalize(entries, sizes):
+            start = writer.size
+            write_generic_entry(writer, entry, precision)
+            if entry.name:
+                sizes[entry.name] = sizes.get(entry.name, 0) + writer.size - start
+        mesh_stats["write_time"] += time.perf_counter() - start_time
+
+    def externalize(self, entries, sizes=None):
+        if self._buffers is None:
+            return entries
+        return self._buffers.externalize(entries, sizes)
 
     def save(self):
+        if not self.write:
+            return
+
         stats = self.context.stats
+        cache = self.context.cache
+
+        key = None
+        if cache is not None:
+            key = cache.key(content_digest(self.name, self.root_attributes(), self.materials, self.assets))
+            reused = cache.reuse(self._path, key)
+            if reused is not None:
+                self.file_name = reused["assets"][0]["name"]
+                stats.assets.extend(reused["assets"])
+                for mesh_stats, sizes in zip(self._mesh_stats_order, reused["meshes"]):
+                    mesh_stats["bytes"] = sizes
+                    mesh_stats["size"] = sum(sizes.values())
+                return
+
+        hashed_names = self.context.options.asset_content_hashed_names
+        if self.context.options.mesh_binary_buffers:
+            self._buffers = BufferFiles(self._path, self.context.base_url, hashed_names)
+
+        path = self._path
+        if hashed_names:
+            content = io.StringIO()
+            self.saveXML(content, stats)
+            content = content.getvalue()
+            self.file_name = hashed_name(self.name, content.encode("utf-8"), ".xml")
+            path = os.path.join(self._dir, self.file_name)
+            with open(path, "w") as assetFile:
+                assetFile.write(content)
+        else:
+            with open(path, "w") as assetFile:
+                self.saveXML(assetFile, stats)
+        size = os.path.getsize(path)
+
+        if self._buffers is not None:
+            # Descriptors are counted to the asset file
+            size += self._buffers.descriptor_size
+
+        asset_stats = [{"url": path, "size": size, "name": self.file_name, "collection": self.name}]
+
+        paths = [path]
+        if self._buffers is not None and self._buffers.paths:
+            name = "%s-*.bin" % self.name
+            asset_stats.append({"url": os.path.join(self._dir, name), "size": self._buffers.size, "name": name, "collection": self.name})
+            paths += self._buffers.paths
+        self._buffers = None
+
+        for mesh_stats in self._mesh_stats_order:
+            mesh_stats["size"] = sum(mesh_stats["bytes"].values())
+
+        stats.assets.extend(asset_stats)
+        if cache is not None:
+            cache.record(self._path, key, paths, {"assets": asset_stats, "meshes": [m["bytes"] for m in self._mesh_stats_order]})
+
+
+def object_materials(obj):
+    """Returns the materials of the slots of `obj`, which to_mesh gives the mesh"""
+    if len(obj.material_slots):
+        return [slot.material for slot in obj.material_slots]
+    return list(obj.data.materials) if obj.data is not None and hasattr(obj.data, "materials") else []
 
-        with open(self._path, "w") as assetFile:
-            self.saveXML(assetFile, stats)
-            assetFile.close()
-            size = os.path.getsize(self._path)
 
-        stats.assets.append({"url": self._path, "size": size, "name": os.path.basename(self._path)})
+def face_texture_image(mesh, layer):
+    """Returns the image of the first face of UV layer `layer` of `mesh`"""
+    layers = mesh.tessface_uv_textures if len(getattr(mesh, "tessface_uv_textures", ())) else getattr(mesh, "uv_textures", ())
+    try:
+        return layers[layer].data[0].image
+    except (IndexError, AttributeError):
+        return None
 
 
 class ModelConfiguration:
@@ -307,6 +530,7 @@ class ModelConfiguration:
 
     def __init__(self, name=None):
         self.children = []
+        self.data = []
         self.name = name
 
     def __str__(self):
@@ -0,0 +1,143 @@
+"""Binary vertex buffers for asset files.
+
+Large buffers of an asset file are written to binary files next to it as
+raw little-endian data. Each data block that had buffers moved gets a small
+descriptor in xml3d.js' JSON format, referenced from the block via
+<data src="...">. xml3d.js requests the binary data once per value and
+relative to the page, so every buffer gets its own file and descriptors
+store urls relative to the exported html file.
+
+With hashed names, binary files and descriptors are named after a digest
+of their content, so they can be cached by browsers without revalidation.
+"""
+import hashlib
+import json
+import os
+import sys
+from array import array
+from itertools import chain
+from .data import DataType, DataReference
+from .serializer import is_buffer
+from . import tools
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+JSON_FORMAT = "xml3d-json"
+JSON_VERSION = "0.4.0"
+
+# Buffers with fewer values stay inline in the asset file
+INLINE_LIMIT = 256
+
+TYPECODES = {
+    DataType.float: 'f',
+    DataType.float2: 'f',
+    DataType.float3: 'f',
+    DataType.float4: 'f',
+    DataType.float16: 'f',
+    DataType.int: 'i',
+    DataType.int4: 'i',
+    DataType.byte: 'b',
+    DataType.ubyte: 'B',
+}
+
+# Little-endian NumPy types of the typecodes
+DTYPES = {'f': "<f4", 'i': "<i4", 'b': "i1", 'B': "u1"}
+
+
+def hashed_name(stem, data, extension):
+    """File name with a digest of `data`, an object supporting the buffer protocol"""
+    return "%s-%s%s" % (stem, hashlib.sha1(data).hexdigest()[:16], extension)
+
+
+def is_binary_entry(entry):
+    return entry.type in TYPECODES and is_buffer(entry.value) and len(entry.value) >= INLINE_LIMIT
+
+
+def to_binary(value, typecode):
+    """Returns `value` as an object supporting the buffer protocol holding
+    little-endian values of `typecode`. Typed buffers are not copied if they
+    already have the right layout.
+    """
+    if numpy is not None and hasattr(value, "dtype"):
+        return numpy.ascontiguousarray(value, dtype=DTYPES[typecode])
+    if not (isinstance(value, array) and value.typecode == typecode):
+        if len(value) and isinstance(value[0], tuple):
+            value = chain.from_iterable(value)
+        value = array(typecode, value)
+    if sys.byteorder != "little":
+        value = array(typecode, value)
+        value.byteswap()
+    return value
+
+
+class BufferFiles:
+    """Binary files that receive the large buffers of one asset file"""
+    def __init__(self, path, base_url, hashed_names=False):
+        self._dir = os.path.dirname(path)
+        self._name = os.path.splitext(os.path.basename(path))[0]
+        self._base_url = base_url
+        self._hashed_names = hashed_names
+        self._descriptors = 0
+        self.paths = []
+        self.size = 0
+        self.descriptor_size = 0
+
+    def url_from_page(self, path):
+        return os.path.relpath(path, self._base_url).replace(os.sep, "/")
+
+    def write_buffer(self, entry, block_name):
+        data = to_binary(entry.value, TYPECODES[entry.type])
+        stem = "%s.%s" % (block_name, tools.safe_query_selector_id(entry.name))
+        if self._hashed_names:
+            path = os.path.join(self._dir, hashed_name(stem, data, ".bin"))
+        else:
+            path = os.path.join(self._dir, stem + ".bin")
+        with open(path, "wb") as buffer_file:
+            buffer_file.write(data)
+        length = os.path.getsize(path)
+        self.paths.append(path)
+        self.size += length
+        return {"url": self.url_from_page(path), "byteOffset": 0, "byteLength": length}
+
+    def externalize(self, entries, sizes=None):
+        """Moves the large buffers of a data block into binary files. Returns
+        the entries to write inline, with a reference to the descriptor of the
+        moved buffers in place of the first one. The bytes written for each
+        entry name are added to `sizes` if given.
+        """
+        if not any(is_binary_entry(entry) for entry in entries):
+            return entries
+
+        block_name = "%s-%d" % (self._name, self._descriptors)
+        self._descriptors += 1
+
+        result = []
+        data = {}
+        for entry in entries:
+            if not is_binary_entry(entry):
+                result.append(entry)
+                continue
+            if not data:
+                # Replaced by the reference to the descriptor
+                reference_index = len(result)
+                result.append(None)
+            item = data.setdefault(entry.name, {"type": entry.type.value, "seq": []})
+            value = self.write_buffer(entry, block_name)
+            item["seq"].append({"value": value, "key": float(entry.key or 0)})
+            if sizes is not None:
+                sizes[entry.name] = sizes.get(entry.name, 0) + value["byteLength"]
+
+        descriptor = json.dumps({"format": JSON_FORMAT, "version": JSON_VERSION, "data": data})
+        if self._hashed_names:
+            descriptor_name = hashed_name(block_name, descriptor.encode("utf-8"), ".json")
+        else:
+            descriptor_name = block_name + ".json"
+        descriptor_path = os.path.join(self._dir, descriptor_name)
+        with open(descriptor_path, "w") as descriptor_file:
+            descriptor_file.write(descriptor)
+        self.descriptor_size += os.path.getsize(descriptor_path)
+        result[reference_index] = DataReference(descriptor_name)
+        return result
@@ -1,16 +1,46 @@
 import os
+import time
+import hashlib
+import zlib
 import bpy
 from . import png
 from . import tools
+from . import imagetools
+from .cache import image_fingerprint, file_digest
 from bpy_extras.io_utils import path_reference
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 IMG_FORMAT_2_EXTENSION = dict(JPEG=".jpg", PNG=".png")
+# zlib strategies of the texture_png_strategy option, all of them are
+# tried for SMALLEST. zlib.Z_RLE is only defined from Python 3.6 on.
+PNG_STRATEGIES = [
+    ('DEFAULT', zlib.Z_DEFAULT_STRATEGY),
+    ('FILTERED', zlib.Z_FILTERED),
+    ('RLE', getattr(zlib, "Z_RLE", 3))
+]
 
 
 def export_image(image, context):
     if image in context.images:
         return context.images[image]
 
+    with context.timer.phase("textures"):
+        image_src = _export_image(image, context)
+
+    # Save the image to not export it again
+    if image_src is not None:
+        context.images[image] = image_src
+    return image_src
+
+
+def _export_image(image, context):
     if image.source not in {'FILE', 'VIDEO'}:
         context.warning(u"Image '{0:s}' is of source '{1:s}' which is not (yet) supported. Using default ...".format(image.name, image.source), "texture")
         return None
@@ -19,32 +49,105 @@ def export_image(image, context):
     texture_path = os.path.join(context.base_url, "textures")
     os.makedirs(texture_path, exist_ok=True)
 
-    if image.file_format in {'PNG', 'JPEG'}:
+    # Reading the size loads the image, has_data is only valid after it
+    if 0 in tuple(image.size) or not image.has_data:
+        context.warning(u"Image '{0:s}' has no pixels.".format(image.name), "texture")
+        if image.file_format not in {'PNG', 'JPEG'}:
+            return None
+    elif numpy is None and (context.options.texture_max_size or context.options.texture_power_of_two or context.options.texture_mipmaps):
+        context.warning(u"Image '{0:s}' is not resized, which needs numpy.".format(image.name), "texture")
+
+    # Resized textures and textures with mip levels are converted as well
+    if image.file_format in {'PNG', 'JPEG'} and not needs_processing(image, context.options):
+        # Packed and linked files with the same content get the same digest
+        if image.packed_file:
+            data = image.packed_file.data
+            size, read_digest = len(data), lambda: hashlib.sha1(data).hexdigest()
+        else:
+            path = bpy.path.abspath(image.filepath, library=image.library)
+            size, read_digest = file_size(path), lambda: file_digest(path)
+        image_src = copied_duplicate(image, size, read_digest, context)
+        if image_src is not None:
+            return image_src
+
         if image.packed_file:
             image_src = save_packed_image(image, context)
         else:
             image_src = copy_image(image, context)
+        if size is not None:
+            context.image_files.setdefault(size, []).append([read_digest, None, image_src])
     else:
         image_src = convert_and_export(image, texture_path, context)
 
-    # Save the image to not export it again
-    context.images[image] = image_src
     return image_src
 
 
+def written_duplicate(image, digest, context):
+    """Returns the src of the texture written before from the same content
+    as `image` or None. Images are identified by the `digest` of their
+    content, so copies under other names or from other sources are written
+    once.
+    """
+    image_src = context.image_digests.get(digest) if digest is not None else None
+    if image_src is not None:
+        record_duplicate(image, image_src, context)
+    return image_src
+
+
+def record_duplicate(image, image_src, context):
+    # The bytes saved are known once all textures are written, see Context.finalize
+    context.stats.texture_duplicates.append({"image": image.name, "name": os.path.basename(image_src), "size": 0})
+
+
+def copied_duplicate(image, size, read_digest, context):
+    """Returns the src of the texture written before from a file with the
+    same content as `image`, which has `size` bytes, or None. Files are
+    only hashed, with `read_digest`, if another file of the same size was
+    written, so textures of distinct sizes are never read for this.
+    """
+    digest = None
+    for candidate in context.image_files.get(size, []) if size is not None else []:
+        read_candidate, candidate_digest, image_src = candidate
+        if candidate_digest is None:
+            candidate_digest = candidate[1] = read_candidate()
+        if digest is None:
+            digest = read_digest()
+        if digest is not None and digest == candidate_digest:
+            record_duplicate(image, image_src, context)
+            return image_src
+    return None
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
 def save_packed_image(image, context):
     image_data = image.packed_file.data
     image_name = tools.safe_filename_from_image(image) + IMG_FORMAT_2_EXTENSION[image.file_format]
 
     image_src = os.path.join("textures", image_name)
     file_path = os.path.join(context.base_url, image_src)
-    if not os.path.exists(file_path):
+    if context.cache is not None:
+        # Packed data can change without changing the name of the image
+        key = context.cache.key(image_fingerprint(image))
+        write = context.cache.reuse(file_path, key) is None
+    else:
+        write = not os.path.exists(file_path)
+
+    if write:
         with open(file_path, "wb") as image_file:
             image_file.write(image_data)
             image_file.close()
 
     # Save file and file size in stats
-    context.stats.textures.append({"name": image_name, "size": os.path.getsize(file_path)})
+    texture_stats = {"name": image_name, "size": os.path.getsize(file_path)}
+    context.stats.textures.append(texture_stats)
+    if context.cache is not None and write:
+        context.cache.record(file_path, key, [file_path], [texture_stats])
 
     image_src = image_src.replace('\\', '/')
     return image_src
@@ -54,7 +157,10 @@ def copy_image(image, context):
     base_src = os.path.dirname(bpy.data.filepath)
     filepath_full = bpy.path.abspath(image.filepath, library=image.library)
     image_src = path_reference(filepath_full, base_src, context.base_url, 'COPY', "textures", context.copy_set, image.library)
-    # Stats are written when files have been copied (see Context.finalize)
+    # The size is known when files have been copied (see Context.finalize)
+    texture_stats = {"name": os.path.basename(image_src), "size": 0}
+    context.stats.textures.append(texture_stats)
+    context.copied_textures.append((os.path.join(context.base_url, image_src), texture_stats))
     return image_src
 
 
@@ -64,17 +170,184 @@ def convert_and_export(image, texture_path, context):
     file_name = image_name + ".png"
     image_src = os.path.join("textures", file_name)
     file_path = os.path.join(texture_path, file_name)
-    width = image.size[0]
-    height = image.size[1]
-    pixels = [x * 255 for x in list(image.pixels)]
-    pixels = [pixels[r * width * 4:(r + 1) * width * 4] for r in range(0, height)][::-1]
-    w = png.Writer(width, height, alpha=True)
-    with open(file_path, "wb") as image_file:
-        w.write_packed(image_file, pixels)
-        image_file.close()
-
-    # Save file and file size in stats
-    context.stats.textures.append({"name": file_name, "size": os.path.getsize(file_path)})
 
+    # Encoding is slow, so unchanged images are not encoded again
+    key = context.cache.key(image_fingerprint(image)) if context.cache else None
+    reused = context.cache.reuse(file_path, key) if context.cache else None
     image_src = image_src.replace('\\', '/')
+    if reused is not None:
+        context.stats.textures.extend(reused)
+        for texture_stats in reused:
+            if "digest" in texture_stats:
+                context.image_digests.setdefault(texture_stats["digest"], image_src)
+        return image_src
+
+    # Only reading the pixels needs Blender, the encoder takes it from here
+    start = time.perf_counter()
+    size = tuple(image.size)
+    pixels = read_pixels(image)
+    digest = pixels_digest(size, pixels)
+    duplicate = written_duplicate(image, digest, context)
+    if duplicate is not None:
+        return duplicate
+    context.image_digests[digest] = image_src
+
+    files = []
+    for level, (width, height, rows) in enumerate(texture_levels(pixels, size, context.options)):
+        path = file_path if level == 0 else os.path.join(texture_path, "%s.mip%d.png" % (image_name, level))
+        files.append((path, png_writer(width, height, context.options), rows))
+    texture_stats = {"name": file_name, "digest": digest, "convert_time": time.perf_counter() - start}
+    context.texture_encoder.submit(files, texture_stats, key)
     return image_src
+
+
+class TextureEncoder:
+    """Encodes converted textures in a pool of threads while the export
+    continues. zlib and numpy release the GIL while compressing and
+    filtering, so textures are encoded on all cores. The stats of a texture
+    are added when it is submitted, in scene order like those of copied
+    textures, and completed when joined.
+
+    Pixels are read faster than they are encoded and the rows of a texture
+    are kept until it is written, so at most `PENDING_PER_THREAD` files
+    per thread are queued before submit waits for the oldest.
+    """
+    PENDING_PER_THREAD = 2
+
+    def __init__(self, context):
+        self.context = context
+        threads = context.options.texture_encoding_threads or os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(threads) if threads > 1 else None
+        self._max_pending = threads * self.PENDING_PER_THREAD
+        self._pending = deque()
+        self._jobs = []
+
+    def submit(self, files, texture_stats, key):
+        """Encodes the `files` of a texture, tuples of path, png.Writer and
+        rows, the texture itself first and then its mip levels.
+        """
+        jobs = []
+        for file_path, writer, rows in files:
+            if self._executor is not None:
+                jobs.append(self._executor.submit(encode_texture, file_path, writer, rows))
+            else:
+                jobs.append(encode_texture(file_path, writer, rows))
+        if self._executor is not None:
+            self._pending.extend(jobs)
+            while self._pending and (self._pending[0].done() or len(self._pending) > self._max_pending):
+                self._pending.popleft().result()
+        self.context.stats.textures.append(texture_stats)
+        self._jobs.append((jobs, [f[0] for f in files], texture_stats, key))
+
+    def join(self):
+        """Waits for all textures and completes their stats"""
+        for jobs, paths, texture_stats, key in self._jobs:
+            texture_stats["encode_time"] = sum(job.result() if self._executor is not None else job for job in jobs)
+            texture_stats["size"] = os.path.getsize(paths[0])
+            if len(paths) > 1:
+                texture_stats["mipmaps"] = [{"name": os.path.basename(p), "size": os.path.getsize(p)} for p in paths[1:]]
+            if self.context.cache is not None:
+                self.context.cache.record(paths[0], key, paths, [texture_stats])
+        self._jobs = []
+        self._pending.clear()
+        if self._executor is not None:
+            self._executor.shutdown()
+
+
+def encode_texture(file_path, writer, rows):
+    """Writes the PNG file, returns the time it took"""
+    start = time.perf_counter()
+    with open(file_path, "wb") as image_file:
+        writer.write_packed(image_file, rows)
+    return time.perf_counter() - start
+
+
+def png_writer(width, height, options):
+    """Returns the PNG encoder for RGBA images configured by the texture options"""
+    if options.texture_png_strategy == 'SMALLEST':
+        strategy = [value for _, value in PNG_STRATEGIES]
+    else:
+        strategy = dict(PNG_STRATEGIES)[options.texture_png_strategy]
+    filter_type = 'adaptive' if options.texture_png_filter == 'ADAPTIVE' else None
+    return png.Writer(width, height, alpha=True, compression=options.texture_png_compression,
+                      strategy=strategy, filter_type=filter_type)
+
+
+def texture_size(size, options):
+    """Size of the texture written for an image of `size`"""
+    if numpy is None:
+        return size
+    return imagetools.target_size(size[0], size[1], options.texture_max_size, options.texture_power_of_two)
+
+
+def needs_processing(image, options):
+    if 0 in tuple(image.size) or not image.has_data:
+        return False
+    return numpy is not None and (texture_size(tuple(image.size), options) != tuple(image.size) or options.texture_mipmaps)
+
+
+def texture_levels(pixels, size, options):
+    """Returns width, height and rows of the texture written for the
+    `pixels` of an image of `size` followed by those of its mip levels, if
+    enabled.
+    """
+    width, height = texture_size(size, options)
+    if numpy is None:
+        return [(width, height, image_rows_python(pixels, size))]
+
+    pixels = pixels.reshape(size[1], size[0], 4)
+    pixels = imagetools.resample(pixels, width, height, options.texture_resample_filter)
+    levels = [pixels]
+    if options.texture_mipmaps:
+        levels += imagetools.mip_levels(pixels)
+    return [(level.shape[1], level.shape[0], quantized_rows(level)) for level in levels]
+
+
+def image_rows(image):
+    """Returns the rows of `image` as RGBA bytes from the top row down.
+    Blender keeps the pixels as floats from the bottom row up.
+    """
+    pixels = read_pixels(image)
+    if numpy is not None:
+        return quantized_rows(pixels.reshape(image.size[1], image.size[0], 4))
+    return image_rows_python(pixels, tuple(image.size))
+
+
+def read_pixels(image):
+    """Returns the pixels of `image` as float32 array"""
+    pixels = image.pixels
+    if numpy is None:
+        return array('f', pixels[:])
+    if hasattr(pixels, "foreach_get"):
+        result = numpy.empty(len(pixels), dtype=numpy.float32)
+        pixels.foreach_get(result)
+        return result
+    # A slice reads all values at once, which is much faster than iterating
+    return numpy.array(pixels[:], dtype=numpy.float32)
+
+
+def pixels_digest(size, pixels):
+    digest = hashlib.sha1(repr(size).encode("ascii"))
+    digest.update(pixels)
+    return digest.hexdigest()
+
+
+def quantized_rows(pixels):
+    """Returns the rows of the float `pixels` of shape (height, width, 4)
+    as bytes, changing `pixels`.
+    """
+    height, width = pixels.shape[:2]
+    numpy.clip(pixels, 0.0, 1.0, out=pixels)
+    pixels *= 255.0
+    pixels += 0.5
+    data = pixels.astype(numpy.uint8).reshape(height, width * 4)
+    # Flipping only reverses the order of the rows, which are passed to
+    # the encoder without copying
+    return [memoryview(row) for row in data[::-1]]
+
+
+def image_rows_python(pixels, size):
+    width, height = size
+    stride = width * 4
+    return [bytes(int(min(max(x, 0.0), 1.0) * 255.0 + 0.5) for x in pixels[r * stride:(r + 1) * stride])
+            for r in range(height - 1, -1, -1)]
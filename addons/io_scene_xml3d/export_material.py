@@ -1,7 +1,8 @@
 import os
-from xml.dom.minidom import Document
+from .xml_writer import DocumentWriter
 from .data import DataType, DataEntry, TextureEntry, write_generic_entry
 from .export_image import export_image
+from .cache import content_digest
 from . import tools
 
 BLENDER2XML_MATERIAL = "(diffuseColor, specularColor, shininess, transparency) = xflow.blenderMaterial(diffuse_color, diffuse_intensity, specular_color, specular_intensity, specular_hardness, alpha)"
@@ -11,6 +12,8 @@ TEXTURE_EXTENSION_MAP = dict(REPEAT="repeat", EXTEND="clamp")
 
 
 class Material:
+    # attributes written to material libraries, see cache.content_digest
+    content_fields = ("id", "script", "compute", "data")
     context = None
     id = ""
     script = "urn:xml3d:shader:phong"
@@ -105,7 +108,6 @@ class Material:
 
             if image_src:
                 # TODO: extension/clamp, filtering, sampling parameters
-                # FEATURE: Resize / convert / optimize texture
                 data.append(TextureEntry("diffuseTexture", image_src, wrap_type=wrap))
 
 DefaultMaterial = Material("defaultMaterial", None, None)
@@ -131,37 +133,44 @@ class MaterialLibrary:
         return "./" + self.url + "#" + material.id
 
     def __save_xml(self, file):
-        doc = Document()
-        xml3d = doc.createElement("xml3d")
-        doc.appendChild(xml3d)
+        writer = DocumentWriter(file)
+        writer.start_document()
+        writer.start_element("xml3d")
 
         for material in self.materials:
-            MaterialLibrary.save_material_xml(material, xml3d)
+            MaterialLibrary.save_material_xml(material, writer)
 
-        doc.writexml(file, "", "  ", "\n", "UTF-8")
+        writer.end_element()
 
     @staticmethod
-    def save_material_xml(material, parent):
-        shader = parent.ownerDocument.createElement("shader")
-        shader.setAttribute("id", material.id)
-        shader.setAttribute("script", material.script)
+    def save_material_xml(material, writer):
+        attributes = [("id", material.id), ("script", material.script)]
         if material.compute:
-            shader.setAttribute("compute", material.compute)
+            attributes.append(("compute", material.compute))
+        writer.start_element("shader", attributes)
         for entry in material.data:
-            entry_element = write_generic_entry(shader.ownerDocument, entry)
-            shader.appendChild(entry_element)
-        parent.appendChild(shader)
-        pass
+            write_generic_entry(writer, entry)
+        writer.end_element()
 
     def save(self):
         if not len(self.materials):
             return
 
+        cache = self.context.cache
+        key = cache.key(content_digest(self.materials)) if cache else None
+        reused = cache.reuse(self.url, key) if cache else None
+        if reused is not None:
+            self.context.stats.materials.extend(reused)
+            return
+
         with open(self.url, "w") as materialFile:
             self.__save_xml(materialFile)
             materialFile.close()
             size = os.path.getsize(self.url)
 
-        self.context.stats.materials.append({"name": os.path.basename(self.url), "size": size})
+        material_stats = {"name": os.path.basename(self.url), "size": size}
+        self.context.stats.materials.append(material_stats)
+        if cache is not None:
+            cache.record(self.url, key, [self.url], [material_stats])
 
 
@@ -3,13 +3,18 @@ import io
 import bpy
 import math
 import json
+import cProfile
 from . import xml_writer, export_asset, context
 from . import tools
+from .cache import mesh_fingerprint
 from .data import write_generic_entry_html
+from .load_manifest import create_load_manifest, write_load_manifest, preload_urls, preload_link
 from shutil import copytree
+from string import Template
 
 VERSION = "0.4.0"
 ASSETDIR = "assets"
+SCENEFILE = "scene.html"
 LIGHTMODELMAP = {
     "POINT": ("point", "intensity = xflow.blenderPoint(color, energy)"),
     "SPOT": ("spot", "intensity = xflow.blenderSpot(color, energy)"),
@@ -43,11 +48,22 @@ class XML3DExporter():
     def __init__(self, blender_context, dirname, options, progress):
         self.blender_context = blender_context
         self.context = context.Context(dirname, blender_context.scene, options)
-        self._output = io.StringIO()
-        self._writer = xml_writer.XMLWriter(self._output, 0)
+        self._writer = None
         self._resource = {}
         self._object_progress = progress
         self.asset_collections = {}
+        # maps mesh fingerprints to the url and configuration of their asset
+        self.mesh_cache = {}
+        # maps mesh fingerprints to the stats of the meshes of their asset
+        self.mesh_stats = {}
+        # maps mesh fingerprints to the collection holding their asset
+        self.mesh_collections = {}
+        # attributes of the xml3d element
+        self.scene_attributes = []
+        # top level objects with their children
+        self.hierarchy = []
+        # maps geometry objects to the collection, fragment and configuration of their asset
+        self.models = {}
 
     def create_asset_directory(self):
         assetDir = os.path.join(self.context.base_url, ASSETDIR)
@@ -75,14 +91,27 @@ class XML3DExporter():
     def add_to_asset_collection(self, geo_obj):
         assert geo_obj.type in {"MESH", "FONT", "SURFACE", "CURVE", "ARMATURE"}
 
+        fingerprint = mesh_fingerprint(geo_obj) if self.context.options.asset_instancing else None
+        if fingerprint in self.mesh_cache:
+            self.context.stats.instances += 1
+            for mesh_stats in self.mesh_stats[fingerprint]:
+                mesh_stats["instances"].append(geo_obj.name)
+            self.mesh_collections[fingerprint].add_reference(geo_obj)
+            return self.mesh_cache[fingerprint]
+
+        stats_count = len(self.context.stats.meshes)
         asset_collection = self.get_or_create_asset_collection(geo_obj)
         fragment, asset_config = asset_collection.add_asset(geo_obj)
 
         if not asset_config:
-            return None, None
+            return None
 
-        url = "%s/%s.xml#%s" % (ASSETDIR, asset_collection.name, fragment)
-        return url, asset_config
+        model = asset_collection, fragment, asset_config
+        if fingerprint is not None:
+            self.mesh_cache[fingerprint] = model
+            self.mesh_stats[fingerprint] = self.context.stats.meshes[stats_count:]
+            self.mesh_collections[fingerprint] = asset_collection
+        return model
 
     def build_hierarchy(self, objects):
         """ returns parent child relationships, skipping
@@ -173,12 +202,16 @@ class XML3DExporter():
                 self._writer.end_element("assetdata")
 
     def create_geometry(self, original_obj):
-        url, model_config = self.add_to_asset_collection(original_obj)
-        if not url:
+        model = self.models.get(original_obj)
+        if model is None:
             return
 
+        # Collections are saved before the scene is written, so their file names are known
+        asset_collection, fragment, model_config = model
+        url = "%s/%s#%s" % (ASSETDIR, asset_collection.file_name, fragment)
         self._writer.start_element("model")
-        self._writer.attribute("src", url)
+        # Progressive loading sets the src in order of the load manifest
+        self._writer.attribute("data-src" if self.context.options.scene_progressive_loading else "src", url)
 
         if model_config:
             self.create_model_configuration(model_config)
@@ -198,10 +231,21 @@ class XML3DExporter():
         self._writer.end_element("light")
         self.context.stats.lights += 1
 
-    def create_object(self, this_object, parent, children):
+    def create_assets(self, this_object, children):
+        with self.context.timer.phase("create_object"):
+            self._object_progress()
+
+            if this_object.type in {'MESH', 'CURVE', 'SURFACE', 'FONT'}:
+                self.models[this_object] = self.add_to_asset_collection(this_object)
+            elif this_object.type == "ARMATURE":
+                self.context.armatures.create_armature(this_object)
+            elif this_object.type not in {"CAMERA", "LAMP", "EMPTY"}:
+                self.warning("Object '%s' is of type '%s', which is not (yet) supported." % (this_object.name, this_object.type))
 
-        self._object_progress()
+            for obj, object_children in children:
+                self.create_assets(obj, object_children)
 
+    def create_object(self, this_object, parent, children):
         self._writer.start_element("group")
         self.write_defaults(this_object, prefix="")
         self.write_transformation(this_object)
@@ -211,14 +255,8 @@ class XML3DExporter():
             self.create_camera(this_object)
         elif this_object.type in {'MESH', 'CURVE', 'SURFACE', 'FONT'}:
             self.create_geometry(this_object)
-        elif this_object.type == "ARMATURE":
-            self.context.armatures.create_armature(this_object)
         elif this_object.type == "LAMP":
             self.create_lamp(this_object)
-        elif this_object.type == "EMPTY":
-            pass
-        else:
-            self.warning("Object '%s' is of type '%s', which is not (yet) supported." % (this_object.name, this_object.type))
 
         for obj, object_children in children:
             self.create_object(obj, this_object, object_children)
@@ -285,9 +323,9 @@ class XML3DExporter():
     def create_scene(self, scene):
         self.check_scene(scene)
 
-        self._writer.start_element("xml3d", id=scene.name)
+        self.scene_attributes = [("id", scene.name)]
         if scene.camera:
-            self._writer.attribute("activeView", "#v_%s" % tools.escape_html_id(scene.camera.name))
+            self.scene_attributes.append(("activeView", "#v_%s" % tools.escape_html_id(scene.camera.name)))
         else:
             self.warning("Scene '{0:s}' has no active camera set.".format(scene.name), "camera")
 
@@ -298,26 +336,57 @@ class XML3DExporter():
             bgColor = scene.world.horizon_color
             style += " background-color:rgb(%i,%i,%i);" % tuple(gamma(bgColor))
 
-        self._writer.attribute("style", style)
+        self.scene_attributes.append(("style", style))
+
+        with self.context.timer.phase("hierarchy"):
+            self.hierarchy = self.build_hierarchy(scene.objects)
+        for obj, children in self.hierarchy:
+            self.create_assets(obj, children)
+
+    def scene(self):
+        """Creates the assets of the scene. The scene itself is written by write_scene"""
+        with self.context.timer.phase("scene"):
+            self.create_scene(self.blender_context.scene)
+
+    def write_scene(self, stream):
+        """Writes the scene graph to `stream`, after the asset collections were saved"""
+        self._writer = xml_writer.XMLWriter(stream, 0)
+
+        # An external scene graph holds the content of the xml3d element only
+        external = self.context.options.scene_external_graph
+        if not external:
+            self._writer.start_element("xml3d")
+            for name, value in self.scene_attributes:
+                self._writer.attribute(name, value)
 
         self.create_def()
         self._writer.element("view", id="v_view")
-        hierarchy = self.build_hierarchy(scene.objects)
-        for obj, children in hierarchy:
+        for obj, children in self.hierarchy:
             self.create_object(obj, None, children)
 
         # xml3dElem.writexml(output)
-        self._writer.end_element("xml3d")
-
-    def scene(self):
-        self.create_scene(self.blender_context.scene)
-        return self._output.getvalue()
+        if not external:
+            self._writer.end_element("xml3d")
+
+    def scene_root(self, src):
+        """Returns the empty xml3d element the external scene graph at `src` is loaded into"""
+        output = io.StringIO()
+        writer = xml_writer.XMLWriter(output, 0)
+        writer.start_element("xml3d")
+        for name, value in self.scene_attributes + [("data-src", src)]:
+            writer.attribute(name, value)
+        writer.end_element("xml3d")
+        return output.getvalue()
 
     def finalize(self):
-        for collection in self.asset_collections.values():
-            collection.save()
+        timer = self.context.timer
+        with timer.phase("save"):
+            for collection in self.asset_collections.values():
+                with timer.phase(collection.name):
+                    collection.save()
 
-        self.context.finalize()
+        with timer.phase("finalize"):
+            self.context.finalize()
 
 
 def write_xml3d_info(dir, stats):
@@ -326,6 +395,44 @@ def write_xml3d_info(dir, stats):
         stats_file.close()
 
 
+def write_template(template, stream, values):
+    """Writes `template` to `stream` with its placeholders replaced by
+    `values`, like Template.substitute but piece by piece, so the page is
+    never built as one string. Callable values write themselves to `stream`.
+    """
+    position = 0
+    for match in Template.pattern.finditer(template):
+        stream.write(template[position:match.start()])
+        position = match.end()
+        if match.group("escaped") is not None:
+            stream.write(Template.delimiter)
+            continue
+        name = match.group("named") or match.group("braced")
+        if name is None:
+            raise ValueError("Invalid placeholder in template at position %d" % match.start())
+        value = values[name]
+        if callable(value):
+            value(stream)
+        else:
+            stream.write(value)
+    stream.write(template[position:])
+
+
+def preload_hints(options, stats, manifest, version):
+    """Returns the preload links of the files the page needs first"""
+    links = []
+    if options['scene_external_graph']:
+        links.append(preload_link("./" + SCENEFILE))
+    links.append(preload_link(version, "script"))
+    if options['scene_external_graph']:
+        links.append(preload_link("./common/scripts/scene-loading.js", "script"))
+    if options['mesh_quantization'] or stats.armatures:
+        # Requested once the first asset using a dataflow is parsed
+        links.append(preload_link("./common/xflow/data-flows.xml"))
+    links += [preload_link(url) for url in preload_urls(manifest)]
+    return links
+
+
 def create_active_views(blender_context):
     result = []
     camera = blender_context.scene.camera
@@ -365,9 +472,23 @@ def write_blender_config(dir, context):
 
 def save(operator, context, options):
     """Save the Blender scene to a XML3D/HTML file."""
-
-    from string import Template
-
+    profiler = None
+    if options['profile_export']:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    try:
+        return _save(context, options)
+    finally:
+        # Also if the export failed, so the profiler does not slow down Blender
+        if profiler is not None:
+            profiler.disable()
+            info_dir = os.path.join(os.path.dirname(options['filepath']), "info")
+            os.makedirs(info_dir, exist_ok=True)
+            profiler.dump_stats(os.path.join(info_dir, "export.pstats"))
+
+
+def _save(context, options):
     def object_progress():
         count = 0
         context.window_manager.progress_begin(0, len(context.scene.objects))
@@ -378,9 +499,6 @@ def save(operator, context, options):
             context.window_manager.progress_update(count)
         return progress
 
-    # TODO: Time the export
-    # time1 = time.clock()
-
     version = options['xml3djs_selection'] + ("-min" if options['xml3d_minimized'] else "") + ".js"
 
     dirName = os.path.dirname(__file__)
@@ -389,27 +507,42 @@ def save(operator, context, options):
 
     # export the scene with all its assets
     xml3d_exporter = XML3DExporter(context, output_dir, options, object_progress())
-    scene = xml3d_exporter.scene()
+    xml3d_exporter.scene()
     xml3d_exporter.finalize()
 
+    stats = xml3d_exporter.stats()
+    camera = list(context.scene.camera.matrix_world.translation) if context.scene.camera else None
+    manifest = create_load_manifest(ASSETDIR, stats.collections, stats.assets, stats.meshes, camera, options['scene_preload_assets'])
+
     template_dir = os.path.join(dirName, "templates/%s/" % options['template_selection'])
     template_path = os.path.join(template_dir, 'index.html')
     # TODO: Handle case if template file does not exist
-    with open(template_path, "r") as templateFile:
-        data = Template(templateFile.read())
-        file = open(file_path, 'w')
-        file.write(data.substitute(title=context.scene.name, xml3d=scene,
-                                   version=version, generator="xml3d-blender-exporter v" + VERSION))
-        file.close()
-        size = os.path.getsize(file_path)
-        xml3d_exporter.stats().scene = {"name": os.path.basename(file_path), "size": size}
+    with xml3d_exporter.context.timer.phase("template"), open(template_path, "r") as templateFile:
+        size = 0
+        scene = xml3d_exporter.write_scene
+        if options['scene_external_graph']:
+            scene_path = os.path.join(output_dir, SCENEFILE)
+            with open(scene_path, "w") as scene_file:
+                xml3d_exporter.write_scene(scene_file)
+            size += os.path.getsize(scene_path)
+            scene = xml3d_exporter.scene_root("./" + SCENEFILE)
+
+        preload = "\n    ".join(preload_hints(options, stats, manifest, version)) if options['scene_preload_assets'] else ""
+        with open(file_path, 'w') as file:
+            write_template(templateFile.read(), file, {
+                "title": context.scene.name, "xml3d": scene, "preload": preload,
+                "version": version, "generator": "xml3d-blender-exporter v" + VERSION
+            })
+        size += os.path.getsize(file_path)
+        stats.scene = {"name": os.path.basename(file_path), "size": size}
 
     # TODO: Make writing out stats optional
     info_dir = os.path.join(output_dir, "info")
     if not os.path.exists(info_dir):
         os.makedirs(info_dir)
 
-    write_xml3d_info(info_dir, xml3d_exporter.stats())
+    write_xml3d_info(info_dir, stats)
+    write_load_manifest(os.path.join(info_dir, "load-manifest.json"), manifest)
     write_blender_config(info_dir, context)
 
     # copy all common files
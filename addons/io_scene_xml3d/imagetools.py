@@ -0,0 +1,118 @@
+"""Resampling of texture pixels with NumPy.
+
+Pixels are float arrays of shape (height, width, 4) holding RGBA. They are
+resampled with a separable box or Lanczos filter on premultiplied alpha,
+so the color of transparent pixels does not bleed into their neighbours.
+"""
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Lobes of the Lanczos kernel
+LANCZOS_LOBES = 3
+
+
+def power_of_two(n):
+    """Largest power of two not above `n`, so textures never grow"""
+    return 1 << (max(int(n), 1).bit_length() - 1)
+
+
+def target_size(width, height, max_size=0, pot=False):
+    """Returns the size a texture of `width` and `height` is resampled to:
+    scaled down to `max_size` on its larger side keeping the aspect ratio,
+    if given, and each side rounded down to a power of two, if `pot`.
+    Empty images keep their size.
+    """
+    if not (width and height):
+        return width, height
+    if max_size and max(width, height) > max_size:
+        scale = max_size / max(width, height)
+        width, height = max(1, int(round(width * scale))), max(1, int(round(height * scale)))
+    if pot:
+        width, height = power_of_two(width), power_of_two(height)
+    return width, height
+
+
+def _lanczos(x):
+    x = numpy.abs(x)
+    result = numpy.sinc(x) * numpy.sinc(x / LANCZOS_LOBES)
+    result[x >= LANCZOS_LOBES] = 0.0
+    return result
+
+
+def _box(x):
+    return (numpy.abs(x) < 0.5).astype(numpy.float64) + (numpy.abs(x) == 0.5) * 0.5
+
+
+KERNELS = {
+    'BOX': (_box, 0.5),
+    'LANCZOS': (_lanczos, LANCZOS_LOBES)
+}
+
+
+def _weights(source, target, method):
+    """Returns the source indices and weights of every target sample, both
+    of shape (target, taps). Kernels are widened by the downscale factor,
+    samples outside the source are clamped to its border.
+    """
+    kernel, support = KERNELS[method]
+    scale = source / target
+    width = max(scale, 1.0)
+    taps = int(math.ceil(support * width)) * 2 + 1
+    centers = (numpy.arange(target) + 0.5) * scale - 0.5
+    first = numpy.floor(centers - support * width + 0.5).astype(numpy.int64)
+    indices = first[:, None] + numpy.arange(taps)[None, :]
+    weights = kernel((indices - centers[:, None]) / width)
+    weights /= weights.sum(axis=1, keepdims=True)
+    return numpy.clip(indices, 0, source - 1), weights.astype(numpy.float32)
+
+
+def _resample_axis(pixels, size, axis, method):
+    indices, weights = _weights(pixels.shape[axis], size, method)
+    shape = list(pixels.shape)
+    shape[axis] = size
+    result = numpy.zeros(shape, dtype=numpy.float32)
+    tap = numpy.empty(shape, dtype=numpy.float32)
+    weight_shape = [1] * len(shape)
+    weight_shape[axis] = size
+    for k in range(indices.shape[1]):
+        numpy.take(pixels, indices[:, k], axis=axis, out=tap)
+        tap *= weights[:, k].reshape(weight_shape)
+        result += tap
+    return result
+
+
+def resample(pixels, width, height, method='LANCZOS'):
+    """Returns `pixels` resampled to `width` and `height` with the box or
+    Lanczos filter. Changes `pixels`. Empty images are resampled to
+    transparent black.
+    """
+    if pixels.shape[1] == width and pixels.shape[0] == height:
+        return pixels
+    if not (pixels.shape[0] and pixels.shape[1]):
+        return numpy.zeros((height, width, 4), dtype=numpy.float32)
+    # Premultiplied alpha
+    pixels[..., :3] *= pixels[..., 3:4]
+    # The axis reduced most first, which leaves the least to do for the other
+    if height / pixels.shape[0] <= width / pixels.shape[1]:
+        pixels = _resample_axis(_resample_axis(pixels, height, 0, method), width, 1, method)
+    else:
+        pixels = _resample_axis(_resample_axis(pixels, width, 1, method), height, 0, method)
+    numpy.clip(pixels, 0.0, 1.0, out=pixels)
+    alpha = pixels[..., 3:4]
+    numpy.divide(pixels[..., :3], alpha, out=pixels[..., :3], where=alpha > 0.0)
+    return pixels
+
+
+def mip_levels(pixels):
+    """Returns the mip levels below `pixels` down to 1x1, each pre-filtered
+    from the one above with a box filter.
+    """
+    result = []
+    while pixels.shape[0] > 1 or pixels.shape[1] > 1:
+        pixels = resample(pixels.copy(), max(1, pixels.shape[1] // 2), max(1, pixels.shape[0] // 2), 'BOX')
+        result.append(pixels)
+    return result
@@ -0,0 +1,66 @@
+"""Load manifest of the asset files of an export.
+
+Lists every asset file with its size, the world space bounds and triangles
+of the objects using it and the ids of the groups referencing it. Clients
+use it to load the files nearest to the camera first and to show progress
+by bytes. The first `preload` files are hinted to the browser by the
+page as well. Only uses the export stats, so exports merged from several
+processes can be described as well.
+"""
+import json
+import math
+from xml.sax.saxutils import quoteattr
+
+VERSION = 1
+
+
+def distance_to_bounds(point, bounds):
+    if point is None or bounds is None:
+        return 0.0
+    lo, hi = bounds
+    return math.sqrt(sum(max(lo[i] - point[i], 0.0, point[i] - hi[i]) ** 2 for i in range(3)))
+
+
+def create_load_manifest(asset_dir, collections, assets, meshes, camera=None, preload=0):
+    """Returns the manifest of the written asset `collections` from the
+    export stats. `camera` is the world position the priorities refer to.
+    """
+    result = []
+    for collection in collections:
+        files = [a for a in assets if a["collection"] == collection["name"]]
+        if not files:
+            continue
+        result.append({
+            "url": "%s/%s" % (asset_dir, files[0]["name"]),
+            "collection": collection["name"],
+            "size": sum(a["size"] for a in files),
+            "bounds": collection["bounds"],
+            "triangles": sum(m["triangles"] for m in meshes if m["collection"] == collection["name"]),
+            "groups": collection["groups"]
+        })
+
+    # Nearest first, then larger files, which contribute more to the scene
+    result.sort(key=lambda a: (distance_to_bounds(camera, a["bounds"]), -a["size"], a["url"]))
+    for priority, asset in enumerate(result):
+        asset["priority"] = priority
+
+    return {"version": VERSION, "camera": camera, "preload": preload, "size": sum(a["size"] for a in result), "assets": result}
+
+
+def preload_urls(manifest):
+    """Returns the urls of the asset files the page hints to load early"""
+    return [asset["url"] for asset in manifest["assets"][:manifest["preload"]]]
+
+
+def preload_link(url, kind="fetch"):
+    """Returns a preload hint for `url`. Files requested by xml3d.js are
+    fetched anonymously, which the hint has to match to be used.
+    """
+    if kind == "fetch":
+        return '<link rel="preload" href=%s as="fetch" crossorigin="anonymous">' % quoteattr(url)
+    return '<link rel="preload" href=%s as="%s">' % (quoteattr(url), kind)
+
+
+def write_load_manifest(path, manifest):
+    with open(path, "w") as manifest_file:
+        json.dump(manifest, manifest_file, sort_keys=True)
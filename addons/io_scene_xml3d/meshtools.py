@@ -1,21 +1,61 @@
 from .tools import Vertex
 from .data import DataEntry, DataType
+from . import vertex_cache
+from array import array
+from itertools import chain
 import operator
+import re
 import mathutils
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def _numpy_version():
+    match = re.match(r"(\d+)\.(\d+)", numpy.__version__)
+    return (int(match.group(1)), int(match.group(2))) if match else (0, 0)
+
+# The NumPy engine needs numpy.unique over rows (axis argument), which was
+# added in NumPy 1.13. Older versions export with the Python engine.
+NUMPY_ENGINE = numpy is not None and _numpy_version() >= (1, 13)
+
+# Barycentric coordinate of a face corner by its position within the tessface
+BARYCENTRIC_BY_CORNER = ((1, 0, 0), (0, 1, 0), (0, 0, 1), (0, 1, 0))
+
+# Largest vertex count that can be drawn with 16-bit indices
+MAX_16BIT_VERTICES = 65535
+
+# Integer ranges of quantized attributes: uint16 positions and texture
+# coordinates, int8 octahedral normals and uint8 bone weights. xml3d.js has
+# no 16-bit value type, so uint16 values are split into low and high bytes
+# of a ubyte value. The decoding operators in common/scripts/blender-xflow.js
+# rely on NORMAL_RANGE and the byte order.
+POSITION_RANGE = 65535
+NORMAL_RANGE = 127
+TEXCOORD_RANGE = 65535
+WEIGHT_RANGE = 255
+
 
 def export_tessfaces(mesh, armature_info, context):
     if not len(mesh.tessfaces):
         context.warning(u"Mesh '{0:s}' has no triangles. Pure line geometry not (yet) supported. Try extruding a little.".format(mesh.name), "geometry")
         return None, None
 
+    if NUMPY_ENGINE:
+        return export_tessfaces_numpy(mesh, armature_info, context)
+    return export_tessfaces_python(mesh, armature_info, context)
+
+
+def export_tessfaces_python(mesh, armature_info, context):
     material_count = len(mesh.materials)
     store_barycentric_coordinates = context.options.mesh_export_barycentric_coordinates
 
     # Mesh indices:
     # For each material allocate an array
     # @UnusedVariable
-    indices = [[] for m in range(1 if material_count == 0 else material_count)]
+    indices = [array('i') for m in range(1 if material_count == 0 else material_count)]
 
     # All vertices of the mesh, trying to keep the number of vertices small
     vertices = []
@@ -65,6 +105,231 @@ def export_tessfaces(mesh, armature_info, context):
     return vertices, indices
 
 
+class VertexArrays:
+    """Columnar counterpart of a list of tools.Vertex as created by the numpy engine.
+
+    Each attribute holds one row per exported vertex. Optional attributes are None.
+    """
+    index = None
+    position = None
+    normal = None
+    texcoord = None
+    group_index = None
+    group_weights = None
+    bc = None
+
+    def __init__(self, index, position, normal, texcoord=None, group_index=None, group_weights=None, bc=None):
+        self.index = index
+        self.position = position
+        self.normal = normal
+        self.texcoord = texcoord
+        self.group_index = group_index
+        self.group_weights = group_weights
+        self.bc = bc
+
+    def __len__(self):
+        return len(self.index)
+
+
+def export_tessfaces_numpy(mesh, armature_info, context):
+    material_count = len(mesh.materials)
+    store_barycentric_coordinates = context.options.mesh_export_barycentric_coordinates
+
+    faces = mesh.tessfaces
+    face_count = len(faces)
+    vertex_count = len(mesh.vertices)
+
+    face_vertices = numpy.empty(face_count * 4, dtype=numpy.int32)
+    faces.foreach_get("vertices_raw", face_vertices)
+    face_vertices.shape = (face_count, 4)
+    face_normals = numpy.empty(face_count * 3, dtype=numpy.float32)
+    faces.foreach_get("normal", face_normals)
+    face_normals.shape = (face_count, 3)
+    face_smooth = numpy.empty(face_count, dtype=numpy.bool_)
+    faces.foreach_get("use_smooth", face_smooth)
+    face_material = numpy.empty(face_count, dtype=numpy.int32)
+    faces.foreach_get("material_index", face_material)
+
+    vertex_co = numpy.empty(vertex_count * 3, dtype=numpy.float32)
+    mesh.vertices.foreach_get("co", vertex_co)
+    vertex_co.shape = (vertex_count, 3)
+    vertex_normals = numpy.empty(vertex_count * 3, dtype=numpy.float32)
+    mesh.vertices.foreach_get("normal", vertex_normals)
+    vertex_normals.shape = (vertex_count, 3)
+
+    # Blender never stores vertex 0 in the fourth slot of a quad, thus a
+    # zero in that slot marks a triangle
+    is_quad = face_vertices[:, 3] != 0
+    corner_valid = numpy.ones((face_count, 4), dtype=numpy.bool_)
+    corner_valid[:, 3] = is_quad
+    corner_count = 3 + is_quad.astype(numpy.int32)
+
+    # All face corners in the order the python engine visits them
+    corner_vertex = face_vertices[corner_valid]
+    corner_face = numpy.repeat(numpy.arange(face_count), corner_count)
+    corner_slot = numpy.nonzero(corner_valid)[1]
+
+    corner_normal = numpy.where(face_smooth[corner_face, None], vertex_normals[corner_vertex], face_normals[corner_face])
+    # Same precision as the keys of tools.Vertex
+    corner_normal = numpy.round(corner_normal.astype(numpy.float64), 8)
+    keys = [corner_vertex[:, None].astype(numpy.float64), corner_normal]
+
+    corner_uv = None
+    if len(mesh.tessface_uv_textures):
+        uv_raw = numpy.empty(face_count * 8, dtype=numpy.float32)
+        mesh.tessface_uv_textures[0].data.foreach_get("uv_raw", uv_raw)
+        uv_raw.shape = (face_count, 4, 2)
+        corner_uv = numpy.round(uv_raw[corner_valid].astype(numpy.float64), 8)
+        keys.append(corner_uv)
+
+    if store_barycentric_coordinates:
+        keys.append(corner_slot[:, None].astype(numpy.float64))
+
+    # Deduplicate corners, numbering vertices in order of first appearance
+    keys = numpy.hstack(keys)
+    _, first_corner, corner_key = numpy.unique(keys, axis=0, return_index=True, return_inverse=True)
+    order = numpy.argsort(first_corner, kind="mergesort")
+    remap = numpy.empty(len(order), dtype=numpy.int32)
+    remap[order] = numpy.arange(len(order), dtype=numpy.int32)
+    corner_index = remap[corner_key.reshape(-1)]
+    unique_corners = first_corner[order]
+
+    source_index = corner_vertex[unique_corners]
+    vertices = VertexArrays(source_index, vertex_co[source_index], corner_normal[unique_corners].astype(numpy.float32))
+    if corner_uv is not None:
+        vertices.texcoord = corner_uv[unique_corners].astype(numpy.float32)
+    if store_barycentric_coordinates:
+        vertices.bc = corner_slot[unique_corners]
+
+    if armature_info:
+        get_vertex_weights_numpy(mesh, armature_info, vertices)
+
+    # Triangulate: (0, 1, 2) for every face, (2, 3, 0) for quads
+    face_start = numpy.cumsum(corner_count) - corner_count
+    triangles = face_start[:, None, None] + numpy.array([[0, 1, 2], [2, 3, 0]], dtype=numpy.int32)
+    triangle_valid = numpy.ones((face_count, 2), dtype=numpy.bool_)
+    triangle_valid[:, 1] = is_quad
+    triangle_material = numpy.repeat(face_material, 1 + is_quad)
+    triangles = corner_index[triangles[triangle_valid]]
+
+    indices = [triangles[triangle_material == m].ravel() for m in range(1 if material_count == 0 else material_count)]
+    return vertices, indices
+
+
+def split_mesh(mesh, vertices, indices, limit=MAX_16BIT_VERTICES):
+    """Partitions the triangles of all materials into spatially compact
+    chunks of at most `limit` vertices. Returns a list of (vertices, indices)
+    tuples with indices local to the chunk.
+    """
+    if isinstance(vertices, VertexArrays):
+        positions = vertices.position.tolist()
+    else:
+        positions = [mesh.vertices[v.index].co for v in vertices]
+    index_lists = [i.tolist() for i in indices]
+
+    triangles = []
+    for material_index, material_indices in enumerate(index_lists):
+        for t in range(0, len(material_indices), 3):
+            triangles.append((material_index, material_indices[t:t + 3]))
+    centers = [[sum(positions[v][axis] for v in corners) / 3.0 for axis in range(3)] for _, corners in triangles]
+
+    # Recursive bisection along the longest axis. Sets are cut so that the
+    # parts are about as full as the number of required chunks allows.
+    chunks = []
+    stack = [list(range(len(triangles)))]
+    while stack:
+        part = stack.pop()
+        vertex_count = len(set(v for t in part for v in triangles[t][1]))
+        if vertex_count <= limit or len(part) < 2:
+            chunks.append(sorted(part))
+            continue
+        extent = [max(centers[t][axis] for t in part) - min(centers[t][axis] for t in part) for axis in range(3)]
+        axis = extent.index(max(extent))
+        part.sort(key=lambda t: centers[t][axis])
+        pieces = -(-vertex_count // limit)
+        cut = len(part) * (pieces // 2) // pieces
+        stack.append(part[cut:])
+        stack.append(part[:cut])
+
+    result = []
+    for chunk in chunks:
+        used = sorted(set(v for t in chunk for v in triangles[t][1]))
+        remap = {v: i for i, v in enumerate(used)}
+        chunk_indices = [[] for _ in index_lists]
+        for t in chunk:
+            material_index, corners = triangles[t]
+            chunk_indices[material_index].extend(remap[v] for v in corners)
+
+        if isinstance(vertices, VertexArrays):
+            rows = numpy.array(used, dtype=numpy.intp)
+            chunk_vertices = VertexArrays(*(None if value is None else value[rows] for value in (
+                vertices.index, vertices.position, vertices.normal, vertices.texcoord,
+                vertices.group_index, vertices.group_weights, vertices.bc)))
+            chunk_indices = [numpy.array(i, dtype=numpy.int32) for i in chunk_indices]
+        else:
+            chunk_vertices = [vertices[v] for v in used]
+            chunk_indices = [array('i', i) for i in chunk_indices]
+        result.append((chunk_vertices, chunk_indices))
+    return result
+
+
+def optimize_vertex_cache(mesh, vertices, indices, overdraw=False):
+    """Reorders the triangles of each material for the vertex cache and
+    renumbers vertices in order of first use. Returns the reordered
+    vertices and indices and the ACMR before and after the optimization.
+    """
+    vertex_count = len(vertices)
+    index_lists = [i.tolist() for i in indices]
+    triangle_count = sum(len(i) for i in index_lists) // 3
+    acmr_before = sum(vertex_cache.acmr(i) * len(i) for i in index_lists) / (3 * triangle_count)
+
+    positions = None
+    if overdraw:
+        if isinstance(vertices, VertexArrays):
+            positions = vertices.position.tolist()
+        else:
+            positions = [mesh.vertices[v.index].co for v in vertices]
+
+    index_lists = [vertex_cache.optimize(i, vertex_count, positions) if i else i for i in index_lists]
+    # Renumbering does not change the cache behavior
+    acmr_after = sum(vertex_cache.acmr(i) * len(i) for i in index_lists) / (3 * triangle_count)
+    order, remap = vertex_cache.first_use_order(index_lists, vertex_count)
+
+    if isinstance(vertices, VertexArrays):
+        order = numpy.array(order, dtype=numpy.intp)
+        for name in ("index", "position", "normal", "texcoord", "group_index", "group_weights", "bc"):
+            value = getattr(vertices, name)
+            if value is not None:
+                setattr(vertices, name, value[order])
+        remap = numpy.array(remap, dtype=numpy.int32)
+        indices = [remap[numpy.array(i, dtype=numpy.intp)] for i in index_lists]
+    else:
+        vertices = [vertices[i] for i in order]
+        indices = [array('i', [remap[v] for v in i]) for i in index_lists]
+
+    return vertices, indices, acmr_before, acmr_after
+
+
+def get_vertex_weights_numpy(mesh, armature_info, vertices):
+    # Vertex groups can not be read in bulk, but only once per source vertex
+    mesh_vertices = mesh.vertices
+    source_index = vertices.index
+    if not len(mesh_vertices[int(source_index[0])].groups):
+        return
+
+    vertex_count = len(mesh_vertices)
+    group_index = numpy.zeros((vertex_count, 4), dtype=numpy.int32)
+    group_weights = numpy.zeros((vertex_count, 4), dtype=numpy.float32)
+    for i in numpy.unique(source_index).tolist():
+        bones, weights = get_bones_and_weights(mesh_vertices[i].groups, armature_info)
+        if bones:
+            group_index[i] = bones[:]
+            group_weights[i] = numpy.round(weights[:], 8)
+
+    vertices.group_index = group_index[source_index]
+    vertices.group_weights = group_weights[source_index]
+
+
 def get_bones_and_weights(groups, armature_info):
     if not (len(groups) and armature_info):
         return None, None
@@ -118,44 +383,159 @@ def append_unique(mlist, value):
 
 
 def get_vertex_attributes(mesh, vertices):
+    if isinstance(vertices, VertexArrays):
+        return get_vertex_attributes_numpy(vertices)
+
     content = []
-    positions = []
-    normals = []
-    texcoord = []
-    barycentric = []
-    group_weights = []
-    group_indices = []
 
     has_texcoords = vertices[0].texcoord
     has_weights = vertices[0].group_weights
     has_barycentric = vertices[0].bc != -1
-    for v in vertices:
-        positions += mesh.vertices[v.index].co[:]
-        normals += v.normal[:]
-        if has_texcoords:
-            texcoord += v.texcoord[:]
-        if has_weights:
-            group_weights += v.group_weights[:] if v.group_weights else [0, 0, 0, 0]
-            group_indices += v.group_index[:] if v.group_index else [0, 0, 0, 0]
-
-        if has_barycentric:
-            if v.bc == 0:
-                barycentric += [1, 0, 0]
-            elif v.bc == 1 or v.bc == 3:
-                barycentric += [0, 1, 0]
-            else:
-                barycentric += [0, 0, 1]
+
+    # Gather each attribute column into a typed buffer in one pass
+    co = array('f', [0.0]) * (len(mesh.vertices) * 3)
+    mesh.vertices.foreach_get("co", co)
+    positions = array('f', chain.from_iterable(co[3 * v.index:3 * v.index + 3] for v in vertices))
+    normals = array('f', chain.from_iterable(v.normal for v in vertices))
 
     content.append(DataEntry("position", DataType.float3, positions))
     content.append(DataEntry("normal", DataType.float3, normals))
     if has_texcoords:
+        texcoord = array('f', chain.from_iterable(v.texcoord for v in vertices))
         content.append(DataEntry("texcoord", DataType.float2, texcoord))
 
     if has_barycentric:
+        barycentric = array('f', chain.from_iterable(BARYCENTRIC_BY_CORNER[v.bc] for v in vertices))
         content.append(DataEntry("barycentric", DataType.float3, barycentric))
 
     if has_weights:
+        no_weights = (0, 0, 0, 0)
+        group_indices = array('i', map(int, chain.from_iterable(v.group_index or no_weights for v in vertices)))
+        group_weights = array('f', chain.from_iterable(v.group_weights or no_weights for v in vertices))
         content.append(DataEntry("bone_index", DataType.int4, group_indices))
         content.append(DataEntry("bone_weight", DataType.float4, group_weights))
 
     return content
+
+
+def get_vertex_attributes_numpy(vertices):
+    content = []
+    content.append(DataEntry("position", DataType.float3, vertices.position.ravel()))
+    content.append(DataEntry("normal", DataType.float3, vertices.normal.ravel()))
+    if vertices.texcoord is not None:
+        content.append(DataEntry("texcoord", DataType.float2, vertices.texcoord.ravel()))
+
+    if vertices.bc is not None:
+        barycentric = numpy.array(BARYCENTRIC_BY_CORNER, dtype=numpy.float32)[vertices.bc]
+        content.append(DataEntry("barycentric", DataType.float3, barycentric.ravel()))
+
+    if vertices.group_weights is not None:
+        content.append(DataEntry("bone_index", DataType.int4, vertices.group_index.ravel()))
+        content.append(DataEntry("bone_weight", DataType.float4, vertices.group_weights.ravel()))
+
+    return content
+
+
+def quantize_vertex_attributes(content, skinning=False):
+    """Replaces position, normal, texcoord and bone weights in `content` by
+    8-bit integer encodings. Returns the new content and the id of the dataflow in
+    common/xflow/data-flows.xml that decodes them.
+    """
+    result = []
+    has_texcoord = False
+    for entry in content:
+        value = entry.value
+        if entry.name == "position":
+            quantized, offset, scale = quantize_range(value, 3, POSITION_RANGE, False)
+            result.append(DataEntry("quantized_position", DataType.ubyte, _split_bytes(quantized)))
+            result.append(DataEntry("position_offset", DataType.float3, offset))
+            result.append(DataEntry("position_scale", DataType.float3, scale))
+        elif entry.name == "normal":
+            result.append(DataEntry("quantized_normal", DataType.byte, _narrow(encode_octahedral(value, NORMAL_RANGE), 'b')))
+        elif entry.name == "texcoord":
+            quantized, offset, scale = quantize_range(value, 2, TEXCOORD_RANGE, False)
+            result.append(DataEntry("quantized_texcoord", DataType.ubyte, _split_bytes(quantized)))
+            result.append(DataEntry("texcoord_offset", DataType.float2, offset))
+            result.append(DataEntry("texcoord_scale", DataType.float2, scale))
+            has_texcoord = True
+        elif entry.name == "bone_weight":
+            result.append(DataEntry("quantized_bone_weight", DataType.ubyte, _narrow(_round_values(value, WEIGHT_RANGE), 'B')))
+        else:
+            result.append(entry)
+
+    dataflow = "blenderDecode" + ("Texcoord" if has_texcoord else "") + ("Skinning" if skinning else "")
+    return result, dataflow
+
+
+def quantize_range(values, components, steps, signed):
+    """Maps each component of `values` from its range to integers in
+    [-steps, steps] if `signed` or [0, steps] otherwise. Returns the integers
+    and the offset and scale that restore the values.
+    """
+    offset = []
+    scale = []
+    for c in range(components):
+        column = values[c::components]
+        low, high = (float(min(column)), float(max(column))) if len(column) else (0.0, 0.0)
+        if signed:
+            offset.append((low + high) * 0.5)
+            extent = (high - low) * 0.5
+        else:
+            offset.append(low)
+            extent = high - low
+        scale.append(extent / steps if extent > 0 else 1.0)
+
+    if numpy is not None:
+        matrix = numpy.asarray(values, dtype=numpy.float64).reshape(-1, components)
+        return numpy.rint((matrix - offset) / scale).astype(numpy.int32).ravel(), offset, scale
+    return array('i', [int(round((v - offset[i % components]) / scale[i % components])) for i, v in enumerate(values)]), offset, scale
+
+
+def encode_octahedral(normals, steps):
+    """Encodes unit vectors to two integers in [-steps, steps] each by
+    projecting them onto an octahedron that is unfolded into a square.
+    """
+    if numpy is not None:
+        n = numpy.asarray(normals, dtype=numpy.float64).reshape(-1, 3)
+        length = numpy.abs(n).sum(axis=1)
+        length[length == 0] = 1.0
+        p = n[:, :2] / length[:, None]
+        sign = numpy.where(p >= 0, 1.0, -1.0)
+        folded = (1.0 - numpy.abs(p[:, ::-1])) * sign
+        p = numpy.where((n[:, 2] < 0)[:, None], folded, p)
+        return numpy.rint(numpy.clip(p, -1.0, 1.0) * steps).astype(numpy.int32).ravel()
+
+    result = array('i')
+    for i in range(0, len(normals), 3):
+        x, y, z = normals[i:i + 3]
+        length = abs(x) + abs(y) + abs(z) or 1.0
+        x, y = x / length, y / length
+        if z < 0:
+            x, y = (1.0 - abs(y)) * (1.0 if x >= 0 else -1.0), (1.0 - abs(x)) * (1.0 if y >= 0 else -1.0)
+        result.append(int(round(max(-1.0, min(1.0, x)) * steps)))
+        result.append(int(round(max(-1.0, min(1.0, y)) * steps)))
+    return result
+
+
+def _round_values(values, steps):
+    if numpy is not None:
+        return numpy.rint(numpy.asarray(values, dtype=numpy.float64) * steps).astype(numpy.int32)
+    return array('i', [int(round(v * steps)) for v in values])
+
+
+def _narrow(values, typecode):
+    """Returns integer `values` as 8-bit integers of `typecode` ('b' or 'B')"""
+    if numpy is not None and hasattr(values, "dtype"):
+        return values.astype(numpy.int8 if typecode == 'b' else numpy.uint8)
+    return array(typecode, values)
+
+
+def _split_bytes(values):
+    """Returns uint16 `values` as pairs of low and high bytes"""
+    if numpy is not None and hasattr(values, "dtype"):
+        return values.astype("<u2").view(numpy.uint8)
+    result = array('B')
+    for v in values:
+        result.append(v & 0xff)
+        result.append(v >> 8)
+    return result
@@ -171,6 +171,11 @@ try:
     import cpngfilters as pngfilters
 except ImportError:
     pass
+try:
+    # Used for adaptive filtering only
+    import numpy
+except ImportError:
+    numpy = None
 
 
 __all__ = ['Image', 'Reader', 'Writer', 'write_chunks', 'from_array']
@@ -373,6 +378,8 @@ class Writer:
                  background=None,
                  gamma=None,
                  compression=None,
+                 strategy=None,
+                 filter_type=None,
                  interlace=False,
                  bytes_per_sample=None, # deprecated
                  planes=None,
@@ -405,6 +412,11 @@ class Writer:
         compression
           zlib compression level: 0 (none) to 9 (more compressed);
           default: -1 or None.
+        strategy
+          zlib compression strategy or a sequence of strategies to try;
+          default: None.
+        filter_type
+          Scanline filter: 0 to 4 or ``'adaptive'``; default: None.
         interlace
           Create an interlaced image.
         chunk_limit
@@ -481,6 +493,18 @@ class Writer:
         level of compession will be picked by the ``zlib`` module
         (which is generally acceptable).
 
+        The `strategy` argument is passed to ``zlib.compressobj``, for
+        instance ``zlib.Z_FILTERED``.  If it is a sequence, the image
+        data is compressed with each strategy in turn and the smallest
+        result is written.  The rows are kept in memory for that, of the
+        compressed data only the smallest result so far.
+
+        The `filter_type` argument selects the scanline filter.  With
+        ``'adaptive'`` the filter of every row is chosen by the smallest
+        sum of absolute differences, which usually gives much smaller
+        files.  Filtering needs NumPy, an 8 bit image and no interlacing;
+        otherwise rows are written unfiltered.
+
         If `interlace` is true then an interlaced image is created
         (using PNG's so far only interace method, *Adam7*).  This does
         not affect how the pixels should be presented to the encoder,
@@ -588,6 +612,8 @@ class Writer:
         self.colormap = bool(palette)
         self.bitdepth = int(bitdepth)
         self.compression = compression
+        self.strategy = strategy
+        self.filter_type = filter_type
         self.chunk_limit = chunk_limit
         self.interlace = bool(interlace)
         self.palette = check_palette(palette)
@@ -718,16 +744,70 @@ class Writer:
                             struct.pack("!3H", *self.background))
 
         # http://www.w3.org/TR/PNG/#11IDAT
-        if self.compression is not None:
-            compressor = zlib.compressobj(self.compression)
+        if isinstance(self.strategy, (list, tuple)):
+            strategies = self.strategy
         else:
-            compressor = zlib.compressobj()
+            strategies = [self.strategy]
+
+        def write_idat(data):
+            write_chunk(outfile, 'IDAT', data)
+
+        if len(strategies) == 1:
+            count = self.deflate(rows, packed, strategies[0], write_idat)
+        else:
+            # The rows are compressed again with every strategy, of the
+            # compressed data only the smallest so far is kept
+            if not isinstance(rows, (list, tuple)):
+                rows = list(rows)
+            smallest = None
+            for strategy in strategies:
+                result = []
+                count = self.deflate(rows, packed, strategy, result.append)
+                if smallest is None or sum(map(len, result)) < sum(map(len, smallest)):
+                    smallest = result
+                del result
+            for data in smallest:
+                write_idat(data)
+        # http://www.w3.org/TR/PNG/#11IEND
+        write_chunk(outfile, 'IEND')
+        return count
+
+    def deflate(self, rows, packed, strategy, write):
+        """
+        Filters and compresses `rows` with the zlib `strategy` and
+        passes the compressed data to `write` piece by piece.  Returns
+        the number of rows.  See :meth:`write_passes` for `rows` and
+        `packed`.
+        """
+
+        compression = self.compression if self.compression is not None else -1
+        compressor = zlib.compressobj(compression, zlib.DEFLATED, zlib.MAX_WBITS, 8,
+                                      strategy if strategy is not None else zlib.Z_DEFAULT_STRATEGY)
+
+        def compress(data):
+            compressed = compressor.compress(data)
+            if len(compressed):
+                write(compressed)
+
+        # Rows are prefixed with their filter type when filtered
+        filtered = self.filter_type not in (None, 0) and self.bitdepth == 8 and \
+            not self.interlace and not self.rescale and numpy is not None
+        if filtered:
+            rows = filter_rows(rows, self.filter_type, self.width * self.planes, self.planes)
 
         # Choose an extend function based on the bitdepth.  The extend
         # function packs/decomposes the pixel values into bytes and
         # stuffs them onto the data array.
         data = array('B')
-        if self.bitdepth == 8 or packed:
+        if packed:
+            def extend(sl):
+                # Rows supporting the buffer protocol, like bytes or a
+                # memoryview of an array, are copied without iterating
+                try:
+                    data.frombytes(sl)
+                except TypeError:
+                    data.extend(sl)
+        elif self.bitdepth == 8:
             extend = data.extend
         elif self.bitdepth == 16:
             # Decompose into bytes
@@ -767,7 +847,8 @@ class Writer:
         del rows
 
         # First row's filter type.
-        data.append(0)
+        if not filtered:
+            data.append(0)
         # :todo: Certain exceptions in the call to ``.next()`` or the
         # following try would indicate no row data supplied.
         # Should catch.
@@ -792,26 +873,21 @@ class Writer:
             # mark the first row of a reduced pass image; that means we
             # could accidentally compute the wrong filtered scanline if
             # we used "up", "average", or "paeth" on such a line.
-            data.append(0)
+            if not filtered:
+                data.append(0)
             extend(row)
             if len(data) > self.chunk_limit:
-                compressed = compressor.compress(tostring(data))
-                if len(compressed):
-                    write_chunk(outfile, 'IDAT', compressed)
+                compress(tostring(data))
                 # Because of our very witty definition of ``extend``,
                 # above, we must re-use the same ``data`` object.  Hence
                 # we use ``del`` to empty this one, rather than create a
                 # fresh one (which would be my natural FP instinct).
                 del data[:]
         if len(data):
-            compressed = compressor.compress(tostring(data))
-        else:
-            compressed = strtobytes('')
+            compress(tostring(data))
         flushed = compressor.flush()
-        if len(compressed) or len(flushed):
-            write_chunk(outfile, 'IDAT', compressed + flushed)
-        # http://www.w3.org/TR/PNG/#11IEND
-        write_chunk(outfile, 'IEND')
+        if len(flushed):
+            write(flushed)
         return i+1
 
     def write_array(self, outfile, pixels):
@@ -981,6 +1057,63 @@ def write_chunks(out, chunks):
     for chunk in chunks:
         write_chunk(out, *chunk)
 
+def _as_samples(row):
+    try:
+        # Rows supporting the buffer protocol are not copied
+        return numpy.frombuffer(row, dtype=numpy.uint8)
+    except TypeError:
+        return numpy.asarray(row, dtype=numpy.uint8)
+
+
+def filter_rows(rows, type, stride, fo):
+    """Applies a scanline filter to `rows` of 8 bit samples, `stride`
+    bytes each, using NumPy.  Yields the filtered rows prefixed with their
+    filter type.  With `type` ``'adaptive'`` the filter of every row is the
+    one with the smallest sum of absolute differences, the values taken as
+    signed bytes.  `fo` is the filter offset, see :func:`filter_scanline`.
+    Rows are filtered in bands to bound the memory used.
+    """
+
+    band = max(1, 2**20 // stride)
+    prev = numpy.zeros(stride, dtype=numpy.int16)
+    rows = iter(rows)
+    while True:
+        lines = [_as_samples(row) for row in itertools.islice(rows, band)]
+        if not lines:
+            return
+        line = numpy.array(lines, dtype=numpy.int16)
+        count = len(lines)
+        up = numpy.empty_like(line)
+        up[0] = prev
+        up[1:] = line[:-1]
+        left = numpy.zeros_like(line)
+        left[:, fo:] = line[:, :-fo]
+        upleft = numpy.zeros_like(line)
+        upleft[:, fo:] = up[:, :-fo]
+
+        # http://www.w3.org/TR/PNG/#9Filter-type-4-Paeth
+        p = left + up - upleft
+        pa = numpy.abs(p - left)
+        pb = numpy.abs(p - up)
+        pc = numpy.abs(p - upleft)
+        paeth = numpy.where((pa <= pb) & (pa <= pc), left, numpy.where(pb <= pc, up, upleft))
+
+        filters = [line, line - left, line - up, line - ((left + up) >> 1), line - paeth]
+        out = numpy.empty((count, stride + 1), dtype=numpy.uint8)
+        if type == 'adaptive':
+            candidates = numpy.array(filters, dtype=numpy.int16) & 0xff
+            costs = numpy.abs(candidates.astype(numpy.uint8).view(numpy.int8).astype(numpy.int32)).sum(axis=2)
+            types = costs.argmin(axis=0)
+            out[:, 0] = types
+            out[:, 1:] = candidates[types, numpy.arange(count)]
+        else:
+            out[:, 0] = type
+            out[:, 1:] = filters[type] & 0xff
+        prev = line[-1]
+        for row in out:
+            yield memoryview(row)
+
+
 def filter_scanline(type, line, fo, prev=None):
     """Apply a scanline filter to a scanline.  `type` specifies the
     filter type (0 to 4); `line` specifies the current (unfiltered)
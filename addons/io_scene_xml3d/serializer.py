@@ -0,0 +1,120 @@
+"""Text serialization of numeric buffers for XML3D value elements.
+
+Values are formatted in chunks, so large buffers can be written straight to
+a stream without building one string for the whole buffer.
+"""
+from array import array
+from itertools import chain
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Number of values formatted at once
+CHUNK_SIZE = 65536
+
+# xml3d.js parses all float values into a Float32Array. Up to nine
+# significant digits are needed to restore every single precision value.
+FLOAT32_DIGITS = (6, 7, 8, 9)
+
+
+def is_buffer(value):
+    return isinstance(value, (list, tuple, array)) or hasattr(value, "dtype")
+
+
+def format_ints(values):
+    values = values.tolist() if hasattr(values, "tolist") else values
+    return " ".join(["%d"] * len(values)) % tuple(values)
+
+
+def format_floats(values, precision=None):
+    """Formats floats with `precision` significant digits. Without a
+    precision, the shortest string that restores the same single
+    precision value is used for each value.
+    """
+    values = values.tolist() if hasattr(values, "tolist") else list(values)
+    if precision:
+        return " ".join(["%%.%dg" % precision] * len(values)) % tuple(values)
+    return " ".join(shortest_float32(values))
+
+
+def shortest_float32(values):
+    if numpy is not None:
+        return _shortest_float32_numpy(values)
+
+    exact = array('f', values)
+    values = exact.tolist()
+    result = [None] * len(values)
+    pending = range(len(values))
+
+    for digits in FLOAT32_DIGITS:
+        candidates = [values[i] for i in pending]
+        strings = _format(candidates, digits)
+        if digits == FLOAT32_DIGITS[-1]:
+            unresolved = ()
+        else:
+            parsed = array('f', map(float, strings))
+            unresolved = [n for n, (a, b) in enumerate(zip(parsed, array('f', candidates))) if a != b]
+        unresolved_set = set(unresolved)
+        for n, (i, string) in enumerate(zip(pending, strings)):
+            if n not in unresolved_set:
+                result[i] = string
+        if not unresolved:
+            break
+        pending = [pending[n] for n in unresolved]
+
+    return result
+
+
+def _shortest_float32_numpy(values):
+    # Find the digits needed for each value with vectorized rounding, then
+    # format every value once. Rounding in double precision can be off for
+    # values close to a tie, so the strings are verified afterwards.
+    exact = numpy.asarray(values, dtype=numpy.float32).ravel()
+    wide = exact.astype(numpy.float64)
+    digits = numpy.full(len(exact), FLOAT32_DIGITS[-1], dtype=numpy.intp)
+    magnitude = numpy.abs(wide)
+    with numpy.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        exponent = numpy.floor(numpy.log10(numpy.where(magnitude > 0, magnitude, 1.0)))
+        for d in reversed(FLOAT32_DIGITS[:-1]):
+            scale = 10.0 ** (d - 1 - exponent)
+            rounded = (numpy.round(wide * scale) / scale).astype(numpy.float32)
+            digits[rounded == exact] = d
+
+    formats = numpy.array(["%%.%dg" % d for d in range(FLOAT32_DIGITS[-1] + 1)], dtype=object)
+    strings = (" ".join(formats[digits].tolist()) % tuple(wide.tolist())).split(" ")
+    parsed = numpy.array(strings, dtype=numpy.float32)
+    for i in numpy.nonzero(parsed != exact)[0].tolist():
+        strings[i] = "%%.%dg" % FLOAT32_DIGITS[-1] % wide[i]
+    return strings
+
+
+def _format(values, digits):
+    if not values:
+        return []
+    return (" ".join(["%%.%dg" % digits] * len(values)) % tuple(values)).split(" ")
+
+
+def iter_chunks(values, integer=False, precision=None, chunk_size=CHUNK_SIZE):
+    """Yields the space separated text of `values` in chunks of `chunk_size` values"""
+    if isinstance(values, (list, tuple)) and len(values) and isinstance(values[0], tuple):
+        values = list(chain.from_iterable(values))
+
+    for start in range(0, len(values), chunk_size):
+        part = values[start:start + chunk_size]
+        text = format_ints(part) if integer else format_floats(part, precision)
+        yield text if start == 0 else " " + text
+
+
+def format_values(values, integer=False, precision=None):
+    return "".join(iter_chunks(values, integer, precision))
+
+
+def write_values(stream, values, integer=False, precision=None, chunk_size=CHUNK_SIZE):
+    """Writes `values` to `stream` and returns the number of characters written"""
+    written = 0
+    for text in iter_chunks(values, integer, precision, chunk_size):
+        stream.write(text)
+        written += len(text)
+    return written
@@ -131,6 +131,7 @@ $(function() {
             });
         }
         sunburst(createSunburstData(data));
+        showTimings(data.timings);
     });
 
 
@@ -143,6 +144,44 @@ $(function() {
         return data.size || 0;
     }
 
+    // Groups the asset files by collection with the meshes of each
+    // collection and the size of their attributes below
+    function createAssetData(data) {
+        var collections = {};
+        var result = [];
+        data.assets.forEach(function(asset) {
+            var name = asset.collection || asset.name;
+            if (!collections[name]) {
+                collections[name] = { name: name, size: 0, children: [] };
+                result.push(collections[name]);
+            }
+            collections[name].size += asset.size;
+        });
+        (data.meshes || []).forEach(function(mesh) {
+            var collection = collections[mesh.collection];
+            if (!collection || !mesh.bytes) {
+                return;
+            }
+            var instances = mesh.instances.length ? ", " + (mesh.instances.length + 1) + " instances" : "";
+            collection.children.push({
+                name: mesh.object + " (" + mesh.triangles + " triangles" + instances + ")",
+                size: mesh.size,
+                children: Object.keys(mesh.bytes).map(function(attribute) {
+                    return { name: attribute, size: mesh.bytes[attribute] };
+                })
+            });
+        });
+        result.forEach(function(collection) {
+            var rest = collection.size - accumulateSize(collection.children);
+            if (!collection.children.length) {
+                delete collection.children;
+            } else if (rest > 0) {
+                collection.children.push({ name: "other", size: rest });
+            }
+        });
+        return result;
+    }
+
     function createSunburstData(data) {
         var assetSize = accumulateSize(data.assets);
         var textureSize = accumulateSize(data.textures);
@@ -153,7 +192,7 @@ $(function() {
             size: data.scene.size + assetSize + textureSize + materialSize + animationSize,
             children: [
 		        { name: "scene", size: data.scene.size, children: [] },
-                { name: "assets", size: assetSize, children: data.assets},
+                { name: "assets", size: assetSize, children: createAssetData(data)},
                 { name: "textures", size: textureSize, children: data.textures},
                 { name: "materials", size: materialSize, children: data.materials},
                 { name: "animations", size: animationSize, children: data.armatures}
@@ -163,12 +202,50 @@ $(function() {
 
     }
 
+    function showTimings(phases) {
+        if (!phases || !phases.length) {
+            return;
+        }
+        var total = phases.reduce(function(prev, curr) {
+            return prev + curr.time;
+        }, 0);
+        var body = $("<tbody></tbody>");
+
+        function addRows(phases, depth) {
+            phases.forEach(function(phase) {
+                var row = $("<tr></tr>");
+                row.append($("<td></td>").css("padding-left", (depth + 0.5) + "em").text(phase.name));
+                row.append($("<td></td>").text(phase.count));
+                row.append($("<td></td>").text((phase.time * 1000).toFixed(1) + " ms"));
+                row.append($("<td></td>").text((total ? phase.time * 100 / total : 0).toFixed(1) + " %"));
+                body.append(row);
+                addRows(phase.children, depth + 1);
+            });
+        }
+        addRows(phases, 0);
+
+        var table = $("<table class='timings'><thead><tr><th>Phase</th><th>Calls</th><th>Time</th><th>Share</th></tr></thead></table>");
+        table.append(body);
+        $(".timingsTarget").append("<h5>Export time: " + total.toFixed(2) + " s</h5>").append(table);
+    }
+
     var xml3d = document.querySelector("xml3d");
 
     xml3d.addEventListener("load", function () {
         $("span.fa-spin").removeClass("fa-spin fa-circle-o-notch").addClass("fa-check");
     });
 
+    // Bytes of the asset files loaded, reported by common/scripts/progressive-loading.js
+    var loadProgress = $(".loadProgress");
+    xml3d.addEventListener("assetprogress", function (e) {
+        var total = e.detail.total;
+        if (!total || e.detail.loaded >= total) {
+            loadProgress.text("");
+            return;
+        }
+        loadProgress.text(Math.floor(e.detail.loaded * 100 / total) + "% of " + (total / 1048576).toFixed(1) + " MB");
+    });
+
     var lastAnimation = window.performance.now();
 
     var renderStream = Kefir.fromEvent(xml3d, 'framedrawn', function(e) { return e.detail; });
@@ -237,11 +314,15 @@ module.exports = function(root) {
 
     var partition = d3.layout.partition()
                             .sort(null)
-                            .size([2 * Math.PI, radius * radius])
                             .value(function (d) {
                                 return d.size;
                         });
 
+        // Angle and area scales, zoomed to the node the user clicked on
+        var x = d3.scale.linear().range([0, 2 * Math.PI]);
+        var y = d3.scale.sqrt().range([0, radius]);
+        var current = root;
+
         var groups = svg.datum(root).selectAll('g')
       .data(partition.nodes)
     .enter()
@@ -270,13 +351,13 @@ module.exports = function(root) {
     .style('text-anchor', 'middle');
 
         var arc = d3.svg.arc().startAngle(function (d) {
-            return d.x;
+            return Math.max(0, Math.min(2 * Math.PI, x(d.x)));
         }).endAngle(function (d) {
-            return d.x + d.dx;
+            return Math.max(0, Math.min(2 * Math.PI, x(d.x + d.dx)));
         }).innerRadius(function (d) {
-            return Math.sqrt(d.y);
+            return Math.max(0, y(d.y));
         }).outerRadius(function (d) {
-            return Math.sqrt(d.y + d.dy * 0.75);
+            return Math.max(0, y(d.y + d.dy * 0.75));
         });
 
             var path = groups.append("path").attr("display", function (d) {
@@ -292,9 +373,19 @@ module.exports = function(root) {
     size.text(pretty(d.size))
   }).on('mouseout', function(d) {
     //unhighlight(d)
-    title.text(root.name)
-    size.text(pretty(root.size))
+    title.text(current.name)
+    size.text(pretty(current.value))
+  }).on('click', function(d) {
+    // Drill into a node, clicking the innermost ring goes back up
+    zoom(d === current && d.parent ? d.parent : d);
   })
+
+        function zoom(d) {
+            current = d;
+            title.text(d.name);
+            size.text(pretty(d.value));
+            path.transition().duration(750).attrTween("d", arcTweenZoom(d));
+        }
             d3.selectAll("input").on("change", function change() {
                 var value = this.value === "count" ? function () {
                     return 1;
@@ -311,6 +402,22 @@ module.exports = function(root) {
             d.dx0 = d.dx;
         }
 
+        // Interpolate the scales from the current node to node d.
+        function arcTweenZoom(d) {
+            var xd = d3.interpolate(x.domain(), [d.x, d.x + d.dx]),
+                yd = d3.interpolate(y.domain(), [d.y, 1]),
+                yr = d3.interpolate(y.range(), [d.depth ? 20 : 0, radius]);
+            return function (node, i) {
+                return i ? function () {
+                    return arc(node);
+                } : function (t) {
+                    x.domain(xd(t));
+                    y.domain(yd(t)).range(yr(t));
+                    return arc(node);
+                };
+            };
+        }
+
         // Interpolate the arcs in data space.
         function arcTween(a) {
             var i = d3.interpolate({x: a.x0, dx: a.dx0}, a);
@@ -0,0 +1,39 @@
+"""Nested wall clock timers for the phases of an export."""
+import time
+from contextlib import contextmanager
+
+
+class Timer:
+    """Accumulates the time spent in nested, named phases.
+
+    Phases entered several times within the same parent phase, e.g. once
+    per object, are recorded once with the total time and a count. A phase
+    entered again from within itself is timed by its outermost call.
+    """
+    def __init__(self):
+        self.phases = []
+        self._stack = [{"name": None, "children": self.phases}]
+
+    @contextmanager
+    def phase(self, name):
+        parent = self._stack[-1]
+        if parent["name"] == name:
+            parent["count"] += 1
+            yield
+            return
+
+        for node in parent["children"]:
+            if node["name"] == name:
+                break
+        else:
+            node = {"name": name, "time": 0.0, "count": 0, "children": []}
+            parent["children"].append(node)
+
+        node["count"] += 1
+        self._stack.append(node)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            node["time"] += time.perf_counter() - start
+            self._stack.pop()
@@ -1,6 +1,11 @@
+import sys
 from xml.sax.saxutils import quoteattr
 
 
+def escape(data):
+    return data.replace("&", "&amp;").replace("<", "&lt;").replace("\"", "&quot;").replace(">", "&gt;")
+
+
 class XMLWriter:
     """ An very simpe XML writer """
     def __init__(self, stream, ident=0):
@@ -55,3 +60,70 @@ class XMLWriter:
     def element(self, _name, **attr):
         self.start_element(_name, **attr)
         self.end_element(_name)
+
+
+class DocumentWriter:
+    """Streams an XML document in the layout of minidom's writexml.
+
+    Elements are written as soon as they are started, so only the text of
+    the current element is kept in memory. An element holding text only is
+    written on a single line, an element without content as empty element.
+    """
+    def __init__(self, stream, addindent="  ", newl="\n"):
+        self._stream = stream
+        self._addindent = addindent
+        self._newl = newl
+        self._open = []
+        self._pending = False
+        self._has_text = False
+        # characters written so far
+        self.size = 0
+
+    def _emit(self, text):
+        self.size += len(text)
+        self._stream.write(text)
+
+    def start_document(self, encoding="UTF-8"):
+        self._emit('<?xml version="1.0" encoding="%s"?>%s' % (encoding, self._newl))
+
+    def start_element(self, name, attributes=()):
+        if self._pending:
+            self._emit(">" + self._newl)
+            self._pending = False
+        self._emit(len(self._open) * self._addindent + "<" + name)
+        # minidom sorts attributes by name before Python 3.8
+        if sys.version_info < (3, 8):
+            attributes = sorted(attributes)
+        for key, value in attributes:
+            self._emit(' %s="%s"' % (key, escape(value)))
+        self._open.append(name)
+        self._pending = True
+        self._has_text = False
+
+    def end_element(self):
+        name = self._open.pop()
+        if self._pending:
+            self._emit("/>" + self._newl)
+        elif self._has_text:
+            self._emit("</%s>%s" % (name, self._newl))
+        else:
+            self._emit("%s</%s>%s" % (len(self._open) * self._addindent, name, self._newl))
+        self._pending = False
+        self._has_text = False
+
+    def element(self, name, attributes=()):
+        self.start_element(name, attributes)
+        self.end_element()
+
+    def characters(self, text):
+        self.write(escape(text))
+
+    def write(self, text):
+        """Writes text content that needs no escaping"""
+        if not text:
+            return
+        if self._pending:
+            self._emit(">")
+            self._pending = False
+        self._has_text = True
+        self._emit(text)
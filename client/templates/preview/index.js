@@ -130,6 +130,7 @@ $(function() {
             });
         }
         sunburst(createSunburstData(data));
+        showTimings(data.timings);
     });
 
 
@@ -142,6 +143,44 @@ $(function() {
         return data.size || 0;
     }
 
+    // Groups the asset files by collection with the meshes of each
+    // collection and the size of their attributes below
+    function createAssetData(data) {
+        var collections = {};
+        var result = [];
+        data.assets.forEach(function(asset) {
+            var name = asset.collection || asset.name;
+            if (!collections[name]) {
+                collections[name] = { name: name, size: 0, children: [] };
+                result.push(collections[name]);
+            }
+            collections[name].size += asset.size;
+        });
+        (data.meshes || []).forEach(function(mesh) {
+            var collection = collections[mesh.collection];
+            if (!collection || !mesh.bytes) {
+                return;
+            }
+            var instances = mesh.instances.length ? ", " + (mesh.instances.length + 1) + " instances" : "";
+            collection.children.push({
+                name: mesh.object + " (" + mesh.triangles + " triangles" + instances + ")",
+                size: mesh.size,
+                children: Object.keys(mesh.bytes).map(function(attribute) {
+                    return { name: attribute, size: mesh.bytes[attribute] };
+                })
+            });
+        });
+        result.forEach(function(collection) {
+            var rest = collection.size - accumulateSize(collection.children);
+            if (!collection.children.length) {
+                delete collection.children;
+            } else if (rest > 0) {
+                collection.children.push({ name: "other", size: rest });
+            }
+        });
+        return result;
+    }
+
     function createSunburstData(data) {
         var assetSize = accumulateSize(data.assets);
         var textureSize = accumulateSize(data.textures);
@@ -152,7 +191,7 @@ $(function() {
             size: data.scene.size + assetSize + textureSize + materialSize + animationSize,
             children: [
 		        { name: "scene", size: data.scene.size, children: [] },
-                { name: "assets", size: assetSize, children: data.assets},
+                { name: "assets", size: assetSize, children: createAssetData(data)},
                 { name: "textures", size: textureSize, children: data.textures},
                 { name: "materials", size: materialSize, children: data.materials},
                 { name: "animations", size: animationSize, children: data.armatures}
@@ -162,12 +201,50 @@ $(function() {
 
     }
 
+    function showTimings(phases) {
+        if (!phases || !phases.length) {
+            return;
+        }
+        var total = phases.reduce(function(prev, curr) {
+            return prev + curr.time;
+        }, 0);
+        var body = $("<tbody></tbody>");
+
+        function addRows(phases, depth) {
+            phases.forEach(function(phase) {
+                var row = $("<tr></tr>");
+                row.append($("<td></td>").css("padding-left", (depth + 0.5) + "em").text(phase.name));
+                row.append($("<td></td>").text(phase.count));
+                row.append($("<td></td>").text((phase.time * 1000).toFixed(1) + " ms"));
+                row.append($("<td></td>").text((total ? phase.time * 100 / total : 0).toFixed(1) + " %"));
+                body.append(row);
+                addRows(phase.children, depth + 1);
+            });
+        }
+        addRows(phases, 0);
+
+        var table = $("<table class='timings'><thead><tr><th>Phase</th><th>Calls</th><th>Time</th><th>Share</th></tr></thead></table>");
+        table.append(body);
+        $(".timingsTarget").append("<h5>Export time: " + total.toFixed(2) + " s</h5>").append(table);
+    }
+
     var xml3d = document.querySelector("xml3d");
 
     xml3d.addEventListener("load", function () {
         $("span.fa-spin").removeClass("fa-spin fa-circle-o-notch").addClass("fa-check");
     });
 
+    // Bytes of the asset files loaded, reported by common/scripts/progressive-loading.js
+    var loadProgress = $(".loadProgress");
+    xml3d.addEventListener("assetprogress", function (e) {
+        var total = e.detail.total;
+        if (!total || e.detail.loaded >= total) {
+            loadProgress.text("");
+            return;
+        }
+        loadProgress.text(Math.floor(e.detail.loaded * 100 / total) + "% of " + (total / 1048576).toFixed(1) + " MB");
+    });
+
     var lastAnimation = window.performance.now();
 
     var renderStream = Kefir.fromEvent(xml3d, 'framedrawn', function(e) { return e.detail; });
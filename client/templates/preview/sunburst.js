@@ -24,11 +24,15 @@ module.exports = function(root) {
 
     var partition = d3.layout.partition()
                             .sort(null)
-                            .size([2 * Math.PI, radius * radius])
                             .value(function (d) {
                                 return d.size;
                         });
 
+        // Angle and area scales, zoomed to the node the user clicked on
+        var x = d3.scale.linear().range([0, 2 * Math.PI]);
+        var y = d3.scale.sqrt().range([0, radius]);
+        var current = root;
+
         var groups = svg.datum(root).selectAll('g')
       .data(partition.nodes)
     .enter()
@@ -57,13 +61,13 @@ module.exports = function(root) {
     .style('text-anchor', 'middle');
 
         var arc = d3.svg.arc().startAngle(function (d) {
-            return d.x;
+            return Math.max(0, Math.min(2 * Math.PI, x(d.x)));
         }).endAngle(function (d) {
-            return d.x + d.dx;
+            return Math.max(0, Math.min(2 * Math.PI, x(d.x + d.dx)));
         }).innerRadius(function (d) {
-            return Math.sqrt(d.y);
+            return Math.max(0, y(d.y));
         }).outerRadius(function (d) {
-            return Math.sqrt(d.y + d.dy * 0.75);
+            return Math.max(0, y(d.y + d.dy * 0.75));
         });
 
             var path = groups.append("path").attr("display", function (d) {
@@ -79,9 +83,19 @@ module.exports = function(root) {
     size.text(pretty(d.size))
   }).on('mouseout', function(d) {
     //unhighlight(d)
-    title.text(root.name)
-    size.text(pretty(root.size))
+    title.text(current.name)
+    size.text(pretty(current.value))
+  }).on('click', function(d) {
+    // Drill into a node, clicking the innermost ring goes back up
+    zoom(d === current && d.parent ? d.parent : d);
   })
+
+        function zoom(d) {
+            current = d;
+            title.text(d.name);
+            size.text(pretty(d.value));
+            path.transition().duration(750).attrTween("d", arcTweenZoom(d));
+        }
             d3.selectAll("input").on("change", function change() {
                 var value = this.value === "count" ? function () {
                     return 1;
@@ -98,6 +112,22 @@ module.exports = function(root) {
             d.dx0 = d.dx;
         }
 
+        // Interpolate the scales from the current node to node d.
+        function arcTweenZoom(d) {
+            var xd = d3.interpolate(x.domain(), [d.x, d.x + d.dx]),
+                yd = d3.interpolate(y.domain(), [d.y, 1]),
+                yr = d3.interpolate(y.range(), [d.depth ? 20 : 0, radius]);
+            return function (node, i) {
+                return i ? function () {
+                    return arc(node);
+                } : function (t) {
+                    x.domain(xd(t));
+                    y.domain(yd(t)).range(yr(t));
+                    return arc(node);
+                };
+            };
+        }
+
         // Interpolate the arcs in data space.
         function arcTween(a) {
             var i = d3.interpolate({x: a.x0, dx: a.dx0}, a);
@@ -0,0 +1,261 @@
+"""Headless benchmarks of the XML3D exporter.
+
+Runs the exporter outside of Blender on a procedural scene built with the
+pure Python stand-ins for ``bpy``, ``bpy_extras`` and ``mathutils`` in
+``standin``. Times the mesh conversion in ``meshtools``, writing data
+entries with ``data.write_generic_entry`` and ``xml_writer.XMLWriter``,
+PNG encoding with ``png.Writer``, converting and encoding images with
+``export_image`` and full exports, and reports throughput in triangles/s
+and MB/s:
+
+    python test/benchmark/headless.py [--meshes 8] [--triangles 5000] [--save label]
+
+Results saved with ``--save`` are written to ``test/data/benchmark`` and
+later runs are compared against ``--baseline`` (default: ``baseline``).
+Timings of the stand-in ``bpy`` are not those of Blender: compare results
+of the same machine and Python version only. Record the baseline with the
+Python that ships with Blender, e.g. for Blender 2.71:
+
+    2.71/python/bin/python3.4 test/benchmark/headless.py --save baseline
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULT_DIR = os.path.join(BENCHMARK_DIR, "..", "data", "benchmark")
+
+sys.path[:0] = [os.path.join(BENCHMARK_DIR, "standin"), BENCHMARK_DIR,
+                os.path.join(BENCHMARK_DIR, "..", "..", "addons")]
+
+import bpy  # noqa: E402
+from bpy.props import _Property  # noqa: E402
+import scene as scene_generator  # noqa: E402
+import io_scene_xml3d  # noqa: E402
+from io_scene_xml3d import export_image, export_xml3d, meshtools, png, tools  # noqa: E402
+from io_scene_xml3d.context import Context  # noqa: E402
+from io_scene_xml3d.data import write_generic_entry  # noqa: E402
+from io_scene_xml3d.xml_writer import DocumentWriter, XMLWriter  # noqa: E402
+
+MB = 1024.0 * 1024.0
+
+
+def default_options(**overrides):
+    """Defaults of the export operator's properties, as Blender passes them to save()"""
+    options = {name: prop.default for name, prop in vars(io_scene_xml3d.ExportXML3D).items()
+               if isinstance(prop, _Property)}
+    del options["filter_glob"]
+    options.update(overrides)
+    return options
+
+
+def triangle_count(mesh):
+    return sum(len(face.vertices) - 2 for face in mesh.tessfaces)
+
+
+def measure(function, repeat):
+    """Returns the fastest of `repeat` runs of `function` and its last result"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_meshtools(meshes, context, repeat):
+    def convert():
+        return [meshtools.get_vertex_attributes(mesh, meshtools.export_tessfaces(mesh, None, context)[0])
+                for mesh in meshes]
+
+    elapsed, contents = measure(convert, repeat)
+    triangles = sum(triangle_count(mesh) for mesh in meshes)
+    return {"time": elapsed, "triangles_per_s": triangles / elapsed}, contents
+
+
+def bench_write_generic_entry(contents, repeat):
+    def write():
+        stream = io.StringIO()
+        writer = DocumentWriter(stream)
+        writer.start_element("data")
+        for content in contents:
+            for entry in content:
+                write_generic_entry(writer, entry)
+        writer.end_element()
+        return len(stream.getvalue())
+
+    elapsed, size = measure(write, repeat)
+    return {"time": elapsed, "mb_per_s": size / MB / elapsed}
+
+
+def bench_xml_writer(objects, repeat):
+    def write():
+        # A scene graph like the one the exporter writes into the HTML page
+        stream = io.StringIO()
+        writer = XMLWriter(stream, 2)
+        writer.start_element("xml3d", id="Scene")
+        for obj in objects:
+            writer.start_element("group", id=obj.name)
+            writer.attribute("class", "layer-0")
+            writer.attribute("style", "transform:" + tools.matrix_to_ccs_matrix3d(obj.matrix_world) + ";")
+            writer.start_element("model", src="resources/asset-%s.xml#%s" % (obj.name, obj.name))
+            writer.element("float", name="shininess", _content="0.5000")
+            writer.end_element("model")
+            writer.end_element("group")
+        writer.end_element("xml3d")
+        return len(stream.getvalue())
+
+    elapsed, size = measure(write, repeat)
+    return {"time": elapsed, "mb_per_s": size / MB / elapsed}
+
+
+def bench_png_writer(images, repeat):
+    rows = []
+    for image in images:
+        width, height = image.size
+        # Rows as the exporter passes them to png.Writer
+        rows.append((width, height, list(export_image.image_rows(image))))
+
+    def encode():
+        for width, height, pixels in rows:
+            png.Writer(width, height, alpha=True).write_packed(io.BytesIO(), pixels)
+
+    elapsed, _ = measure(encode, repeat)
+    size = sum(4 * width * height for width, height, _ in rows)
+    return {"time": elapsed, "mb_per_s": size / MB / elapsed}
+
+
+def bench_image_conversion(images, options, repeat):
+    def convert():
+        for image in images:
+            width, height = image.size
+            export_image.png_writer(width, height, options).write_packed(io.BytesIO(), export_image.image_rows(image))
+
+    elapsed, _ = measure(convert, repeat)
+    size = sum(4 * image.size[0] * image.size[1] for image in images)
+    return {"time": elapsed, "mb_per_s": size / MB / elapsed}
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+def bench_export(args, output_dir, repeat, **overrides):
+    context = create_scene(args)
+
+    def export():
+        shutil.rmtree(output_dir, ignore_errors=True)
+        os.makedirs(output_dir)
+        export_xml3d.save(None, context, default_options(filepath=os.path.join(output_dir, "index.html"), **overrides))
+
+    elapsed, _ = measure(export, repeat)
+    triangles = sum(triangle_count(mesh) for mesh in bpy.data.meshes)
+    size = directory_size(output_dir)
+    return {"time": elapsed, "triangles_per_s": triangles / elapsed, "mb_per_s": size / MB / elapsed, "size": size}
+
+
+def create_scene(args):
+    return scene_generator.create_scene(args.meshes, args.triangles, image_size=args.image_size, armatures=args.armatures)
+
+
+def run(args):
+    results = OrderedDict()
+    create_scene(args)
+    meshes = list(bpy.data.meshes)
+    context = Context(tempfile.gettempdir(), None, default_options())
+
+    results["meshtools"], contents = bench_meshtools(meshes, context, args.repeat)
+    results["data.write_generic_entry"] = bench_write_generic_entry(contents, args.repeat)
+    # Enough objects to give a measurable time
+    objects = list(bpy.data.objects) * 1000
+    results["xml_writer.XMLWriter"] = bench_xml_writer(objects, args.repeat)
+    results["png.Writer"] = bench_png_writer(list(bpy.data.images), args.repeat)
+    results["export_image"] = bench_image_conversion(list(bpy.data.images), context.options, args.repeat)
+
+    output_dir = tempfile.mkdtemp(prefix="xml3d-benchmark-")
+    try:
+        results["export"] = bench_export(args, output_dir, args.repeat)
+        results["export binary"] = bench_export(args, output_dir, args.repeat, mesh_binary_buffers=True)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    return results
+
+
+def result_path(label):
+    return os.path.join(RESULT_DIR, label + ".json")
+
+
+def load_result(label):
+    try:
+        with open(result_path(label), "r") as result_file:
+            return json.load(result_file)
+    except OSError:
+        return None
+
+
+def report(results, baseline=None):
+    previous = baseline["results"] if baseline else {}
+    for name, result in results.items():
+        line = "%-26s %8.3f s" % (name, result["time"])
+        if "triangles_per_s" in result:
+            line += " %12.0f triangles/s" % result["triangles_per_s"]
+        if "mb_per_s" in result:
+            line += " %8.2f MB/s" % result["mb_per_s"]
+        if name in previous:
+            line += "   %+6.1f%%" % (100.0 * (previous[name]["time"] / result["time"] - 1.0))
+        print(line)
+    if baseline:
+        print("Speed-up relative to '%s' (%s)" % (baseline["label"], baseline["date"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--meshes", type=int, default=8)
+    parser.add_argument("--triangles", type=int, default=5000, help="triangles per mesh")
+    parser.add_argument("--image-size", type=int, default=128)
+    parser.add_argument("--armatures", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark, the fastest is reported")
+    parser.add_argument("--save", metavar="LABEL", help="save the results to test/data/benchmark/LABEL.json")
+    parser.add_argument("--baseline", metavar="LABEL", default="baseline", help="results to compare with")
+    args = parser.parse_args()
+
+    print("%d meshes of %d triangles, %dx%d images, Python %s, numpy %s" % (
+        args.meshes, args.triangles, args.image_size, args.image_size, platform.python_version(),
+        "enabled" if meshtools.NUMPY_ENGINE else "not available"))
+    results = run(args)
+    baseline = load_result(args.baseline)
+    if baseline is not None and baseline["parameters"] != parameters(args):
+        print("Not comparing with '%s': different parameters" % args.baseline)
+        baseline = None
+    elif baseline is not None and baseline["python"] != platform.python_version():
+        print("Not comparing with '%s': recorded with Python %s" % (args.baseline, baseline["python"]))
+        baseline = None
+    report(results, baseline)
+
+    if args.save:
+        os.makedirs(RESULT_DIR, exist_ok=True)
+        with open(result_path(args.save), "w") as result_file:
+            json.dump({
+                "label": args.save,
+                "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "python": platform.python_version(),
+                "numpy": meshtools.NUMPY_ENGINE,
+                "parameters": parameters(args),
+                "results": results
+            }, result_file, indent=2, sort_keys=True)
+
+
+def parameters(args):
+    return {name: getattr(args, name) for name in ("meshes", "triangles", "image_size", "armatures")}
+
+
+if __name__ == "__main__":
+    main()
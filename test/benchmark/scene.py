@@ -0,0 +1,155 @@
+"""Procedural scene generator for the headless benchmarks.
+
+Builds a scene of ``mesh_count`` grid meshes of roughly ``triangles`` triangles
+each using the stand-in ``bpy`` types. Meshes carry UVs, several materials,
+optional image textures and optional armatures with vertex groups.
+"""
+import math
+import random
+
+import bpy
+import mathutils
+from bpy import types
+
+
+def _grid_mesh(name, triangles, materials, rng, with_uv=True, groups=None):
+    mesh = types.Mesh(name)
+    quads = max(1, triangles // 2)
+    columns = max(1, int(math.sqrt(quads)))
+    rows = max(1, quads // columns)
+
+    for y in range(rows + 1):
+        for x in range(columns + 1):
+            z = 0.1 * math.sin(x * 0.3) * math.cos(y * 0.2)
+            vertex_groups = []
+            if groups:
+                bone = min(len(groups) - 1, x * len(groups) // (columns + 1))
+                vertex_groups.append(types.VertexGroupElement(bone, 0.75))
+                vertex_groups.append(types.VertexGroupElement((bone + 1) % len(groups), 0.25))
+            vertex = types.MeshVertex(len(mesh.vertices), (x / columns, y / rows, z), (0.0, -0.1 * z, 1.0), vertex_groups)
+            mesh.vertices.append(vertex)
+
+    uv_faces = []
+    for y in range(rows):
+        for x in range(columns):
+            a = y * (columns + 1) + x
+            b, c, d = a + 1, a + columns + 2, a + columns + 1
+            uv = [(x / columns, y / rows), ((x + 1) / columns, y / rows),
+                  ((x + 1) / columns, (y + 1) / rows), (x / columns, (y + 1) / rows)]
+            material_index = (x * len(materials)) // columns if materials else 0
+            smooth = (x + y) % 3 != 0
+            if (x + y) % 5 == 0:
+                # Mix in triangles to exercise both tessface layouts
+                mesh.tessfaces.append(types.MeshTessFace(len(mesh.tessfaces), (a, b, c), (0.0, 0.0, 1.0), smooth, material_index))
+                uv_faces.append(types.MeshTextureFace(uv[:3]))
+                mesh.tessfaces.append(types.MeshTessFace(len(mesh.tessfaces), (c, d, a), (0.0, 0.0, 1.0), smooth, material_index))
+                uv_faces.append(types.MeshTextureFace([uv[2], uv[3], uv[0]]))
+            else:
+                mesh.tessfaces.append(types.MeshTessFace(len(mesh.tessfaces), (a, b, c, d), (0.0, 0.0, 1.0), smooth, material_index))
+                uv_faces.append(types.MeshTextureFace(uv))
+
+    if with_uv:
+        mesh.tessface_uv_textures.append(types.MeshTextureFaceLayer("UVMap", uv_faces))
+    mesh.materials.extend(materials)
+    return mesh
+
+
+def _image(name, size, rng):
+    pixels = []
+    for y in range(size):
+        for x in range(size):
+            pixels += [x / size, y / size, rng.random(), 1.0]
+    image = types.Image(name, size, size, pixels)
+    # Generated pixels that were never saved to a file
+    image.is_dirty = True
+    bpy.data.images.append(image)
+    return image
+
+
+def _material(name, image=None):
+    material = types.Material(name)
+    if image is not None:
+        material.texture_slots = [types.TextureSlot(types.Texture(name + "-tex", image))]
+        material.use_textures = [True]
+    bpy.data.materials.append(material)
+    return material
+
+
+def _armature(name, bone_count, scene):
+    bones = []
+    for i in range(bone_count):
+        bone = types.Bone("%s-bone%d" % (name, i), mathutils.Matrix.Translation((i / bone_count, 0.0, 0.0)),
+                          bones[-1] if bones else None)
+        bones.append(bone)
+    pose_bones = []
+    for bone in bones:
+        pose_bones.append(types.PoseBone(bone, pose_bones[-1] if pose_bones else None))
+
+    armature = types.Armature(name, bones)
+    obj = types.Object(name, "ARMATURE", armature)
+    obj.pose = types.Pose(pose_bones)
+    fcurves = []
+    for bone in bones:
+        for i in range(4):
+            path = 'pose.bones["%s"].rotation_quaternion' % bone.name
+            fcurves.append(types.FCurve(path, i, [(1.0, 1.0 if i == 0 else 0.0), (24.0, 0.9 if i == 0 else 0.1)]))
+    action = types.Action(name + "-action", fcurves)
+    obj.animation_data = types.AnimData(action)
+    bpy.data.armatures.append(armature)
+    bpy.data.actions.append(action)
+    scene.objects.append(obj)
+    return obj
+
+
+def create_scene(mesh_count=4, triangles=2000, material_count=2, image_size=64, armatures=1, shared=0, seed=1):
+    """Create a new stand-in scene and return a stand-in ``bpy.context``.
+
+    `shared` meshes re-use the data block of the previous mesh object like
+    linked duplicates (Alt+D) do in Blender.
+    """
+    rng = random.Random(seed)
+    bpy.data.reset()
+    scene = types.Scene("Scene")
+
+    camera = types.Object("Camera", "CAMERA")
+    camera.matrix_basis = mathutils.Matrix.Translation((0.0, -5.0, 2.0))
+    scene.objects.append(camera)
+    scene.camera = camera
+
+    lamp = types.ID("Lamp")
+    lamp.type = "POINT"
+    lamp.color = (1.0, 1.0, 1.0)
+    lamp.energy = 1.0
+    lamp.falloff_type = "CONSTANT"
+    lamp.distance = 25.0
+    bpy.data.lamps.append(lamp)
+    lamp_object = types.Object("Lamp", "LAMP", lamp)
+    scene.objects.append(lamp_object)
+
+    materials = []
+    for i in range(material_count):
+        image = _image("image-%d" % i, image_size, rng) if image_size else None
+        materials.append(_material("material-%d" % i, image))
+
+    armature_objects = [_armature("armature-%d" % i, 4, scene) for i in range(armatures)]
+
+    previous = None
+    for i in range(mesh_count):
+        armature_object = armature_objects[i % len(armature_objects)] if armature_objects and i % 2 else None
+        groups = [bone.name for bone in armature_object.data.bones] if armature_object else None
+        if previous is not None and i <= shared:
+            mesh = previous.data
+        else:
+            mesh = _grid_mesh("mesh-%d" % i, triangles, materials, rng, groups=groups)
+            bpy.data.meshes.append(mesh)
+        obj = types.Object("object-%d" % i, "MESH", mesh)
+        obj.matrix_basis = mathutils.Matrix.Translation((1.5 * (i % 10), 1.5 * (i // 10), 0.0))
+        obj.layers = [j == i % 3 for j in range(20)]
+        if armature_object:
+            obj.modifiers.append(types.Modifier("Armature", "ARMATURE", object=armature_object))
+            obj.vertex_groups.extend(types.VertexGroup(j, name) for j, name in enumerate(groups))
+        scene.objects.append(obj)
+        bpy.data.objects.append(obj)
+        previous = obj
+
+    return types.Context(scene)
@@ -0,0 +1,63 @@
+"""Microbenchmark for the numeric serializer of the XML3D exporter.
+
+Compares the formatting of value elements before the serializer module was
+introduced with the serializer on million element buffers:
+
+    python test/benchmark/serialize.py [count]
+"""
+import io
+import os
+import random
+import sys
+import time
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "addons", "io_scene_xml3d"))
+
+import serializer  # noqa: E402
+
+
+def legacy_ints(value):
+    value_str = ""
+    for t in value:
+        length = len(t) if isinstance(t, tuple) else 1
+        fs = length * "%.d "
+        value_str += fs % t
+    return value_str
+
+
+def legacy_floats(value):
+    return " ".join(str(v) for v in value.tolist())
+
+
+def measure(label, function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+    size = result if isinstance(result, int) else len(result)
+    print("%-32s %8.3f s %12d chars" % (label, elapsed, size))
+    return result
+
+
+def main(count):
+    rng = random.Random(1)
+    positions = array('f', (rng.uniform(-10.0, 10.0) for _ in range(count)))
+    texcoords = array('f', ((i % 1024) / 1024.0 for i in range(count)))
+    indices = array('i', (rng.randrange(count // 3) for _ in range(count)))
+
+    print("%d values, numpy %s" % (count, "enabled" if serializer.numpy is not None else "not available"))
+    for name, values in (("positions", positions), ("texcoords", texcoords)):
+        measure(name + " legacy", legacy_floats, values)
+        text = measure(name + " shortest", serializer.format_values, values)
+        if array('f', map(float, text.split())) != values:
+            raise AssertionError("%s do not round-trip" % name)
+        measure(name + " precision 6", serializer.format_values, values, False, 6)
+        measure(name + " streamed", serializer.write_values, io.StringIO(), values)
+
+    measure("indices legacy", legacy_ints, indices)
+    measure("indices", serializer.format_values, indices, True)
+    measure("indices streamed", serializer.write_values, io.StringIO(), indices, True)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
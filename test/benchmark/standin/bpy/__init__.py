@@ -0,0 +1,25 @@
+"""Minimal pure Python stand-in for Blender's ``bpy`` module.
+
+Provides just enough of ``bpy.types``, ``bpy.props``, ``bpy.path``,
+``bpy.utils`` and ``bpy.data`` to import and run the XML3D exporter outside
+of Blender. ``bpy.data`` is filled by the procedural scene generator.
+"""
+from . import types, props, path, utils
+
+
+class _Data:
+    def __init__(self):
+        self.reset()
+
+    def reset(self, filepath=""):
+        self.filepath = filepath
+        self.objects = types.Collection()
+        self.meshes = types.Collection()
+        self.materials = types.Collection()
+        self.images = types.Collection()
+        self.lamps = types.Collection()
+        self.armatures = types.Collection()
+        self.actions = types.Collection()
+
+
+data = _Data()
@@ -0,0 +1,13 @@
+import os
+
+
+def abspath(path, start=None, library=None):
+    if path.startswith("//"):
+        from . import data
+        base = start or os.path.dirname(data.filepath)
+        return os.path.join(base, path[2:])
+    return path
+
+
+def display_name_from_filepath(path):
+    return os.path.splitext(os.path.basename(path))[0]
@@ -0,0 +1,24 @@
+class _Property:
+    def __init__(self, **kwargs):
+        self.default = kwargs.get("default")
+        self.options = kwargs
+
+
+def StringProperty(**kwargs):
+    return _Property(**kwargs)
+
+
+def BoolProperty(**kwargs):
+    return _Property(**kwargs)
+
+
+def EnumProperty(**kwargs):
+    return _Property(**kwargs)
+
+
+def IntProperty(**kwargs):
+    return _Property(**kwargs)
+
+
+def FloatProperty(**kwargs):
+    return _Property(**kwargs)
@@ -0,0 +1,411 @@
+import mathutils
+
+
+class Operator:
+    bl_idname = ""
+    bl_label = ""
+
+    def as_keywords(self, ignore=()):
+        return {k: v for k, v in vars(self).items() if k not in ignore}
+
+
+class Collection(list):
+    """List with the ``foreach_get`` / ``foreach_set`` bulk accessors of ``bpy_prop_collection``."""
+
+    def foreach_get(self, attr, seq):
+        values = []
+        for item in self:
+            value = getattr(item, attr)
+            if isinstance(value, (list, tuple, mathutils.Vector)):
+                values.extend(value)
+            else:
+                values.append(value)
+        if len(values) != len(seq):
+            raise RuntimeError("internal error setting the array")
+        try:
+            seq[:] = values
+        except TypeError:
+            # array.array only accepts slice assignment from another array
+            seq[:] = type(seq)(seq.typecode, values)
+
+    def foreach_set(self, attr, seq):
+        values = list(seq)
+        if not len(self):
+            return
+        width = len(values) // len(self)
+        for i, item in enumerate(self):
+            chunk = values[i * width:(i + 1) * width]
+            setattr(item, attr, chunk if width > 1 else chunk[0])
+
+    def get(self, key, default=None):
+        for item in self:
+            if item.name == key:
+                return item
+        return default
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            item = self.get(key)
+            if item is None:
+                raise KeyError(key)
+            return item
+        return list.__getitem__(self, key)
+
+
+class ID:
+    users = 1
+    library = None
+
+    def __init__(self, name):
+        self.name = name
+
+    def as_pointer(self):
+        return id(self)
+
+
+class VertexGroupElement:
+    def __init__(self, group, weight):
+        self.group = group
+        self.weight = weight
+
+
+class MeshVertex:
+    def __init__(self, index, co, normal, groups=None):
+        self.index = index
+        self.co = mathutils.Vector(co)
+        self.normal = mathutils.Vector(normal)
+        self.groups = groups or []
+
+
+class MeshTessFace:
+    def __init__(self, index, vertices, normal, use_smooth=False, material_index=0):
+        self.index = index
+        self.vertices = tuple(vertices)
+        self.normal = mathutils.Vector(normal)
+        self.use_smooth = use_smooth
+        self.material_index = material_index
+        self.loop_start = 0
+        self.loop_total = len(self.vertices)
+
+    @property
+    def vertices_raw(self):
+        return list(self.vertices) + [0] * (4 - len(self.vertices))
+
+
+class MeshTextureFace:
+    def __init__(self, uvs, image=None):
+        self.uv = [mathutils.Vector(uv) for uv in uvs]
+        self.image = image
+
+    @property
+    def uv_raw(self):
+        raw = [c for uv in self.uv for c in uv]
+        return raw + [0.0] * (8 - len(raw))
+
+
+class MeshLoop:
+    def __init__(self, vertex_index):
+        self.vertex_index = vertex_index
+
+
+class MeshUVLoop:
+    def __init__(self, uv):
+        self.uv = mathutils.Vector(uv)
+
+
+class MeshUVLoopLayer:
+    def __init__(self, name, data):
+        self.name = name
+        self.data = Collection(data)
+
+
+class MeshTexturePoly:
+    def __init__(self, image=None):
+        self.image = image
+
+
+class MeshTextureFaceLayer:
+    def __init__(self, name, data):
+        self.name = name
+        self.data = Collection(data)
+
+
+class Mesh(ID):
+    def __init__(self, name):
+        super().__init__(name)
+        self.vertices = Collection()
+        self.tessfaces = Collection()
+        self.tessface_uv_textures = Collection()
+        self.materials = Collection()
+        self.edges = Collection()
+        self.shape_keys = None
+        self.use_auto_smooth = False
+        self.auto_smooth_angle = 0.523599
+
+    # Polygons, loops and UV layers mirror the tessellated faces
+
+    @property
+    def polygons(self):
+        start = 0
+        for face in self.tessfaces:
+            face.loop_start = start
+            start += face.loop_total
+        return self.tessfaces
+
+    @property
+    def loops(self):
+        return Collection(MeshLoop(v) for face in self.tessfaces for v in face.vertices)
+
+    @property
+    def uv_layers(self):
+        return Collection(MeshUVLoopLayer(layer.name, [MeshUVLoop(uv) for face in layer.data for uv in face.uv])
+                          for layer in self.tessface_uv_textures)
+
+    @property
+    def uv_textures(self):
+        return Collection(MeshTextureFaceLayer(layer.name, [MeshTexturePoly(face.image) for face in layer.data])
+                          for layer in self.tessface_uv_textures)
+
+
+class VertexGroup:
+    def __init__(self, index, name):
+        self.index = index
+        self.name = name
+
+
+class Modifier:
+    def __init__(self, name, type, **settings):
+        self.name = name
+        self.type = type
+        self.show_render = True
+        self.__dict__.update(settings)
+
+
+class MaterialSlot:
+    def __init__(self, material, link="DATA"):
+        self.material = material
+        self.link = link
+
+
+class Object(ID):
+    def __init__(self, name, type, data=None):
+        super().__init__(name)
+        self.type = type
+        self.data = data
+        self.parent = None
+        self.matrix_basis = mathutils.Matrix.Identity(4)
+        self.matrix_parent_inverse = mathutils.Matrix.Identity(4)
+        self.layers = [i == 0 for i in range(20)]
+        self.modifiers = Collection()
+        self.vertex_groups = Collection()
+        self.material_slots = Collection()
+        self.rotation_mode = "XYZ"
+        self.dupli_type = "NONE"
+        self.pose = None
+        self.animation_data = None
+        self.show_only_shape_key = False
+        self._props = {}
+
+    def __contains__(self, key):
+        return key in self._props
+
+    def __getitem__(self, key):
+        return self._props[key]
+
+    @property
+    def matrix_world(self):
+        if self.parent is None:
+            return self.matrix_basis
+        return self.parent.matrix_world * self.matrix_parent_inverse * self.matrix_basis
+
+    @property
+    def location(self):
+        return self.matrix_basis.translation
+
+    @property
+    def scale(self):
+        return self.matrix_basis.decompose()[2]
+
+    @property
+    def rotation_axis_angle(self):
+        return [0.0, 0.0, 1.0, 0.0]
+
+    @property
+    def bound_box(self):
+        if self.type != "MESH" or not len(self.data.vertices):
+            return [[0.0, 0.0, 0.0]] * 8
+        lo = [min(v.co[i] for v in self.data.vertices) for i in range(3)]
+        hi = [max(v.co[i] for v in self.data.vertices) for i in range(3)]
+        return [[(hi if (c >> i) & 1 else lo)[i] for i in range(3)] for c in range(8)]
+
+    def to_mesh(self, scene, apply_modifiers, settings, calc_tessface=True, calc_undeformed=False):
+        if self.type != "MESH":
+            raise RuntimeError("Object does not have geometry data")
+        return self.data
+
+
+class Image(ID):
+    def __init__(self, name, width, height, pixels=None, file_format="TARGA", source="FILE"):
+        super().__init__(name)
+        self.size = (width, height)
+        self.pixels = pixels if pixels is not None else [0.0] * (width * height * 4)
+        self.file_format = file_format
+        self.source = source
+        self.filepath = ""
+        self.packed_file = None
+        self.is_dirty = False
+
+    @property
+    def has_data(self):
+        return 0 not in self.size
+
+
+class Texture(ID):
+    def __init__(self, name, image):
+        super().__init__(name)
+        self.type = "IMAGE"
+        self.image = image
+        self.extension = "REPEAT"
+
+
+class TextureSlot:
+    def __init__(self, texture):
+        self.name = texture.name
+        self.texture = texture
+        self.use_map_color_diffuse = True
+        self.diffuse_color_factor = 1.0
+        self.texture_coords = "UV"
+
+
+class Material(ID):
+    def __init__(self, name):
+        super().__init__(name)
+        self.diffuse_intensity = 0.8
+        self.diffuse_color = mathutils.Vector((0.8, 0.8, 0.8))
+        self.specular_intensity = 0.5
+        self.specular_color = mathutils.Vector((1.0, 1.0, 1.0))
+        self.specular_hardness = 50
+        self.ambient = 1.0
+        self.use_transparency = False
+        self.alpha = 1.0
+        self.use_face_texture = False
+        self.use_face_texture_alpha = False
+        self.texture_slots = []
+        self.use_textures = []
+
+
+class Color(mathutils.Vector):
+    @property
+    def v(self):
+        return max(self)
+
+
+class World(ID):
+    def __init__(self, name):
+        super().__init__(name)
+        self.ambient_color = Color((0.0, 0.0, 0.0))
+        self.horizon_color = Color((0.05, 0.05, 0.05))
+
+
+class Bone:
+    def __init__(self, name, matrix_local, parent=None):
+        self.name = name
+        self.matrix_local = matrix_local
+        self.parent = parent
+
+
+class PoseBone:
+    def __init__(self, bone, parent=None):
+        self.name = bone.name
+        self.bone = bone
+        self.matrix = bone.matrix_local
+        self.parent = parent
+
+
+class Pose:
+    def __init__(self, bones):
+        self.bones = Collection(bones)
+
+
+class Armature(ID):
+    def __init__(self, name, bones):
+        super().__init__(name)
+        self.bones = Collection(bones)
+
+
+class Keyframe:
+    def __init__(self, frame, value):
+        self.co = (frame, value)
+        self.handle_left = (frame, value)
+        self.handle_right = (frame, value)
+        self.interpolation = "LINEAR"
+
+
+class FCurve:
+    def __init__(self, data_path, array_index, keyframes):
+        self.data_path = data_path
+        self.array_index = array_index
+        self.keyframe_points = [Keyframe(f, v) for f, v in keyframes]
+        self.extrapolation = "CONSTANT"
+
+    def evaluate(self, frame):
+        points = self.keyframe_points
+        if frame <= points[0].co[0]:
+            return points[0].co[1]
+        for a, b in zip(points, points[1:]):
+            if a.co[0] <= frame <= b.co[0]:
+                t = (frame - a.co[0]) / (b.co[0] - a.co[0])
+                return a.co[1] + t * (b.co[1] - a.co[1])
+        return points[-1].co[1]
+
+
+class Action(ID):
+    def __init__(self, name, fcurves):
+        super().__init__(name)
+        self.fcurves = fcurves
+        frames = [k.co[0] for c in fcurves for k in c.keyframe_points] or [0.0]
+        self.frame_range = (min(frames), max(frames))
+
+
+class AnimData:
+    def __init__(self, action):
+        self.action = action
+
+
+class RenderSettings:
+    fps = 24
+
+
+class Scene(ID):
+    def __init__(self, name):
+        super().__init__(name)
+        self.objects = Collection()
+        self.camera = None
+        self.world = World("World")
+        self.layers = [i == 0 for i in range(20)]
+        self.render = RenderSettings()
+
+
+class WindowManager:
+    def progress_begin(self, start, end):
+        pass
+
+    def progress_update(self, value):
+        pass
+
+    def progress_end(self):
+        pass
+
+
+class Screen:
+    areas = []
+
+
+class Context:
+    def __init__(self, scene):
+        self.scene = scene
+        self.window_manager = WindowManager()
+        self.screen = Screen()
+
+
+INFO_MT_file_export = Collection()
@@ -0,0 +1,6 @@
+def register_module(name):
+    pass
+
+
+def unregister_module(name):
+    pass
@@ -0,0 +1,36 @@
+"""Stand-in for the parts of ``bpy_extras.io_utils`` used by the exporter."""
+import os
+import shutil
+
+
+class ExportHelper:
+    filepath = ""
+    check_existing = True
+
+
+def create_derived_objects(scene, ob):
+    if ob.parent and ob.parent.dupli_type in {'VERTS', 'FACES'}:
+        return False, None
+    return False, [(ob, ob.matrix_world)]
+
+
+def free_derived_objects(ob):
+    pass
+
+
+def path_reference(filepath, base_src, base_dst, mode='AUTO', copy_subdir="", copy_set=None, library=None):
+    filepath_abs = os.path.normpath(os.path.join(base_src, filepath))
+    subdir_abs = os.path.join(base_dst, copy_subdir)
+    filepath_cpy = os.path.join(subdir_abs, os.path.basename(filepath_abs))
+    if copy_set is not None:
+        copy_set.add((filepath_abs, filepath_cpy))
+    return os.path.join(copy_subdir, os.path.basename(filepath_abs))
+
+
+def path_reference_copy(copy_set, report=print):
+    for file_src, file_dst in copy_set:
+        if not os.path.exists(file_src):
+            report("missing %r, not copying" % file_src)
+        elif not (os.path.exists(file_dst) and os.path.samefile(file_src, file_dst)):
+            os.makedirs(os.path.dirname(file_dst), exist_ok=True)
+            shutil.copy(file_src, file_dst)
@@ -0,0 +1,226 @@
+"""Minimal pure Python stand-in for Blender's ``mathutils`` module.
+
+Only the subset used by the XML3D exporter is implemented. Values are kept
+as Python floats; Blender stores them as single precision.
+"""
+import math
+
+
+class Vector:
+    def __init__(self, values=(0.0, 0.0, 0.0)):
+        self._v = [float(v) for v in values]
+
+    @staticmethod
+    def Fill(size, fill=0.0):
+        return Vector([fill] * size)
+
+    def __len__(self):
+        return len(self._v)
+
+    def __iter__(self):
+        return iter(self._v)
+
+    def __getitem__(self, key):
+        return self._v[key]
+
+    def __setitem__(self, key, value):
+        self._v[key] = float(value)
+
+    def __eq__(self, other):
+        return isinstance(other, Vector) and self._v == other._v
+
+    def __hash__(self):
+        return hash(tuple(self._v))
+
+    def __mul__(self, other):
+        if isinstance(other, (int, float)):
+            return Vector([v * other for v in self._v])
+        return sum(a * b for a, b in zip(self._v, other))
+
+    __rmul__ = __mul__
+
+    def __imul__(self, other):
+        self._v = [v * other for v in self._v]
+        return self
+
+    def __add__(self, other):
+        return Vector([a + b for a, b in zip(self._v, other)])
+
+    def __sub__(self, other):
+        return Vector([a - b for a, b in zip(self._v, other)])
+
+    def __repr__(self):
+        return "Vector(%s)" % (tuple(self._v),)
+
+    @property
+    def length(self):
+        return math.sqrt(sum(v * v for v in self._v))
+
+    def normalized(self):
+        length = self.length
+        return Vector(self._v) if length == 0.0 else self * (1.0 / length)
+
+    def copy(self):
+        return Vector(self._v)
+
+    @property
+    def x(self):
+        return self._v[0]
+
+    @property
+    def y(self):
+        return self._v[1]
+
+    @property
+    def z(self):
+        return self._v[2]
+
+    @property
+    def yzwx(self):
+        return Vector((self._v[1], self._v[2], self._v[3], self._v[0]))
+
+
+class Quaternion:
+    def __init__(self, values=(1.0, 0.0, 0.0, 0.0)):
+        self._q = [float(v) for v in values]
+
+    def identity(self):
+        self._q = [1.0, 0.0, 0.0, 0.0]
+        return self
+
+    def __len__(self):
+        return 4
+
+    def __iter__(self):
+        return iter(self._q)
+
+    def __getitem__(self, key):
+        return self._q[key]
+
+    def __setitem__(self, key, value):
+        self._q[key] = float(value)
+
+    def __mul__(self, other):
+        w1, x1, y1, z1 = self._q
+        w2, x2, y2, z2 = other._q
+        return Quaternion((w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+                           w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+                           w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+                           w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2))
+
+    def to_matrix(self):
+        w, x, y, z = self._q
+        return Matrix(((1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w), 0.0),
+                       (2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w), 0.0),
+                       (2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y), 0.0),
+                       (0.0, 0.0, 0.0, 1.0)))
+
+
+class Matrix:
+    def __init__(self, rows=None):
+        if rows is None:
+            rows = [[1.0 if i == j else 0.0 for j in range(4)] for i in range(4)]
+        self._m = [[float(v) for v in row] for row in rows]
+
+    @staticmethod
+    def Identity(size):
+        return Matrix([[1.0 if i == j else 0.0 for j in range(size)] for i in range(size)])
+
+    @staticmethod
+    def Translation(vector):
+        m = Matrix.Identity(4)
+        for i in range(3):
+            m._m[i][3] = float(vector[i])
+        return m
+
+    @staticmethod
+    def Scale(factor, size):
+        m = Matrix.Identity(size)
+        for i in range(min(size, 3)):
+            m._m[i][i] = float(factor)
+        return m
+
+    def zero(self):
+        self._m = [[0.0] * len(row) for row in self._m]
+        return self
+
+    def copy(self):
+        return Matrix(self._m)
+
+    def __len__(self):
+        return len(self._m)
+
+    def __iter__(self):
+        return (Vector(row) for row in self._m)
+
+    def __getitem__(self, key):
+        return Vector(self._m[key])
+
+    def __eq__(self, other):
+        return isinstance(other, Matrix) and self._m == other._m
+
+    def __repr__(self):
+        return "Matrix(%s)" % (self._m,)
+
+    @property
+    def col(self):
+        return [Vector([row[j] for row in self._m]) for j in range(len(self._m[0]))]
+
+    @property
+    def translation(self):
+        return Vector([self._m[i][3] for i in range(3)])
+
+    def to_translation(self):
+        return self.translation
+
+    def transposed(self):
+        return Matrix([[self._m[j][i] for j in range(len(self._m))] for i in range(len(self._m[0]))])
+
+    def __mul__(self, other):
+        if isinstance(other, Matrix):
+            n = len(self._m)
+            return Matrix([[sum(self._m[i][k] * other._m[k][j] for k in range(n)) for j in range(n)] for i in range(n)])
+        values = list(other) + [1.0] * (4 - len(other))
+        result = [sum(self._m[i][k] * values[k] for k in range(4)) for i in range(4)]
+        return Vector(result[:len(other)])
+
+    def inverted(self):
+        n = len(self._m)
+        a = [row[:] + [1.0 if i == j else 0.0 for j in range(n)] for i, row in enumerate(self._m)]
+        for c in range(n):
+            pivot = max(range(c, n), key=lambda r: abs(a[r][c]))
+            if abs(a[pivot][c]) < 1e-12:
+                raise ValueError("matrix does not have an inverse")
+            a[c], a[pivot] = a[pivot], a[c]
+            p = a[c][c]
+            a[c] = [v / p for v in a[c]]
+            for r in range(n):
+                if r != c and a[r][c] != 0.0:
+                    f = a[r][c]
+                    a[r] = [v - f * w for v, w in zip(a[r], a[c])]
+        return Matrix([row[n:] for row in a])
+
+    def decompose(self):
+        loc = self.translation
+        cols = [Vector([self._m[i][j] for i in range(3)]) for j in range(3)]
+        scale = Vector([c.length for c in cols])
+        rot = Matrix.Identity(4)
+        for j in range(3):
+            for i in range(3):
+                rot._m[i][j] = cols[j][i] / scale[j] if scale[j] else 0.0
+        return loc, rot.to_quaternion(), scale
+
+    def to_quaternion(self):
+        m = self._m
+        trace = m[0][0] + m[1][1] + m[2][2]
+        if trace > 0:
+            s = 0.5 / math.sqrt(trace + 1.0)
+            return Quaternion((0.25 / s, (m[2][1] - m[1][2]) * s, (m[0][2] - m[2][0]) * s, (m[1][0] - m[0][1]) * s))
+        if m[0][0] > m[1][1] and m[0][0] > m[2][2]:
+            s = 2.0 * math.sqrt(1.0 + m[0][0] - m[1][1] - m[2][2])
+            return Quaternion(((m[2][1] - m[1][2]) / s, 0.25 * s, (m[0][1] + m[1][0]) / s, (m[0][2] + m[2][0]) / s))
+        if m[1][1] > m[2][2]:
+            s = 2.0 * math.sqrt(1.0 + m[1][1] - m[0][0] - m[2][2])
+            return Quaternion(((m[0][2] - m[2][0]) / s, (m[0][1] + m[1][0]) / s, 0.25 * s, (m[1][2] + m[2][1]) / s))
+        s = 2.0 * math.sqrt(1.0 + m[2][2] - m[0][0] - m[1][1])
+        return Quaternion(((m[1][0] - m[0][1]) / s, (m[0][2] + m[2][0]) / s, (m[1][2] + m[2][1]) / s, 0.25 * s))
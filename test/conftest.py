@@ -0,0 +1,10 @@
+"""Runs the tests outside of Blender with the stand-ins for ``bpy``,
+``bpy_extras`` and ``mathutils`` that the headless benchmarks use.
+"""
+import os
+import sys
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+sys.path[:0] = [os.path.join(TEST_DIR, "benchmark", "standin"), os.path.join(TEST_DIR, "benchmark"),
+                os.path.join(TEST_DIR, "..", "addons")]
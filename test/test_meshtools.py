@@ -0,0 +1,176 @@
+"""Checks that the NumPy and the pure Python mesh conversions agree."""
+import os
+from array import array
+from xml.dom import minidom
+
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+import bpy  # noqa: E402
+import scene as scene_generator  # noqa: E402
+from headless import default_options  # noqa: E402
+from io_scene_xml3d import export_xml3d, meshtools  # noqa: E402
+from io_scene_xml3d.context import Context  # noqa: E402
+from io_scene_xml3d.data import DataType  # noqa: E402
+
+requires_numpy_engine = pytest.mark.skipif(not meshtools.NUMPY_ENGINE, reason="NumPy engine needs NumPy 1.13")
+
+# Values differ in the last digit only: the NumPy engine computes in single
+# precision, the Python engine in double precision
+TOLERANCE = 1e-5
+
+
+def armature_info(obj):
+    if not obj.vertex_groups:
+        return None
+    return {"vertex_groups": obj.vertex_groups, "bone_map": {group.name: i for i, group in enumerate(obj.vertex_groups)}}
+
+
+def convert(export, obj, context):
+    vertices, indices = export(obj.data, armature_info(obj), context)
+    return meshtools.get_vertex_attributes(obj.data, vertices), indices
+
+
+def as_floats(value):
+    if isinstance(value, (list, tuple)) and value and isinstance(value[0], tuple):
+        value = [v for t in value for v in t]
+    return numpy.asarray(value, dtype=numpy.float64).ravel()
+
+
+@requires_numpy_engine
+@pytest.mark.parametrize("barycentric", [False, True])
+def test_engines_agree(tmpdir, barycentric):
+    scene_generator.create_scene(mesh_count=4, triangles=300, image_size=0, armatures=1, seed=3)
+    context = Context(str(tmpdir), None, default_options(mesh_export_barycentric_coordinates=barycentric))
+
+    for obj in bpy.data.objects:
+        numpy_content, numpy_indices = convert(meshtools.export_tessfaces_numpy, obj, context)
+        python_content, python_indices = convert(meshtools.export_tessfaces_python, obj, context)
+
+        assert [list(i) for i in numpy_indices] == [list(i) for i in python_indices]
+        assert [(e.name, e.type) for e in numpy_content] == [(e.name, e.type) for e in python_content]
+        for numpy_entry, python_entry in zip(numpy_content, python_content):
+            if numpy_entry.type == DataType.int4:
+                assert list(numpy_entry.value) == list(python_entry.value), numpy_entry.name
+            else:
+                numpy.testing.assert_allclose(as_floats(numpy_entry.value), as_floats(python_entry.value),
+                                              rtol=TOLERANCE, atol=TOLERANCE, err_msg=numpy_entry.name)
+
+
+def export_scene(output_dir, **options):
+    context = scene_generator.create_scene(mesh_count=4, triangles=300, image_size=8, armatures=1, seed=5)
+    os.makedirs(output_dir)
+    export_xml3d.save(None, context, default_options(filepath=os.path.join(output_dir, "index.html"), **options))
+
+
+def assert_same_xml(a, b, path):
+    assert a.nodeType == b.nodeType, path
+    if a.nodeType == a.TEXT_NODE:
+        if a.data.strip() != b.data.strip():
+            numpy.testing.assert_allclose(numpy.array(a.data.split(), dtype=numpy.float64),
+                                          numpy.array(b.data.split(), dtype=numpy.float64),
+                                          rtol=TOLERANCE, atol=TOLERANCE, err_msg=path)
+        return
+    if a.nodeType == a.ELEMENT_NODE:
+        assert a.tagName == b.tagName, path
+        assert dict(a.attributes.items()) == dict(b.attributes.items()), path
+        path += "/" + a.tagName
+    assert len(a.childNodes) == len(b.childNodes), path
+    for child_a, child_b in zip(a.childNodes, b.childNodes):
+        assert_same_xml(child_a, child_b, path)
+
+
+@requires_numpy_engine
+@pytest.mark.parametrize("options", [{}, {"mesh_quantization": True}])
+def test_engines_export_the_same_assets(tmpdir, monkeypatch, options):
+    numpy_dir, python_dir = str(tmpdir.join("numpy")), str(tmpdir.join("python"))
+    export_scene(numpy_dir, **options)
+    monkeypatch.setattr(meshtools, "NUMPY_ENGINE", False)
+    export_scene(python_dir, **options)
+
+    asset_dir = os.path.join(numpy_dir, export_xml3d.ASSETDIR)
+    names = sorted(name for name in os.listdir(asset_dir) if name.endswith(".xml"))
+    assert names == sorted(name for name in os.listdir(os.path.join(python_dir, export_xml3d.ASSETDIR))
+                           if name.endswith(".xml"))
+    for name in names:
+        assert_same_xml(minidom.parse(os.path.join(asset_dir, name)),
+                        minidom.parse(os.path.join(python_dir, export_xml3d.ASSETDIR, name)), name)
+
+
+def decode_range(values, components, offset, scale):
+    """Decodes uint16 values split into bytes like blender-xflow.js"""
+    values = [int(v) for v in values]
+    return [(values[i] | values[i + 1] << 8) * scale[(i // 2) % components] + offset[(i // 2) % components]
+            for i in range(0, len(values), 2)]
+
+
+def decode_octahedral(values):
+    result = []
+    for i in range(0, len(values), 2):
+        x, y = values[i] / meshtools.NORMAL_RANGE, values[i + 1] / meshtools.NORMAL_RANGE
+        z = 1.0 - abs(x) - abs(y)
+        if z < 0:
+            x, y = (1.0 - abs(y)) * (1.0 if x >= 0 else -1.0), (1.0 - abs(x)) * (1.0 if y >= 0 else -1.0)
+        length = (x * x + y * y + z * z) ** 0.5
+        result += [x / length, y / length, z / length]
+    return result
+
+
+def quantize(with_numpy):
+    rng = numpy.random.RandomState(7)
+    normals = rng.uniform(-1.0, 1.0, (200, 3))
+    normals /= numpy.linalg.norm(normals, axis=1)[:, None]
+    weights = rng.uniform(0.0, 1.0, (200, 4))
+    weights /= weights.sum(axis=1)[:, None]
+    content = [meshtools.DataEntry("position", DataType.float3, rng.uniform(-5.0, 20.0, 600)),
+               meshtools.DataEntry("normal", DataType.float3, normals.ravel()),
+               meshtools.DataEntry("texcoord", DataType.float2, rng.uniform(0.0, 1.0, 400)),
+               meshtools.DataEntry("bone_weight", DataType.float4, weights.ravel())]
+    # Vertex attributes are single precision in both engines
+    if with_numpy:
+        content = [meshtools.DataEntry(e.name, e.type, e.value.astype(numpy.float32)) for e in content]
+    else:
+        content = [meshtools.DataEntry(e.name, e.type, array('f', e.value)) for e in content]
+    return content, meshtools.quantize_vertex_attributes(content, True)
+
+
+def test_quantization_engines_agree(monkeypatch):
+    _, (numpy_result, numpy_dataflow) = quantize(True)
+    monkeypatch.setattr(meshtools, "numpy", None)
+    _, (python_result, python_dataflow) = quantize(False)
+
+    assert numpy_dataflow == python_dataflow == "blenderDecodeTexcoordSkinning"
+    assert [(e.name, e.type) for e in numpy_result] == [(e.name, e.type) for e in python_result]
+    for numpy_entry, python_entry in zip(numpy_result, python_result):
+        numpy.testing.assert_array_equal(as_floats(numpy_entry.value), as_floats(python_entry.value),
+                                         err_msg=numpy_entry.name)
+
+
+@pytest.mark.parametrize("with_numpy", [True, False])
+def test_quantization_round_trip(monkeypatch, with_numpy):
+    if not with_numpy:
+        monkeypatch.setattr(meshtools, "numpy", None)
+    content, (result, _) = quantize(with_numpy)
+    source = {e.name: as_floats(e.value) for e in content}
+    quantized = {e.name: e.value for e in result}
+
+    for entry in result:
+        if entry.name.startswith("quantized_"):
+            assert entry.type in (DataType.byte, DataType.ubyte)
+            low, high = (-128, 127) if entry.type == DataType.byte else (0, 255)
+            assert low <= min(entry.value) and max(entry.value) <= high
+
+    scale = quantized["position_scale"]
+    position = decode_range(quantized["quantized_position"], 3, quantized["position_offset"], scale)
+    assert abs(numpy.array(position) - source["position"]).max() <= max(scale) * 0.5 + 1e-9
+
+    scale = quantized["texcoord_scale"]
+    texcoord = decode_range(quantized["quantized_texcoord"], 2, quantized["texcoord_offset"], scale)
+    assert abs(numpy.array(texcoord) - source["texcoord"]).max() <= max(scale) * 0.5 + 1e-9
+
+    normal = decode_octahedral(list(quantized["quantized_normal"]))
+    assert abs(numpy.array(normal) - source["normal"]).max() < 0.02
+
+    weight = numpy.array(list(quantized["quantized_bone_weight"])) / meshtools.WEIGHT_RANGE
+    assert abs(weight - source["bone_weight"]).max() <= 0.5 / meshtools.WEIGHT_RANGE + 1e-9
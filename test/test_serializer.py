@@ -0,0 +1,133 @@
+"""Round trips of the text and binary serializers."""
+import io
+import math
+import random
+import sys
+import zlib
+from array import array
+from xml.dom import minidom
+
+import pytest
+
+from io_scene_xml3d import export_buffer, png, serializer
+from io_scene_xml3d.data import DataEntry, DataType, write_generic_entry
+from io_scene_xml3d.xml_writer import DocumentWriter
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+requires_numpy = pytest.mark.skipif(numpy is None, reason="NumPy not available")
+
+
+def float32_values(count=5000, seed=1):
+    """Single precision values of all magnitudes, including the edge cases"""
+    rng = random.Random(seed)
+    values = [0.0, -0.0, 1.0, -1.0, 0.1, 1.0 / 3.0, 16777216.0, 3.4028234663852886e+38, 1.1754943508222875e-38,
+              1.401298464324817e-45, 123456.789, 0.30000001192092896]
+    while len(values) < count:
+        value = rng.uniform(1.0, 10.0) * 10.0 ** rng.randint(-40, 38)
+        values.append(-value if rng.random() < 0.5 else value)
+    exact = array('f', values)
+    return array('f', [v for v in exact if not math.isinf(v)])
+
+
+@pytest.fixture(params=["numpy", "python"])
+def engine(request, monkeypatch):
+    if request.param == "numpy":
+        if numpy is None:
+            pytest.skip("NumPy not available")
+    else:
+        monkeypatch.setattr(serializer, "numpy", None)
+    return request.param
+
+
+def test_shortest_float32_round_trip(engine):
+    values = float32_values()
+    strings = serializer.shortest_float32(values)
+    assert array('f', map(float, strings)) == values
+    # No string is longer than needed
+    for value, string in zip(values, strings):
+        digits = len(string.split("e")[0].replace("-", "").replace(".", "").lstrip("0")) or 1
+        if digits > serializer.FLOAT32_DIGITS[0]:
+            assert array('f', [float("%.*g" % (digits - 1, value))])[0] != value, string
+
+
+@requires_numpy
+def test_shortest_float32_engines_agree(monkeypatch):
+    values = float32_values()
+    numpy_strings = serializer.shortest_float32(numpy.array(values, dtype=numpy.float32))
+    monkeypatch.setattr(serializer, "numpy", None)
+    assert serializer.shortest_float32(values) == numpy_strings
+
+
+def test_format_values(engine):
+    values = float32_values(1000)
+    text = serializer.format_values(values)
+    assert array('f', map(float, text.split(" "))) == values
+    assert serializer.format_values([(1, 2), (3, 4)], integer=True) == "1 2 3 4"
+    assert serializer.format_values([0.5, 0.25], precision=1) == "0.5 0.2"
+
+
+def test_write_values_in_chunks(engine):
+    values = float32_values(1000)
+    stream = io.StringIO()
+    written = serializer.write_values(stream, values, chunk_size=7)
+    assert stream.getvalue() == serializer.format_values(values)
+    assert written == len(stream.getvalue())
+
+
+@pytest.mark.parametrize("entry_type, values", [
+    (DataType.float3, float32_values(300)),
+    (DataType.int4, array('i', range(-200, 200))),
+    (DataType.byte, array('b', range(-128, 128))),
+    (DataType.ubyte, array('B', range(256)))
+])
+def test_write_generic_entry_round_trip(engine, entry_type, values):
+    stream = io.StringIO()
+    writer = DocumentWriter(stream)
+    writer.start_element("data")
+    write_generic_entry(writer, DataEntry("values", entry_type, values))
+    writer.end_element()
+
+    element = minidom.parseString(stream.getvalue()).documentElement.getElementsByTagName(entry_type.value)[0]
+    assert element.getAttribute("name") == "values"
+    text = element.firstChild.data.split()
+    if values.typecode == 'f':
+        assert array('f', map(float, text)) == values
+    else:
+        assert [int(v) for v in text] == list(values)
+
+
+@pytest.mark.parametrize("typecode", sorted(set(export_buffer.TYPECODES.values())))
+def test_to_binary_round_trip(typecode):
+    values = array(typecode, range(-100, 100) if typecode in "bif" else range(200))
+    inputs = [values, values.tolist()]
+    if numpy is not None:
+        inputs.append(numpy.array(values.tolist(), dtype=numpy.float64 if typecode == 'f' else numpy.int64))
+    for value in inputs:
+        data = bytes(memoryview(export_buffer.to_binary(value, typecode)).cast('B'))
+        restored = array(typecode)
+        restored.frombytes(data)
+        if sys.byteorder != "little":
+            restored.byteswap()
+        assert restored == values
+
+
+@pytest.mark.parametrize("options", [
+    {},
+    {"filter_type": "adaptive"},
+    {"filter_type": 4, "compression": 9},
+    {"filter_type": "adaptive", "strategy": [zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED, zlib.Z_RLE]}
+])
+def test_png_round_trip(options):
+    rng = random.Random(2)
+    width, height = 37, 21
+    rows = [bytearray(rng.randrange(256) if x % 8 < 4 else x % 256 for x in range(4 * width)) for y in range(height)]
+
+    stream = io.BytesIO()
+    png.Writer(width, height, alpha=True, **options).write_packed(stream, iter(rows))
+    read_width, read_height, pixels, info = png.Reader(bytes=stream.getvalue()).read()
+    assert (read_width, read_height) == (width, height)
+    assert [bytearray(row) for row in pixels] == rows
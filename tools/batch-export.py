@@ -0,0 +1,423 @@
+"""Exports many .blend files with a pool of headless Blender processes.
+
+The jobs are read from a JSON manifest. Paths are relative to the manifest,
+"options" hold values of the properties of the XML3D export operator and
+the options of a job override those of the manifest:
+
+    {
+        "options": {"mesh_binary_buffers": true},
+        "jobs": [
+            {"blend": "scenes/room.blend", "output": "output/room"},
+            {"blend": "scenes/car.blend", "output": "output/car", "options": {"mesh_quantization": true}}
+        ]
+    }
+
+Each job writes index.html to its output directory. Failed jobs are retried,
+then an aggregate report is printed and optionally written as JSON:
+
+    python tools/batch-export.py manifest.json [--processes 4] [--retries 1] [--report report.json]
+
+Blender is found in $BLENDERPATH, like export.sh does, or with --blender.
+
+Jobs with "workers" > 1 (default: --workers) are exported by several
+Blender processes. A first run with no asset collections to write plans
+the export and writes the scene, armatures and common files. The asset
+collections it reports are then balanced by vertex count over the workers,
+each converting and writing only its own. A last run that writes no asset
+collections either writes the page and scene with the file names the
+workers reported. The files and stats are merged into the output directory,
+the material libraries into one. Distributed jobs start their workers in
+addition to the --processes of the pool.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from xml.dom import minidom
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+EXPORT_SCRIPT = os.path.join(TOOLS_DIR, "export-xml3d.py")
+
+sys.path.insert(0, os.path.join(TOOLS_DIR, "..", "addons", "io_scene_xml3d"))
+
+import xml_writer  # noqa: E402
+from load_manifest import create_load_manifest, write_load_manifest, preload_urls, preload_link  # noqa: E402
+
+# Directories within the output directory
+WORKER_DIR = ".xml3d-workers"
+# Copied by the exporter only if they do not exist yet
+STATIC_DIRS = {"common", "public"}
+# Written by every worker and merged
+INFO_FILE = os.path.join("info", "xml3d-info.json")
+LOAD_MANIFEST = os.path.join("info", "load-manifest.json")
+MATERIAL_LIBRARY = "shared-materials.xml"
+PAGE = "index.html"
+SCENE_FILE = "scene.html"
+
+
+class Job:
+    def __init__(self, blend, output, options, workers=1):
+        self.blend = blend
+        self.output = output
+        self.options = options
+        self.workers = workers
+        self.attempts = 0
+        self.time = 0.0
+        self.error = None
+        self.info = None
+
+    @property
+    def name(self):
+        return os.path.splitext(os.path.basename(self.blend))[0]
+
+
+def load_manifest(path, workers=1):
+    with open(path, "r") as manifest_file:
+        manifest = json.load(manifest_file)
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    defaults = manifest.get("options", {})
+    jobs = []
+    for entry in manifest["jobs"]:
+        options = dict(defaults)
+        options.update(entry.get("options", {}))
+        jobs.append(Job(os.path.join(base_dir, entry["blend"]), os.path.join(base_dir, entry["output"]), options,
+                        entry.get("workers", workers)))
+    return jobs
+
+
+def export(blend, output, options, blender, timeout):
+    """Exports `blend` to `output` in a new Blender process. Returns the
+    content of its xml3d-info.json and None or None and an error message.
+    """
+    os.makedirs(output, exist_ok=True)
+    info_path = os.path.join(output, INFO_FILE)
+    command = [blender, blend, "--background", "--python", EXPORT_SCRIPT, "--",
+               os.path.join(output, "index.html"), json.dumps(options)]
+
+    start = time.time()
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    except OSError as e:
+        return None, "could not start Blender: %s" % e
+    try:
+        log, _ = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.communicate()
+        return None, "timed out after %d s" % timeout
+
+    # Blender exits with 0 even if the export script raised, so only an
+    # info file written by this run counts as success
+    try:
+        if os.path.getmtime(info_path) < start:
+            raise OSError("stale")
+        with open(info_path, "r") as info_file:
+            return json.load(info_file), None
+    except (OSError, ValueError):
+        last_lines = log.decode("utf-8", "replace").strip().splitlines()[-5:]
+        return None, "no export info written (exit code %d): %s" % (process.returncode, " | ".join(last_lines))
+
+
+def run_job(job, blender, timeout):
+    """Runs one export and reads its xml3d-info.json. Sets job.error if it failed."""
+    job.attempts += 1
+    start = time.time()
+    if job.workers > 1:
+        job.info, job.error = export_distributed(job, blender, timeout)
+    else:
+        job.info, job.error = export(job.blend, job.output, job.options, blender, timeout)
+    job.time = time.time() - start
+    return job
+
+
+def assign_collections(collections, count):
+    """Distributes the asset collections over `count` workers, each time
+    giving the largest remaining collection to the worker with the fewest
+    vertices. Returns a list of collection names per worker.
+    """
+    parts = [[] for _ in range(count)]
+    loads = [0] * count
+    for collection in sorted(collections, key=lambda c: c["vertices"] + c["objects"], reverse=True):
+        worker = loads.index(min(loads))
+        parts[worker].append(collection["name"])
+        loads[worker] += collection["vertices"] + collection["objects"]
+    return [part for part in parts if part]
+
+
+def export_distributed(job, blender, timeout):
+    staging_dir = os.path.join(job.output, WORKER_DIR)
+    shutil.rmtree(staging_dir, ignore_errors=True)
+
+    start = time.time()
+    plan_dir = os.path.join(staging_dir, "plan")
+    plan, error = export(job.blend, plan_dir, dict(job.options, asset_collections="[]"), blender, timeout)
+    if error:
+        return None, "planning failed: " + error
+    plan_time = time.time() - start
+
+    parts = assign_collections(plan["collections"], job.workers)
+    worker_dirs = [os.path.join(staging_dir, "worker-%d" % i) for i in range(len(parts))]
+
+    def export_part(i):
+        part_start = time.time()
+        options = dict(job.options, asset_collections=json.dumps(parts[i]))
+        info, part_error = export(job.blend, worker_dirs[i], options, blender, timeout)
+        return info, part_error, time.time() - part_start
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, len(parts))) as executor:
+        results = list(executor.map(export_part, range(len(parts))))
+    workers_time = time.time() - start
+    errors = ["worker %d: %s" % (i, part_error) for i, (_, part_error, _) in enumerate(results) if part_error]
+    if errors:
+        return None, "; ".join(errors)
+
+    # The scene of the planning run refers to the collections by the names
+    # they would have without content hashing
+    start = time.time()
+    page_dir = os.path.join(staging_dir, "page")
+    file_names = {asset["collection"]: asset["name"] for worker_info, _, _ in results for asset in worker_info["assets"]
+                  if asset["name"].endswith(".xml")}
+    page_options = dict(job.options, asset_collections="[]", asset_file_names=json.dumps(file_names))
+    page, error = export(job.blend, page_dir, page_options, blender, timeout)
+    if error:
+        return None, "writing the page failed: " + error
+    page_time = time.time() - start
+
+    start = time.time()
+    info = merge_exports(job.output, plan_dir, page_dir, plan, worker_dirs, [result[0] for result in results], parts)
+    shutil.rmtree(staging_dir, ignore_errors=True)
+
+    info["timings"] = [
+        {"name": "plan", "time": plan_time, "count": 1, "children": plan["timings"]},
+        {"name": "workers", "time": workers_time, "count": len(parts), "children": [
+            {"name": "worker-%d" % i, "time": worker_time, "count": 1, "children": worker_info["timings"]}
+            for i, (worker_info, _, worker_time) in enumerate(results)]},
+        {"name": "page", "time": page_time, "count": 1, "children": page["timings"]},
+        {"name": "merge", "time": time.time() - start, "count": 1, "children": []}
+    ]
+    with open(os.path.join(job.output, INFO_FILE), "w") as info_file:
+        json.dump(info, info_file, sort_keys=True, indent=4)
+    return info, None
+
+
+def merge_exports(output, plan_dir, page_dir, plan, worker_dirs, worker_infos, parts):
+    """Moves the files of the planning run and of the workers to `output`
+    and returns their merged stats. The page and scene are taken from the
+    page run, the armatures and static files from the planning run, which
+    traversed the same scene.
+    """
+    skipped = {name for name in STATIC_DIRS if os.path.exists(os.path.join(output, name))}
+    moved = {INFO_FILE, LOAD_MANIFEST, MATERIAL_LIBRARY}
+    for name in [PAGE, SCENE_FILE]:
+        if os.path.exists(os.path.join(page_dir, name)):
+            os.replace(os.path.join(page_dir, name), os.path.join(output, name))
+            moved.add(name)
+    for source in [plan_dir] + worker_dirs:
+        move_files(source, output, moved, skipped)
+
+    info = dict(plan)
+    worker_of = {name: i for i, part in enumerate(parts) for name in part}
+    info["collections"] = [dict(c, worker=worker_of.get(c["name"])) for c in plan["collections"]]
+    info["textures"] = []
+    texture_names = set()
+    warnings = [json.dumps(w, sort_keys=True) for w in plan["warnings"]]
+
+    for worker_dir, worker_info in zip(worker_dirs, worker_infos):
+        for asset in worker_info["assets"]:
+            if "url" in asset:
+                asset["url"] = os.path.join(output, os.path.relpath(asset["url"], worker_dir))
+        info["assets"] += worker_info["assets"]
+        info["meshes"] += worker_info["meshes"]
+        info["texture_duplicates"] += worker_info["texture_duplicates"]
+        for texture in worker_info["textures"]:
+            if texture["name"] not in texture_names:
+                texture_names.add(texture["name"])
+                info["textures"].append(texture)
+        for warning in worker_info["warnings"]:
+            if json.dumps(warning, sort_keys=True) not in warnings:
+                warnings.append(json.dumps(warning, sort_keys=True))
+                info["warnings"].append(warning)
+
+    libraries = [os.path.join(d, MATERIAL_LIBRARY) for d in worker_dirs if os.path.exists(os.path.join(d, MATERIAL_LIBRARY))]
+    info["materials"] = []
+    if libraries:
+        path = os.path.join(output, MATERIAL_LIBRARY)
+        merge_libraries(libraries, path)
+        info["materials"].append({"name": MATERIAL_LIBRARY, "size": os.path.getsize(path)})
+
+    with open(os.path.join(plan_dir, LOAD_MANIFEST), "r") as manifest_file:
+        plan_manifest = json.load(manifest_file)
+    manifest = create_load_manifest("assets", info["collections"], info["assets"], info["meshes"],
+                                    plan_manifest["camera"], plan_manifest["preload"])
+    write_load_manifest(os.path.join(output, LOAD_MANIFEST), manifest)
+    add_preload_hints(os.path.join(output, PAGE), preload_urls(manifest))
+    return info
+
+
+def add_preload_hints(page, urls):
+    """Adds preload hints for the asset files at `urls` after the hints of
+    the planning run, which knew none of the asset files. Pages without
+    hints are left as they are.
+    """
+    with open(page, "r") as page_file:
+        lines = page_file.readlines()
+    hinted = [i for i, line in enumerate(lines) if line.lstrip().startswith('<link rel="preload"')]
+    if not hinted or not urls:
+        return
+    last = lines[hinted[-1]]
+    indent = last[:len(last) - len(last.lstrip())]
+    lines[hinted[-1] + 1:hinted[-1] + 1] = [indent + preload_link(url) + "\n" for url in urls]
+    with open(page, "w") as page_file:
+        page_file.writelines(lines)
+
+
+def move_files(source, target, moved, skipped):
+    """Moves the files in `source` to `target` unless a file of the same
+    name was moved before. Skips `skipped` directories.
+    """
+    for root, dirs, files in os.walk(source):
+        dirs[:] = [d for d in dirs if not (root == source and d in skipped)]
+        for name in files:
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, source)
+            if relative in moved:
+                continue
+            moved.add(relative)
+            destination = os.path.join(target, relative)
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            os.replace(path, destination)
+
+
+def merge_libraries(paths, target):
+    """Writes the elements with an id of all libraries in `paths` to `target`, the first of each id"""
+    ids = set()
+    elements = []
+    for path in paths:
+        for node in minidom.parse(path).documentElement.childNodes:
+            if node.nodeType == node.ELEMENT_NODE and node.getAttribute("id") not in ids:
+                ids.add(node.getAttribute("id"))
+                elements.append(node)
+
+    with open(target, "w") as library_file:
+        writer = xml_writer.DocumentWriter(library_file)
+        writer.start_document()
+        writer.start_element("xml3d")
+        for element in elements:
+            write_node(writer, element)
+        writer.end_element()
+
+
+def write_node(writer, node):
+    children = [child for child in node.childNodes if child.nodeType == child.ELEMENT_NODE or child.data.strip()]
+    attributes = list(node.attributes.items())
+    if not children:
+        writer.element(node.tagName, attributes)
+        return
+    writer.start_element(node.tagName, attributes)
+    for child in children:
+        if child.nodeType == child.ELEMENT_NODE:
+            write_node(writer, child)
+        else:
+            writer.characters(child.data)
+    writer.end_element()
+
+
+def run_jobs(jobs, blender, processes, retries, timeout):
+    pending = jobs
+    with ThreadPoolExecutor(max_workers=processes) as executor:
+        for _ in range(retries + 1):
+            for job in executor.map(lambda j: run_job(j, blender, timeout), pending):
+                status = "failed: " + job.error if job.error else "done"
+                print("[%d/%d] %s %s (%.1f s)" % (job.attempts, retries + 1, job.name, status, job.time))
+            pending = [job for job in jobs if job.error]
+            if not pending:
+                break
+
+
+def output_size(path):
+    size = 0
+    for root, dirs, files in os.walk(path):
+        size += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return size
+
+
+def job_summary(job):
+    summary = {"blend": job.blend, "output": job.output, "attempts": job.attempts, "time": job.time}
+    if job.error:
+        summary["error"] = job.error
+        return summary
+
+    info = job.info
+    summary["triangles"] = sum(mesh["triangles"] * (1 + len(mesh.get("instances", []))) for mesh in info["meshes"])
+    summary["size"] = output_size(job.output)
+    summary["warnings"] = len(info["warnings"])
+    summary["phases"] = {phase["name"]: phase["time"] for phase in info.get("timings", [])}
+    return summary
+
+
+def report(jobs, wall_time):
+    summaries = [job_summary(job) for job in jobs]
+    done = [s for s in summaries if "error" not in s]
+    triangles = sum(s["triangles"] for s in done)
+    size = sum(s["size"] for s in done)
+
+    print("%-32s %8s %12s %10s %8s" % ("job", "time", "triangles", "MB", "warnings"))
+    for s in summaries:
+        name = os.path.basename(s["blend"])
+        if "error" in s:
+            print("%-32s %8.1f  failed after %d attempts: %s" % (name, s["time"], s["attempts"], s["error"]))
+        else:
+            print("%-32s %8.1f %12d %10.2f %8d" % (name, s["time"], s["triangles"], s["size"] / 1e6, s["warnings"]))
+
+    print("%d of %d jobs exported in %.1f s (%.1f s in Blender), %.0f triangles/s, %.2f MB/s" % (
+        len(done), len(summaries), wall_time, sum(s["time"] for s in summaries),
+        triangles / wall_time if wall_time else 0.0, size / 1e6 / wall_time if wall_time else 0.0))
+
+    return {
+        "jobs": summaries,
+        "done": len(done),
+        "failed": len(summaries) - len(done),
+        "time": wall_time,
+        "triangles": triangles,
+        "size": size
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exports many .blend files to XML3D in parallel.")
+    parser.add_argument("manifest", help="JSON file with the export jobs")
+    parser.add_argument("--blender", default=None, help="Blender executable (default: $BLENDERPATH/blender)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="parallel Blender instances")
+    parser.add_argument("--workers", type=int, default=1, help="Blender processes per job, unless set in the manifest")
+    parser.add_argument("--retries", type=int, default=1, help="retries of failed jobs")
+    parser.add_argument("--timeout", type=int, default=3600, help="seconds before a job is stopped")
+    parser.add_argument("--report", help="write the aggregate report to this JSON file")
+    args = parser.parse_args()
+
+    blender = args.blender
+    if blender is None:
+        if "BLENDERPATH" not in os.environ:
+            sys.exit("Need to set BLENDERPATH or --blender")
+        blender = os.path.join(os.environ["BLENDERPATH"], "blender")
+
+    jobs = load_manifest(args.manifest, args.workers)
+    start = time.time()
+    run_jobs(jobs, blender, max(1, args.processes), args.retries, args.timeout)
+    result = report(jobs, time.time() - start)
+
+    if args.report:
+        with open(args.report, "w") as report_file:
+            json.dump(result, report_file, indent=2)
+
+    if result["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
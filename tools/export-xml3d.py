@@ -1,12 +1,15 @@
 import bpy
+import json
 import sys
 
 argv = sys.argv
 argv = argv[argv.index("--") + 1:] # get all args after "--"
 
 obj_out = argv[0]
+# Optional JSON object with values of the exporter's properties
+options = json.loads(argv[1]) if len(argv) > 1 else {}
 
 if not bpy.ops.export_scene.xml3d:
     sys.exit("XML3D Exporter script is not registered.")
 
-bpy.ops.export_scene.xml3d(filepath=obj_out)
\ No newline at end of file
+bpy.ops.export_scene.xml3d(filepath=obj_out, **options)